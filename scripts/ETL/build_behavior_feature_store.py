@@ -0,0 +1,81 @@
+import glob
+import sys
+
+import pandas as pd
+
+from src.ml_scam_classification.features.feature_store import (
+    FEATURE_STORE_DIR,
+    UNKNOWN_PARTITION_VALUE,
+    parse_behavior_output_filename,
+    read_behavior_output_calls,
+    write_calls_to_feature_store,
+)
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+# Only files whose name carries the transcript id ("..._v7_00012.json") are ingested. The ChatGPT run
+# rewrites its un-numbered response file after every transcript, so that file only holds the last call,
+# and with no id it can't be stored without clobbering another transcript's labels: such files are
+# skipped and reported. Prefer run_chatgpt_behavioral_analysis(feature_store_dir=...), which writes every
+# call under its row of the conv-only input csv (PATH_TO_CONV_DATA).
+BEHAVIOR_OUTPUT_GLOBS = [
+    "outputs/*__chatgpt__feat_out_v*.json",
+    "outputs/*__feature_extraction_out_v*.json",  # Gemini path
+]
+# Model/source are not part of the output filenames; set them for the files being ingested
+MODEL_BY_LLM = {
+    "chatgpt": "gpt-4o-2024-11-20",
+    "gemini": "gemini-2.5-pro",
+}
+SOURCE = None  # e.g. "youtube1"; None -> "unknown" partition
+# The csv the run read (its PATH_TO_CONV_DATA): transcript ids are its rows, and their texts are stored as keys
+PATH_TO_CONV_DATA = "src/ml_scam_classification/data/call_transcripts_scam_determination/raw_data/call_transcripts_scam_determination_conv_only.csv"
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    # usage: script.py <feature_store_dir>(opt.)
+    if len(sys.argv) > 2:
+        raise ValueError("Too many arguments. usage: script.py <feature_store_dir>(opt.)")
+    root_dir = sys.argv[1] if len(sys.argv) > 1 else FEATURE_STORE_DIR
+    transcripts = pd.read_csv(PATH_TO_CONV_DATA)["transcripts"].astype(str)
+
+    paths = sorted({p for pattern in BEHAVIOR_OUTPUT_GLOBS for p in glob.glob(pattern)})
+    n_files, n_rows = 0, 0
+    skipped_no_id = []
+    for path in paths:
+        meta = parse_behavior_output_filename(path)
+        if meta is None:
+            print(f"Skipping (filename does not follow the output naming convention): {path}")
+            continue
+        if meta["transcript_id"] is None:
+            skipped_no_id.append(path)
+            continue
+        if meta["transcript_id"] >= len(transcripts):
+            print(f"Skipping (transcript id {meta['transcript_id']} is not a row of {PATH_TO_CONV_DATA}): {path}")
+            continue
+        calls_by_id = {meta["transcript_id"]: read_behavior_output_calls(path)[0]}
+        written = write_calls_to_feature_store(
+            calls_by_id,
+            transcript_texts={t: transcripts[t] for t in calls_by_id},
+            prompt_version=meta["prompt_version"],
+            model=MODEL_BY_LLM.get(meta["llm"], UNKNOWN_PARTITION_VALUE),
+            source=SOURCE,
+            root_dir=root_dir,
+        )
+        n_lines = sum(len(c) for c in calls_by_id.values())
+        n_files += 1
+        n_rows += n_lines
+        print(f"{path}: {len(calls_by_id)} call(s), {n_lines} line(s) -> {len(written)} file(s)")
+
+    if skipped_no_id:
+        print(f"\nSkipped {len(skipped_no_id)} file(s) with no transcript id in the name (which call they hold is unknown):")
+        for path in skipped_no_id:
+            print(f"  {path}")
+    print(f"\nIngested {n_files} of {len(paths)} output file(s), {n_rows} rows into {root_dir}")
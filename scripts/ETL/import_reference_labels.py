@@ -0,0 +1,73 @@
+import glob
+import os
+import sys
+
+import pandas as pd
+
+from src.ml_scam_classification.codebook.behavior_codebook import load_codebook
+from src.ml_scam_classification.features.feature_store import (
+    FEATURE_STORE_DIR,
+    read_behavior_output_calls,
+    write_calls_to_feature_store,
+)
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+# Hand annotations to compare prompt variants against (scripts/evaluation/run_prompt_ab_evaluation.py,
+# compare_codebook_compaction.py). One json file per call, named <transcript_id>.json where transcript_id
+# is the call's row of PATH_TO_CONV_DATA, in the run's per-line output format:
+#   [{"line_no": 1, "speaker": "Caller", "behaviors_exhibited": {"1A": 0, "1B": 1, ...}}, ...]
+# with one object per line of the call's cleaned transcript (outputs/cleaned_transcripts/<cleaning prompt>/
+# <transcript sha256>.json), in order, so the lines align with what the variants tag. Codes left out of a
+# line count as not identified.
+ANNOTATIONS_GLOB = "outputs/reference_annotations/*.json"
+PATH_TO_CONV_DATA = "src/ml_scam_classification/data/call_transcripts_scam_determination/raw_data/call_transcripts_scam_determination_conv_only.csv"
+# Codebook the annotators used (features*.json or a prompt); every one of its codes gets a column
+CODEBOOK_PATH = "src/ml_scam_classification/prompting/prompt_conner_v7.txt"
+
+REFERENCE_PROMPT_VERSION = "reference"  # partition the evaluation scripts read (their REFERENCE_PROMPT_VERSION)
+ANNOTATOR = "human"  # stored as the model partition
+SOURCE = None        # e.g. "youtube1"; None -> "unknown" partition
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    # usage: script.py <feature_store_dir>(opt.)
+    if len(sys.argv) > 2:
+        raise ValueError("Too many arguments. usage: script.py <feature_store_dir>(opt.)")
+    root_dir = sys.argv[1] if len(sys.argv) > 1 else FEATURE_STORE_DIR
+
+    transcripts = pd.read_csv(PATH_TO_CONV_DATA)["transcripts"].astype(str)
+    codes = list(load_codebook(CODEBOOK_PATH))
+
+    calls_by_id = {}
+    for path in sorted(glob.glob(ANNOTATIONS_GLOB)):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not name.isdigit() or int(name) >= len(transcripts):
+            print(f"Skipping (name is not a row of {PATH_TO_CONV_DATA}): {path}")
+            continue
+        line_objs = read_behavior_output_calls(path)[0]
+        unknown = sorted({c for o in line_objs for c in (o.get("behaviors_exhibited") or {})} - set(codes))
+        if unknown:
+            raise ValueError(f"{path} uses codes not in {CODEBOOK_PATH}: {unknown}")
+        calls_by_id[int(name)] = line_objs
+
+    if not calls_by_id:
+        raise FileNotFoundError(f"No annotation files match {ANNOTATIONS_GLOB}")
+    written = write_calls_to_feature_store(
+        calls_by_id,
+        transcript_texts={t: transcripts[t] for t in calls_by_id},
+        prompt_version=REFERENCE_PROMPT_VERSION,
+        model=ANNOTATOR,
+        source=SOURCE,
+        codes=codes,
+        root_dir=root_dir,
+    )
+    n_lines = sum(len(line_objs) for line_objs in calls_by_id.values())
+    print(f"Imported {len(calls_by_id)} annotated call(s), {n_lines} line(s) into {root_dir} -> {len(written)} file(s)")
@@ -0,0 +1,60 @@
+import sys
+import time
+import pandas as pd
+
+from src.general_file_utils.utils.path_strings import get_path_of_file_w_latest_unix_timestamp
+from src.data_processing.near_duplicates import find_near_duplicate_representatives, summarize_clusters
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+COMPILED_DIRPATH = "src/ml_scam_classification/data/compiled"
+REPORT_DIRPATH = "outputs"
+JACCARD_THRESHOLD = 0.8  # transcripts at or above this estimated Jaccard similarity are treated as duplicates
+
+SOURCE_ONEHOT_COLS = [
+    'source_internet_search__onehot',
+    'source_candor__onehot',
+    'source_youtube1__onehot',
+    'source_youtube2__onehot',
+    'source_myrecordedcalls__onehot',
+]
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    # usage: script.py <path_to_compiled_csv>(opt.) <jaccard_threshold>(opt.)
+    if len(sys.argv) > 3:
+        raise ValueError("Too many arguments. usage: script.py <path_to_compiled_csv>(opt.) <jaccard_threshold>(opt.)")
+    compiled_path = sys.argv[1] if len(sys.argv) > 1 else get_path_of_file_w_latest_unix_timestamp(COMPILED_DIRPATH)
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else JACCARD_THRESHOLD
+
+    df = pd.read_csv(compiled_path)
+    texts = df['transcripts'].astype(str).tolist()
+
+    # label each transcript with its source for the report
+    present_source_cols = [c for c in SOURCE_ONEHOT_COLS if c in df.columns]
+    if present_source_cols:
+        sources = df[present_source_cols].idxmax(axis=1).str.replace('source_', '').str.replace('__onehot', '').tolist()
+    else:
+        sources = None
+
+    start = time.perf_counter()
+    representatives, index = find_near_duplicate_representatives(texts, threshold=threshold)
+    elapsed = time.perf_counter() - start
+
+    print(summarize_clusters(index, source_labels=sources))
+    print(f"\nIndexed {len(texts)} transcripts in {elapsed:.2f}s")
+
+    report_df = pd.DataFrame(index.report_rows())
+    if sources is not None and not report_df.empty:
+        report_df['source'] = [sources[i] for i in report_df['transcript_idx']]
+
+    report_path = f"{REPORT_DIRPATH}/near_duplicates__{time.time_ns()}.csv"
+    report_df.to_csv(report_path, index=False)
+    print(f"Wrote duplicate cluster report to {report_path}")
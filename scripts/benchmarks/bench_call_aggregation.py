@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+
+from src.ml_scam_classification.features.call_aggregates import aggregate_calls, offsets_from_lengths
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+N_CALLS = 5_000          # synthetic corpus, roughly compiled-corpus scale or larger
+MAX_LINES_PER_CALL = 80
+N_CODES = 79             # features_v2.json
+P_LABEL = 0.05
+COOCCURRENCE_K = 2
+N_LOOP_CALLS = 200       # the per-call loop is only timed on a subset and extrapolated
+
+# ----------------------------#
+
+
+def loop_aggregate(labels, offsets, is_caller, k):
+    """Reference: the per-call Python loop the engine replaces."""
+    out = []
+    for c in range(len(offsets) - 1):
+        seg = labels[offsets[c]:offsets[c + 1]]
+        caller = is_caller[offsets[c]:offsets[c + 1]]
+        n, n_codes = seg.shape
+        counts = seg.sum(axis=0)
+        caller_counts = seg[caller].sum(axis=0)
+        first = np.full(n_codes, -1)
+        longest = np.zeros(n_codes, dtype=int)
+        for j in range(n_codes):
+            run = 0
+            for i in range(n):
+                if seg[i, j]:
+                    if first[j] < 0:
+                        first[j] = i
+                    run += 1
+                    longest[j] = max(longest[j], run)
+                else:
+                    run = 0
+        window = np.zeros_like(seg)
+        for i in range(n):
+            window[i] = seg[max(0, i - k):i + k + 1].any(axis=0)
+        cooc = seg.T.astype(int) @ window.astype(int)
+        out.append((counts, caller_counts, first, longest, cooc))
+    return out
+
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(1, MAX_LINES_PER_CALL + 1, N_CALLS)
+    offsets = offsets_from_lengths(lengths)
+    labels = rng.random((int(offsets[-1]), N_CODES)) < P_LABEL
+    is_caller = rng.random(int(offsets[-1])) < 0.5
+    codes = [str(j) for j in range(N_CODES)]
+
+    start = time.perf_counter()
+    aggregate_calls(labels, offsets, is_caller, codes)
+    engine_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aggregate_calls(labels, offsets, is_caller, codes, cooccurrence_k=COOCCURRENCE_K)
+    engine_cooc_s = time.perf_counter() - start
+
+    sub_offsets = offsets[:N_LOOP_CALLS + 1]
+    start = time.perf_counter()
+    loop_aggregate(labels[:sub_offsets[-1]], sub_offsets, is_caller, COOCCURRENCE_K)
+    loop_s = (time.perf_counter() - start) * N_CALLS / N_LOOP_CALLS
+
+    print(f"{N_CALLS} calls, {int(offsets[-1])} lines, {N_CODES} codes")
+    print(f"engine (no co-occurrence):   {engine_s:8.2f} s")
+    print(f"engine (co-occurrence k={COOCCURRENCE_K}): {engine_cooc_s:8.2f} s")
+    print(f"per-call loop (extrapolated): {loop_s:8.2f} s  ({loop_s / engine_cooc_s:.0f}x slower)")
@@ -0,0 +1,96 @@
+import inspect
+import io
+import os
+import timeit
+from contextlib import redirect_stdout
+
+from dotenv import load_dotenv
+
+from src.llm_tools.structured_logging import LogConfig, configure, get_logger, INFO, WARNING
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+N_REQUESTS = 2_000   # simulated API requests per measurement
+N_REPEATS = 5        # best-of repeats
+
+# ----------------------------#
+
+# Legacy path, reproduced as it was before the structured logger: every cout_log_info() call grabbed the
+# caller frame and copied its locals, and every cout_log() call re-read .env via cout_logging_enabled().
+
+def _legacy_cout_logging_enabled():
+    load_dotenv()
+    pref = os.getenv("cout_log")
+    return (not pref) or pref.lower() == "true"
+
+
+def _legacy_cout_log(s):
+    if _legacy_cout_logging_enabled():
+        print(s)
+
+
+def _legacy_cout_log_info(cout_log_num):
+    caller_frame = inspect.currentframe().f_back
+    try:
+        func_called_from_id = caller_frame.f_code.co_name
+        current_locals = {}
+        for var_name, var_value in caller_frame.f_locals.items():
+            current_locals[var_name] = var_value
+        if func_called_from_id == "legacy_request":
+            if cout_log_num == 1:
+                _legacy_cout_log("\n      -> Fetching API Key from .env file...\n")
+            elif cout_log_num == 2:
+                _legacy_cout_log("Received ChatGPT API Key:")
+                _legacy_cout_log(current_locals["API_KEY"][:9])
+                _legacy_cout_log("\n      -> Sending prompt to ChatGPT... (may take up to 60s).")
+                _legacy_cout_log(f"(Progress: {current_locals['progress_message']})")
+    finally:
+        del caller_frame
+
+
+def legacy_request(progress_message="Call Transcript 1/10, Transcript Line 3/40", model="gpt-4o-2024-11-20"):
+    _legacy_cout_log_info(1)
+    API_KEY = "sk-test-0000000000000000"
+    _legacy_cout_log_info(2)
+
+
+log = get_logger("bench")
+
+
+def structured_request(progress_message="Call Transcript 1/10, Transcript Line 3/40", model="gpt-4o-2024-11-20"):
+    log.info("Sending prompt to ChatGPT... (may take up to 60s).", progress=progress_message, model=model)
+
+
+def _per_request_us(fn) -> float:
+    best = min(timeit.repeat(fn, number=N_REQUESTS, repeat=N_REPEATS))
+    return best / N_REQUESTS * 1e6
+
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    results = []
+
+    # Logging disabled (cout_log=False): the cost that used to be paid on every request for nothing
+    os.environ["cout_log"] = "False"
+    configure(LogConfig(console_enabled=False, level=INFO))
+    results.append(("disabled", _per_request_us(legacy_request), _per_request_us(structured_request)))
+
+    # Logging enabled, output discarded: formatting + frame scraping vs explicit fields
+    os.environ["cout_log"] = "True"
+    configure(LogConfig(console_enabled=True, level=INFO))
+    with redirect_stdout(io.StringIO()):
+        results.append(("enabled", _per_request_us(legacy_request), _per_request_us(structured_request)))
+
+    # Console on, but INFO filtered out by level (legacy code had no levels, so it still prints)
+    configure(LogConfig(console_enabled=True, level=WARNING))
+    with redirect_stdout(io.StringIO()):
+        results.append(("level filtered", _per_request_us(legacy_request), _per_request_us(structured_request)))
+
+    print(f"{'logging':<16}{'legacy us/request':>20}{'structured us/request':>24}{'speedup':>10}")
+    for name, legacy_us, new_us in results:
+        print(f"{name:<16}{legacy_us:>20.2f}{new_us:>24.3f}{legacy_us / new_us:>9.0f}x")
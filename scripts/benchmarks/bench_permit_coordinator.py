@@ -0,0 +1,89 @@
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.rate_limits.models.permit_coordinator import LeasedRateLimiter, PermitCoordinator
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+# A 1s window stands in for the 60s one, so saturation and the window guarantee show up in seconds
+PERMITS_PER_WINDOW = 2_000
+WINDOW_S = 1.0
+LEASE_TTL_S = 0.25
+N_WORKERS = 16
+DURATION_S = 5.0
+LEASE_SIZES = (1, 20)  # 1 = one coordinator round trip per permit
+
+# ----------------------------#
+
+# Every worker process calls wait() as fast as it can for DURATION_S and records when each permit
+# was granted. The merged grant times are checked against the limit: no WINDOW_S sliding window
+# may hold more than PERMITS_PER_WINDOW permits.
+
+
+def _worker(address, lease_size, duration_s, out_queue):
+    grants = []
+    with LeasedRateLimiter(address, lease_size=lease_size, name=f"worker-{os.getpid()}") as rl:
+        stop_at = time.time() + duration_s
+        while True:
+            try:
+                rl.wait(timeout_s=max(0.0, stop_at - time.time()))
+            except TimeoutError:
+                break
+            now = time.time()
+            if now >= stop_at:
+                break
+            grants.append(now)
+    out_queue.put(grants)
+
+
+def _max_in_window(grants, window_s):
+    grants = np.sort(np.asarray(grants))
+    if grants.size == 0:
+        return 0
+    ends = np.searchsorted(grants, grants + window_s, side="left")
+    return int((ends - np.arange(grants.size)).max())
+
+
+def bench(lease_size):
+    with tempfile.TemporaryDirectory() as directory:
+        address = os.path.join(directory, "permits.sock")
+        coordinator = PermitCoordinator(
+            PERMITS_PER_WINDOW, window_s=WINDOW_S, lease_ttl_s=LEASE_TTL_S, max_lease_size=max(LEASE_SIZES)
+        ).start_in_thread(address)
+        out_queue = mp.Queue()
+        workers = [mp.Process(target=_worker, args=(address, lease_size, DURATION_S, out_queue)) for _ in range(N_WORKERS)]
+        for p in workers:
+            p.start()
+        grants = [t for _ in workers for t in out_queue.get()]
+        for p in workers:
+            p.join()
+        stats = coordinator.stats()
+        coordinator.stop()
+    return {
+        "permits_per_s": len(grants) / DURATION_S,
+        "max_in_window": _max_in_window(grants, WINDOW_S),
+        "round_trips_per_permit": stats["n_leases"] / max(1, len(grants)),
+        "returned": stats["n_permits_returned"],
+    }
+
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    print(f"limit: {PERMITS_PER_WINDOW} permits per {WINDOW_S:g}s window, {N_WORKERS} worker processes, {DURATION_S:g}s")
+    print(f"{'lease size':>10}{'permits/s':>12}{'max in window':>15}{'leases/permit':>15}{'returned':>10}")
+    for lease_size in LEASE_SIZES:
+        r = bench(lease_size)
+        ok = "ok" if r["max_in_window"] <= PERMITS_PER_WINDOW else "OVER LIMIT"
+        print(
+            f"{lease_size:>10}{r['permits_per_s']:>12,.0f}{r['max_in_window']:>15,} {ok:<3}"
+            f"{r['round_trips_per_permit']:>11.3f}{r['returned']:>10,}"
+        )
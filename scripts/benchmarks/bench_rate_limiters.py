@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+from collections import deque
+
+from src.general_file_utils.utils.pkl import make_pkl_file
+from src.rate_limits.models.gcra_rate_limiter import GCRARateLimiter
+from src.rate_limits.models.rate_limiter import NS_PER_MINUTE, RateLimiter
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+RPMS = (10, 1_000, 10_000)
+MAX_CALLS = 2_000  # wait() calls timed per repeat (capped at rpm, so no call ever has to sleep)
+N_REPEATS = 5      # best-of repeats
+
+# ----------------------------#
+
+# Both limiters start from a persisted steady state in which a full minute of permits is free:
+# the deque is full of timestamps older than 60s, the GCRA TAT is in the past and burst=rpm.
+# Every timed wait() is then the "permit available" path, so the numbers are limiter overhead only.
+
+
+def _steady_state_paths(directory, rpm):
+    old_ns = time.time_ns() - 2 * NS_PER_MINUTE
+    deque_path = os.path.join(directory, f"bench_prev{rpm}.pkl")
+    gcra_path = os.path.join(directory, f"bench_gcra{rpm}.pkl")
+    make_pkl_file(path=deque_path, data=deque((old_ns + i for i in range(rpm)), maxlen=rpm))
+    make_pkl_file(path=gcra_path, data=old_ns)
+    return deque_path, gcra_path
+
+
+def _make_limiter(kind, path, rpm, requests_per_log_write):
+    if kind == "deque":
+        return RateLimiter(rpm, path, print_updates=False, requests_per_log_write=requests_per_log_write)
+    return GCRARateLimiter(rpm, path, burst=rpm, print_updates=False, requests_per_log_write=requests_per_log_write)
+
+
+def bench(kind, rpm, requests_per_log_write):
+    n_calls = min(rpm, MAX_CALLS)
+    best_load_s, best_wait_s, state_bytes = float("inf"), float("inf"), 0
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(N_REPEATS):
+            deque_path, gcra_path = _steady_state_paths(directory, rpm)
+            path = deque_path if kind == "deque" else gcra_path
+
+            start = time.perf_counter()
+            rl = _make_limiter(kind, path, rpm, requests_per_log_write)
+            best_load_s = min(best_load_s, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for _ in range(n_calls):
+                rl.wait()
+            best_wait_s = min(best_wait_s, (time.perf_counter() - start) / n_calls)
+            state_bytes = os.path.getsize(path)
+    return {"load_ms": best_load_s * 1e3, "wait_us": best_wait_s * 1e6, "state_bytes": state_bytes}
+
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    print(f"{'rpm':>7}{'limiter':>8}{'state bytes':>13}{'load ms':>10}{'wait us (persist each)':>24}{'wait us (no persist)':>22}")
+    for rpm in RPMS:
+        for kind in ("deque", "gcra"):
+            persisted = bench(kind, rpm, requests_per_log_write=1)
+            in_memory = bench(kind, rpm, requests_per_log_write=10**9)
+            print(
+                f"{rpm:>7}{kind:>8}{persisted['state_bytes']:>13,}{persisted['load_ms']:>10.3f}"
+                f"{persisted['wait_us']:>24.1f}{in_memory['wait_us']:>22.2f}"
+            )
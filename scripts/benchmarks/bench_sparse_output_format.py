@@ -0,0 +1,147 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from src.ml_scam_classification.codebook.behavior_codebook import (
+    label_vector_to_behaviors_exhibited,
+    line_json_to_label_vector,
+    load_behavior_codebook,
+)
+from src.ml_scam_classification.codebook.codebook_compiler import compile_tagging_instructions, estimate_tokens
+from src.ml_scam_classification.codebook.sparse_code_format import (
+    compile_sparse_tagging_instructions,
+    decode_sparse_response,
+    line_json_to_sparse,
+)
+from src.ml_scam_classification.features.feature_store import code_columns, read_feature_store, table_to_label_matrix
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+FEATURES_PATH = "src/ml_scam_classification/prompting/features_v2.json"
+# Real per-line labels to re-encode (analysis text is not stored, so every line gets SYNTHETIC_ANALYSIS);
+# falls back to synthetic labels over FEATURES_PATH codes if the store has no rows for this prompt version
+FEATURE_STORE_DIR = "outputs/feature_store"
+STORE_PROMPT_VERSION = "v7"
+N_SYNTHETIC_LINES = 2_000
+P_LABEL = 0.05
+SYNTHETIC_ANALYSIS = "The segment does not show this behavior."
+OUTPUT_TOKENS_PER_S = 80.0  # rough decode speed, to turn output tokens into generation seconds
+
+# Live comparison through the prompt A/B harness (API calls, needs reference labels in the feature store)
+RUN_LIVE = False
+COMPILED_PROMPTS_DIR = "outputs/compiled_prompts"
+MODEL = "gpt-4o-2024-11-20"
+REFERENCE_PROMPT_VERSION = "reference"  # scripts/ETL/import_reference_labels.py
+COMPILED_DIRPATH = "src/ml_scam_classification/data/compiled"  # reference transcripts are looked up here by hash
+LIVE_SAMPLE_SIZE = 4
+SPARSE_LINES_PER_REQUEST = 20
+
+# ----------------------------#
+
+
+def labels_to_line_jsons(codes, labels, speakers):
+    return [
+        {
+            "transcript_segment": "Hi, this is the billing department calling about your account.",
+            "speaker": str(speaker),
+            "behaviors_exhibited": label_vector_to_behaviors_exhibited(vec, codes, analysis=SYNTHETIC_ANALYSIS),
+        }
+        for speaker, vec in zip(speakers, labels)
+    ]
+
+
+def stored_line_jsons(root_dir, prompt_version):
+    """(codes, line objs) rebuilt from the feature store's labels; None if there are no rows."""
+    if not os.path.isdir(root_dir):
+        return None
+    table = read_feature_store(root_dir, filters={"prompt_version": prompt_version})
+    table = table.filter(table.column("speaker").cast("string").isin(["Caller", "Receiver"]))
+    if table.num_rows == 0:
+        return None
+    codes = code_columns(table)
+    speakers = table.column("speaker").cast("string").to_pylist()
+    return codes, labels_to_line_jsons(codes, table_to_label_matrix(table, codes), speakers)
+
+
+def synthetic_line_jsons(codes, n_lines, p_label, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.random((n_lines, len(codes))) < p_label
+    speakers = rng.choice(["Caller", "Receiver"], size=n_lines)
+    return labels_to_line_jsons(codes, labels, speakers)
+
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    stored = stored_line_jsons(FEATURE_STORE_DIR, STORE_PROMPT_VERSION)
+    if stored is not None:
+        codes, line_objs = stored
+        print(f"Re-encoding {len(line_objs)} stored {STORE_PROMPT_VERSION} lines from {FEATURE_STORE_DIR} ({len(codes)} codes)")
+    else:
+        codes = list(load_behavior_codebook(FEATURES_PATH))
+        line_objs = synthetic_line_jsons(codes, N_SYNTHETIC_LINES, P_LABEL)
+        print(f"No {STORE_PROMPT_VERSION} rows in {FEATURE_STORE_DIR}; using {len(line_objs)} synthetic lines ({len(codes)} codes)")
+
+    json_lines = [json.dumps(obj, ensure_ascii=False) for obj in line_objs]
+    sparse_lines = [line_json_to_sparse(obj, i + 1, codes) for i, obj in enumerate(line_objs)]
+    json_tokens = sum(estimate_tokens(s) for s in json_lines)
+    sparse_tokens = sum(estimate_tokens(s) for s in sparse_lines)
+
+    start = time.perf_counter()
+    json_labels = np.array([line_json_to_label_vector(json.loads(s), codes) for s in json_lines])
+    json_decode_s = time.perf_counter() - start
+    start = time.perf_counter()
+    _, _, sparse_labels = decode_sparse_response("\n".join(sparse_lines), codes)
+    sparse_decode_s = time.perf_counter() - start
+    assert np.array_equal(json_labels, sparse_labels), "sparse round trip changed labels"
+
+    n = len(line_objs)
+    print(f"\n{'format':<10}{'out tok/line':>14}{'gen s/line':>12}{'decode us/line':>16}")
+    for name, tokens, decode_s in (("json", json_tokens, json_decode_s), ("sparse", sparse_tokens, sparse_decode_s)):
+        print(f"{name:<10}{tokens / n:>14.1f}{tokens / n / OUTPUT_TOKENS_PER_S:>12.2f}{decode_s / n * 1e6:>16.1f}")
+    print(f"Sparse output: {sparse_tokens / json_tokens:.1%} of the json output tokens (estimated)")
+
+    if RUN_LIVE:
+        import pandas as pd
+
+        from src.general_file_utils.utils.path_strings import get_path_of_file_w_latest_unix_timestamp
+        from src.llm_tools.prompt_evaluation import PromptVariant, run_prompt_ab_evaluation, sample_reference_transcripts
+        from src.llm_tools.usage_ledger import UsageLedger
+        from src.rate_limits.registry import get_rate_limit_registry
+
+        live_transcripts, reference, ref_codes = sample_reference_transcripts(
+            pd.read_csv(get_path_of_file_w_latest_unix_timestamp(COMPILED_DIRPATH)),
+            LIVE_SAMPLE_SIZE,
+            prompt_version=REFERENCE_PROMPT_VERSION,
+            feature_store_dir=FEATURE_STORE_DIR,
+        )
+        codebook = load_behavior_codebook(FEATURES_PATH)
+        os.makedirs(COMPILED_PROMPTS_DIR, exist_ok=True)
+        json_path = os.path.join(COMPILED_PROMPTS_DIR, "bench__json.txt")
+        sparse_path = os.path.join(COMPILED_PROMPTS_DIR, "bench__sparse.txt")
+        with open(json_path, "w", encoding="utf-8") as f:
+            f.write(compile_tagging_instructions(codebook, codes=ref_codes))
+        with open(sparse_path, "w", encoding="utf-8") as f:
+            f.write(compile_sparse_tagging_instructions(codebook, codes=ref_codes))
+
+        ledger = UsageLedger()
+        report = run_prompt_ab_evaluation(
+            [
+                PromptVariant("json", json_path, MODEL),
+                PromptVariant("sparse", sparse_path, MODEL, output_format="sparse", lines_per_request=SPARSE_LINES_PER_REQUEST),
+            ],
+            live_transcripts,
+            reference,
+            ref_codes,
+            rl=get_rate_limit_registry().for_model(MODEL),
+            ledger=ledger,
+            max_concurrent_transcripts=2,
+        )
+        with pd.option_context("display.width", 200):
+            print(report.to_string(index=False))
@@ -0,0 +1,52 @@
+import time
+
+import numpy as np
+
+from src.ml_scam_classification.utils.vad_segmentation import find_pause_cut_points
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+SAMPLE_RATE = 16_000
+AUDIO_HOURS = (0.5, 2.0, 4.0)
+MAX_CHUNK_S = 600.0  # ~19 MB of 16 kHz 16-bit mono wav, under the 25 MB transcription limit
+SEED = 0
+
+# ----------------------------#
+
+# Synthetic call audio: tonal "phrases" of 0.2-3s separated by 50-800 ms of low-level noise.
+# The true pauses are known, so the script checks every cut landed in one.
+
+
+def synthetic_speech(hours, rng):
+    parts, pauses, n = [], [], 0
+    while n < hours * 3600 * SAMPLE_RATE:
+        phrase_len = int(rng.uniform(0.2, 3.0) * SAMPLE_RATE)
+        t = np.arange(phrase_len) / SAMPLE_RATE
+        phrase = 3000 * np.sin(2 * np.pi * rng.uniform(100, 300) * t) * (1 + 0.3 * rng.standard_normal(phrase_len))
+        pause_len = int(rng.uniform(0.05, 0.8) * SAMPLE_RATE)
+        parts += [phrase.astype(np.int16), (30 * rng.standard_normal(pause_len)).astype(np.int16)]
+        pauses.append((n + phrase_len, n + phrase_len + pause_len))
+        n += phrase_len + pause_len
+    return np.concatenate(parts), np.array(pauses)
+
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(SEED)
+    print(f"{'audio h':>8}{'seconds':>9}{'x real time':>13}{'cuts':>6}{'in pauses':>11}{'max chunk s':>13}")
+    for hours in AUDIO_HOURS:
+        samples, pauses = synthetic_speech(hours, rng)
+        start = time.perf_counter()
+        cuts = find_pause_cut_points(samples, SAMPLE_RATE, MAX_CHUNK_S)
+        elapsed = time.perf_counter() - start
+        in_pause = sum(bool(((pauses[:, 0] <= c) & (c < pauses[:, 1])).any()) for c in cuts)
+        max_chunk_s = np.diff(np.concatenate(([0], cuts, [len(samples)]))).max() / SAMPLE_RATE
+        print(
+            f"{hours:>8g}{elapsed:>9.2f}{hours * 3600 / elapsed:>13,.0f}{len(cuts):>6}"
+            f"{f'{in_pause}/{len(cuts)}':>11}{max_chunk_s:>13.1f}"
+        )
@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.general_file_utils.utils.path_strings import get_path_of_file_w_latest_unix_timestamp
+from src.ml_scam_classification.codebook.behavior_codebook import load_behavior_codes
+from src.ml_scam_classification.classification.scam_classifier import SCAM_LABEL_COL, ScamClassifier
+from src.ml_scam_classification.features.call_aggregates import aggregate_feature_store_table
+from src.ml_scam_classification.features.feature_store import (
+    FEATURE_STORE_DIR,
+    UNKNOWN_PARTITION_VALUE,
+    match_transcript_keys,
+    read_feature_store,
+    transcript_keys,
+)
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+COMPILED_DIRPATH = "src/ml_scam_classification/data/compiled"
+# Behavior labels from the feature store (run_chatgpt_behavioral_analysis(feature_store_dir=...) or
+# scripts/ETL/build_behavior_feature_store.py), joined to the compiled csv's scam labels by transcript_sha256
+STORE_FILTERS = {"prompt_version": "v7", "model": "gpt-4o-2024-11-20", "source": UNKNOWN_PARTITION_VALUE}
+FEATURES_PATH = "src/ml_scam_classification/prompting/features_v2.json"
+MODEL_PATH = f"outputs/models/scam_classifier__{time.time_ns()}.npz"
+
+L2_GRID = (0.1, 1.0, 10.0, 100.0)
+N_FOLDS = 5
+N_BOOT = 1000      # bootstrap replicates for the best model's CV intervals (0 -> none)
+MAX_WORKERS = None  # None -> ThreadPoolExecutor default
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    # usage: script.py <path_to_compiled_csv>(opt.)
+    if len(sys.argv) > 2:
+        raise ValueError("Too many arguments. usage: script.py <path_to_compiled_csv>(opt.)")
+    compiled_path = sys.argv[1] if len(sys.argv) > 1 else get_path_of_file_w_latest_unix_timestamp(COMPILED_DIRPATH)
+
+    df = pd.read_csv(compiled_path)
+    missing_cols = [c for c in (SCAM_LABEL_COL, "transcripts") if c not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Compiled csv {compiled_path} has no {missing_cols} column(s)")
+
+    table = read_feature_store(FEATURE_STORE_DIR, filters=STORE_FILTERS)
+    if table.num_rows == 0:
+        raise FileNotFoundError(f"No behavior labels in {FEATURE_STORE_DIR} match {STORE_FILTERS}")
+    codes = load_behavior_codes(FEATURES_PATH)
+    transcript_ids, aggregates = aggregate_feature_store_table(table, codes)
+    X = aggregates.classifier_features()
+
+    # join on the transcript text's hash: transcript_id is a row of the run's input csv, not of this one
+    keys = transcript_keys(table, transcript_ids)
+    unkeyed = np.array([k is None for k in keys])
+    if unkeyed.any():
+        print(f"Skipping {int(unkeyed.sum())} of {len(keys)} stored calls written without transcript_sha256 (rerun them)")
+    rows = match_transcript_keys(keys, df["transcripts"].astype(str))
+    unmatched = (rows < 0) & ~unkeyed
+    if unmatched.any():
+        raise ValueError(
+            f"{int(unmatched.sum())} of {len(keys)} stored calls are not in {compiled_path}: "
+            f"the labels were made from a different transcripts csv"
+        )
+    # keep calls that have a scam label (unlabeled rows read as NaN)
+    y = np.full(len(transcript_ids), np.nan)
+    y[~unkeyed] = pd.to_numeric(df[SCAM_LABEL_COL], errors="coerce").to_numpy()[rows[~unkeyed]]
+    labeled = ~np.isnan(y)
+    if (~labeled & ~unkeyed).any():
+        print(f"Skipping {int((~labeled & ~unkeyed).sum())} of {len(y)} stored calls with no {SCAM_LABEL_COL} in {compiled_path}")
+    X, y = X[labeled], y[labeled].astype(np.int8)
+
+    start = time.perf_counter()
+    model, cv_metrics = ScamClassifier.cross_validate(
+        X, y, codes, l2_grid=L2_GRID, n_folds=N_FOLDS, max_workers=MAX_WORKERS, n_boot=N_BOOT
+    )
+    elapsed = time.perf_counter() - start
+    model.save(MODEL_PATH)
+
+    start = time.perf_counter()
+    model.predict_proba(X)
+    per_call_us = (time.perf_counter() - start) / len(X) * 1e6
+
+    print(json.dumps(cv_metrics, indent=4))
+    print(f"\nCross-validated {len(L2_GRID)} x {N_FOLDS} fits on {len(X)} calls in {elapsed:.2f}s")
+    print(f"Scoring: {per_call_us:.1f} us/call (from feature vectors)")
+    print("Top features:")
+    for name, weight in model.top_features(10):
+        print(f"  {name:<32}{weight:+.3f}")
+    print(f"Saved model to {MODEL_PATH} ({os.path.getsize(MODEL_PATH)} bytes)")
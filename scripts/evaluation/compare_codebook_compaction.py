@@ -0,0 +1,99 @@
+import os
+import time
+
+import pandas as pd
+
+from src.general_file_utils.utils.path_strings import get_path_of_file_w_latest_unix_timestamp
+from src.llm_tools.prompt_evaluation import (
+    PromptVariant,
+    run_prompt_ab_evaluation,
+    sample_reference_transcripts,
+)
+from src.llm_tools.usage_ledger import UsageLedger
+from src.ml_scam_classification.classification.scam_classifier import SCAM_LABEL_COL
+from src.ml_scam_classification.codebook.behavior_codebook import load_behavior_codebook
+from src.ml_scam_classification.codebook.codebook_compiler import (
+    COMPACTION_LEVELS,
+    codebook_token_report,
+    compile_tagging_instructions,
+)
+
+from src.rate_limits.registry import get_rate_limit_registry
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+FEATURES_PATH = "src/ml_scam_classification/prompting/features_v2.json"
+COMPILED_PROMPTS_DIR = "outputs/compiled_prompts"
+LEVELS = COMPACTION_LEVELS  # ("full", "gloss", "keywords")
+MODEL = "gpt-4o-2024-11-20"
+MODEL_ROLE = "You are a call analysis system creating useful features to input to a scam detection model."
+
+# Set to False to only compile the renderings and print the token estimates (no API calls)
+RUN_EVALUATION = True
+COMPILED_DIRPATH = "src/ml_scam_classification/data/compiled"
+FEATURE_STORE_DIR = "outputs/feature_store"
+# Feature store partition holding reference labels over FEATURES_PATH codes (scripts/ETL/import_reference_labels.py)
+REFERENCE_PROMPT_VERSION = "reference"
+SAMPLE_SIZE = 20
+SEED = 0
+MAX_CONCURRENT_TRANSCRIPTS = 3
+MAX_RUN_COST_USD = 10.00
+REPORT_PATH = f"outputs/codebook_compaction__{time.time_ns()}.csv"
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    codebook = load_behavior_codebook(FEATURES_PATH)
+    base_name = os.path.splitext(os.path.basename(FEATURES_PATH))[0]
+    os.makedirs(COMPILED_PROMPTS_DIR, exist_ok=True)
+
+    variants = []
+    for level in LEVELS:
+        path = os.path.join(COMPILED_PROMPTS_DIR, f"{base_name}__{level}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(compile_tagging_instructions(codebook, level))
+        # compaction rewords the descriptions on purpose: check the codes against the source codebook
+        variants.append(PromptVariant(f"{base_name}__{level}", path, MODEL, MODEL_ROLE, codebook_path=FEATURES_PATH))
+        print(f"Wrote {path}")
+
+    token_report = pd.DataFrame(codebook_token_report(codebook, LEVELS))
+    token_report["variant"] = [v.name for v in variants]
+    print(token_report.to_string(index=False))
+
+    if RUN_EVALUATION:
+        df = pd.read_csv(get_path_of_file_w_latest_unix_timestamp(COMPILED_DIRPATH))
+        transcripts, reference, codes = sample_reference_transcripts(
+            df,
+            SAMPLE_SIZE,
+            prompt_version=REFERENCE_PROMPT_VERSION,
+            feature_store_dir=FEATURE_STORE_DIR,
+            label_col=SCAM_LABEL_COL,
+            seed=SEED,
+        )
+        missing_codes = sorted(set(codes) - set(codebook))
+        if missing_codes:
+            raise ValueError(f"Reference labels use codes not in {FEATURES_PATH}: {missing_codes}")
+
+        ledger = UsageLedger(max_cost_usd=MAX_RUN_COST_USD, ledger_path=f"{os.path.splitext(REPORT_PATH)[0]}__usage.jsonl")
+        report = run_prompt_ab_evaluation(
+            variants,
+            transcripts,
+            reference,
+            codes,
+            rl=get_rate_limit_registry().for_model(MODEL),
+            ledger=ledger,
+            max_concurrent_transcripts=MAX_CONCURRENT_TRANSCRIPTS,
+            reference_codebook=codebook,
+        )
+        report = token_report.merge(report, on="variant")
+
+        report.to_csv(REPORT_PATH, index=False)
+        print(report.to_string(index=False))
+        print(f"\n{ledger.format_summary()}")
+        print(f"Wrote report to {REPORT_PATH}")
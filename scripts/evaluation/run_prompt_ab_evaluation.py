@@ -0,0 +1,94 @@
+import os
+import time
+
+import pandas as pd
+
+from src.general_file_utils.utils.path_strings import get_path_of_file_w_latest_unix_timestamp
+from src.llm_tools.prompt_evaluation import (
+    PromptVariant,
+    run_prompt_ab_evaluation,
+    sample_reference_transcripts,
+)
+from src.llm_tools.usage_ledger import UsageLedger
+from src.ml_scam_classification.classification.scam_classifier import SCAM_LABEL_COL
+from src.ml_scam_classification.codebook.behavior_codebook import load_codebook
+
+from src.rate_limits.registry import get_rate_limit_registry
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+PROMPT_DIR = "src/ml_scam_classification/prompting"
+MODEL_ROLE = "You are a call analysis system creating useful features to input to a scam detection model."
+# Codebook the reference labels were annotated with (features*.json or a prompt). Variants whose prompt
+# defines the reference codes differently are skipped: e.g. prompt_conner_v5_w_behaviorsv2.txt and
+# prompt_celeste_v2.txt reuse the v7 code ids for other behaviors.
+REFERENCE_CODEBOOK_PATH = f"{PROMPT_DIR}/prompt_conner_v7.txt"
+VARIANTS = [
+    PromptVariant("conner_v7", f"{PROMPT_DIR}/prompt_conner_v7.txt", "gpt-4o-2024-11-20", MODEL_ROLE),
+    PromptVariant("conner_v7_mini", f"{PROMPT_DIR}/prompt_conner_v7.txt", "gpt-4o-mini", MODEL_ROLE),
+]
+
+# One limiter is shared by every variant (conservative when variants use different models)
+RATE_LIMIT_MODEL = "gpt-4o-2024-11-20"
+COMPILED_DIRPATH = "src/ml_scam_classification/data/compiled"
+FEATURE_STORE_DIR = "outputs/feature_store"
+# Feature store partition holding the reference (hand-annotated) labels, written by
+# scripts/ETL/import_reference_labels.py; matched to the compiled csv's transcripts by transcript_sha256
+REFERENCE_PROMPT_VERSION = "reference"
+SOURCE_ONEHOT_COLS = [
+    'source_internet_search__onehot',
+    'source_candor__onehot',
+    'source_youtube1__onehot',
+    'source_youtube2__onehot',
+    'source_myrecordedcalls__onehot',
+]
+SAMPLE_SIZE = 20
+SEED = 0
+
+MAX_CONCURRENT_TRANSCRIPTS = 4       # (variant, transcript) jobs in flight, sharing one rate limiter
+MAX_CONCURRENT_LINE_REQUESTS = None  # per job: None -> lines sequentially in one conversation
+MAX_RUN_COST_USD = 10.00
+REPORT_PATH = f"outputs/prompt_ab__{time.time_ns()}.csv"
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    df = pd.read_csv(get_path_of_file_w_latest_unix_timestamp(COMPILED_DIRPATH))
+
+    # only transcripts with reference labels are eligible; stratify by scam label and source
+    transcripts, reference, codes = sample_reference_transcripts(
+        df,
+        SAMPLE_SIZE,
+        prompt_version=REFERENCE_PROMPT_VERSION,
+        feature_store_dir=FEATURE_STORE_DIR,
+        label_col=SCAM_LABEL_COL,
+        onehot_cols=SOURCE_ONEHOT_COLS,
+        seed=SEED,
+    )
+
+    ledger = UsageLedger(max_cost_usd=MAX_RUN_COST_USD, ledger_path=f"{os.path.splitext(REPORT_PATH)[0]}__usage.jsonl")
+    start = time.perf_counter()
+    report = run_prompt_ab_evaluation(
+        VARIANTS,
+        transcripts,
+        reference,
+        codes,
+        rl=get_rate_limit_registry().for_model(RATE_LIMIT_MODEL),
+        ledger=ledger,
+        max_concurrent_transcripts=MAX_CONCURRENT_TRANSCRIPTS,
+        max_concurrent_line_requests=MAX_CONCURRENT_LINE_REQUESTS,
+        reference_codebook=load_codebook(REFERENCE_CODEBOOK_PATH),
+    )
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(REPORT_PATH) or ".", exist_ok=True)
+    report.to_csv(REPORT_PATH, index=False)
+    print(report.to_string(index=False))
+    print(f"\n{len(VARIANTS)} variants x {len(transcripts)} transcripts in {elapsed:.1f}s; {ledger.format_summary()}")
+    print(f"Wrote report to {REPORT_PATH}")
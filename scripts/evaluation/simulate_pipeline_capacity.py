@@ -0,0 +1,62 @@
+import os
+import time
+
+import pandas as pd
+
+from src.llm_tools.pipeline_simulator import (
+    LatencyModel,
+    SchedulingStrategy,
+    Workload,
+    cleaned_transcript_line_counts,
+    compare_strategies,
+)
+from src.rate_limits.registry import get_rate_limit_registry
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+RATE_LIMIT_NAME = "gpt-5"                     # rpm (per key) from the rate limits config
+REQUEST_LOG_PATH = "outputs/logs/run.jsonl"   # cout_log_jsonl of past runs; None -> LatencyModel defaults
+CLEANED_TRANSCRIPTS_DIR = "outputs/cleaned_transcripts"
+N_TRANSCRIPTS = None                          # None -> every cached cleaned transcript
+TAGGING_TOKENS_PER_LINE = 150                 # json tagging; ~15 with the sparse output format
+SEED = 0
+
+STRATEGIES = {
+    "sequential (current default)": SchedulingStrategy(),
+    "fan out 4": SchedulingStrategy(max_concurrent_line_requests=4),
+    "fan out 8": SchedulingStrategy(max_concurrent_line_requests=8),
+    "fan out 8, 5 lines/request": SchedulingStrategy(max_concurrent_line_requests=8, lines_per_request=5),
+    "fan out 8, 5 lines/request, gcra": SchedulingStrategy(max_concurrent_line_requests=8, lines_per_request=5, limiter_backend="gcra"),
+    "fan out 8, 5 lines/request, 2 transcripts": SchedulingStrategy(max_concurrent_line_requests=8, lines_per_request=5, max_concurrent_transcripts=2),
+    "fan out 8, 5 lines/request, 2 keys": SchedulingStrategy(max_concurrent_line_requests=8, lines_per_request=5, max_concurrent_transcripts=2, n_api_keys=2),
+}
+REPORT_PATH = f"outputs/capacity_simulation__{time.time_ns()}.csv"
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    spec = get_rate_limit_registry().spec(RATE_LIMIT_NAME)
+    if REQUEST_LOG_PATH is None:
+        latency_model = LatencyModel()
+    else:
+        latency_model = LatencyModel.from_request_log(REQUEST_LOG_PATH, model=spec.model or spec.name)
+    print(f"Latency model: {latency_model}")
+
+    lines = cleaned_transcript_line_counts(CLEANED_TRANSCRIPTS_DIR)[:N_TRANSCRIPTS]
+    workload = Workload(transcript_lines=lines, tagging_tokens_per_line=TAGGING_TOKENS_PER_LINE)
+    report = compare_strategies(STRATEGIES, workload, latency_model, rpm=spec.rpm, seed=SEED)
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(report[[
+            "strategy", "transcripts_per_hour", "makespan_h", "n_failed_transcripts", "limiter_utilization",
+            "permit_wait_s_mean", "permit_wait_s_p95", "waiting_for_permit_max", "transcript_latency_s_p95", "sim_cpu_s",
+        ]].round(3).to_string(index=False))
+    os.makedirs(os.path.dirname(REPORT_PATH) or ".", exist_ok=True)
+    report.to_csv(REPORT_PATH, index=False)
+    print(f"Report written to {REPORT_PATH}")
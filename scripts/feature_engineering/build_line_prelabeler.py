@@ -0,0 +1,45 @@
+import glob
+import os
+
+from src.ml_scam_classification.classification.line_prelabeler import LinePrelabeler, load_labeled_line_jsons
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+# Accumulated LLM-labeled outputs (per-line behavior jsons) to learn from
+LABELED_OUTPUT_GLOB = "outputs/*__chatgpt__feat_out_v7.json"
+PRELABELER_PATH = "outputs/line_prelabeler/line_prelabeler_v7.npz"
+
+K_NEIGHBOURS = 5
+MIN_SIMILARITY = 0.9   # nearest labeled line must be at least this cosine-similar to label locally
+MIN_AGREEMENT = 1.0    # 1.0 -> neighbours must agree on every behavior
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    paths = sorted(glob.glob(LABELED_OUTPUT_GLOB))
+    if not paths:
+        raise FileNotFoundError(f"No labeled outputs match: {LABELED_OUTPUT_GLOB}")
+
+    line_objs = load_labeled_line_jsons(paths)
+    if not line_objs:
+        raise ValueError(f"No labeled line jsons found in {len(paths)} file(s) matching {LABELED_OUTPUT_GLOB}")
+
+    prelabeler = LinePrelabeler.from_line_jsons(
+        line_objs, k=K_NEIGHBOURS, min_similarity=MIN_SIMILARITY, min_agreement=MIN_AGREEMENT
+    )
+    prelabeler.save(PRELABELER_PATH)
+
+    # How much of the history itself would have been labeled locally (leave-in estimate, upper bound)
+    _, confident, _ = prelabeler.predict(
+        [o["transcript_segment"] for o in line_objs], [o.get("speaker", "") for o in line_objs]
+    )
+    print(f"Files read: {len(paths)}")
+    print(f"Labeled lines: {len(prelabeler)}, behavior codes: {len(prelabeler.codes)}")
+    print(f"Confident on {confident.mean():.1%} of training lines")
+    print(f"Saved pre-labeler to: {os.path.abspath(PRELABELER_PATH)}")
@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pandas as pd
+
+from src.llm_tools.codebook_relabel import relabel_changed_codes
+from src.llm_tools.usage_ledger import UsageLedger
+from src.ml_scam_classification.codebook.behavior_codebook import load_codebook
+from src.ml_scam_classification.codebook.codebook_diff import diff_codebooks
+
+from src.rate_limits.registry import get_rate_limit_registry
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+# Codebooks: a features*.json file or a prompt with an embedded codebook
+OLD_CODEBOOK_PATH = "src/ml_scam_classification/prompting/features.json"
+NEW_CODEBOOK_PATH = "src/ml_scam_classification/prompting/features_v2.json"
+OLD_PROMPT_VERSION = "v7"      # feature store partition holding the existing labels
+NEW_PROMPT_VERSION = "v8"      # partition the merged labels are written to
+MODEL = "gpt-4o-2024-11-20"
+MODEL_ROLE = "You are a call analysis system creating useful features to input to a scam detection model."
+SOURCE = None
+PATH_TO_CONV_DATA = "src/ml_scam_classification/data/call_transcripts_scam_determination/raw_data/call_transcripts_scam_determination_conv_only.csv"
+FEATURE_STORE_DIR = "outputs/feature_store"
+MAX_CONCURRENT_LINE_REQUESTS = 8
+MAX_SKIPPED_FRACTION = 0.05  # fail (before tagging) if more transcripts than this can't be aligned with their rows
+DRY_RUN = True  # only print the diff
+
+MAX_RUN_COST_USD = 5.00
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        raise ValueError("usage: script.py (edit MASTER SETTINGS)")
+
+    old_codebook = load_codebook(OLD_CODEBOOK_PATH)
+    new_codebook = load_codebook(NEW_CODEBOOK_PATH)
+    diff = diff_codebooks(old_codebook, new_codebook)
+    print(diff.format_report(old_codebook, new_codebook))
+
+    if DRY_RUN:
+        sys.exit(0)
+
+    transcripts = pd.read_csv(PATH_TO_CONV_DATA).iloc[:, 0].astype(str).to_dict()
+    ledger = UsageLedger(
+        max_cost_usd=MAX_RUN_COST_USD,
+        ledger_path=os.path.join(FEATURE_STORE_DIR, f"relabel_{OLD_PROMPT_VERSION}_to_{NEW_PROMPT_VERSION}__usage.jsonl"),
+    )
+    written = relabel_changed_codes(
+        transcripts,
+        diff,
+        new_codebook,
+        rl=get_rate_limit_registry().for_model(MODEL),
+        model=MODEL,
+        role=MODEL_ROLE,
+        old_prompt_version=OLD_PROMPT_VERSION,
+        new_prompt_version=NEW_PROMPT_VERSION,
+        source=SOURCE,
+        feature_store_dir=FEATURE_STORE_DIR,
+        ledger=ledger,
+        max_concurrent_line_requests=MAX_CONCURRENT_LINE_REQUESTS,
+        max_skipped_fraction=MAX_SKIPPED_FRACTION,
+    )
+    print(f"Wrote {len(written)} file(s)")
+    print(f"Usage: {ledger.format_summary()}")
@@ -4,10 +4,14 @@ import os
 
 from src.llm_tools.chatgpt_feature_extraction import run_chatgpt_behavioral_analysis
 from src.ml_scam_classification.utils.file_utils import ensure_file_versioning_ok
+from src.llm_tools.usage_ledger import UsageLedger
+from src.ml_scam_classification.classification.line_prelabeler import LinePrelabeler
+from src.ml_scam_classification.codebook.behavior_codebook import load_codebook
+from src.llm_tools.request_hedging import RequestHedger
+from src.llm_tools.deadlines import Deadline
+from src.rate_limits.models.limiter_metrics import LimiterMetricsDumper
 
-# 🔒 Rate limit object (placeholder import; point this to your real settings module)
-# e.g., define GPT4O_15RPM in settings/ratelimits.py using your RateLimiter class
-from settings.rate_limits.llms.chatgpt.GPT_5 import GPT_5_10RPM
+from src.rate_limits.registry import get_rate_limit_registry
 
 
 if __name__ == "__main__":
@@ -28,6 +32,43 @@ if __name__ == "__main__":
         f"src/ml_scam_classification/prompting/prompt_conner{VERSIONING_PREFIX}{str(VERSION_TO_USE)}_contd.txt"
         if n_args < 3 else sys.argv[2]
     )
+    # Two-phase mode: set to a cleaning prompt to cache cleaned/speaker-attributed transcripts
+    # (outputs/cleaned_transcripts/) and only re-run behavior tagging when the codebook changes
+    CLEANING_PROMPT_PATH = None  # e.g. "src/ml_scam_classification/prompting/prompt_cleaning_v1.txt"
+    MAX_CONCURRENT_LINE_REQUESTS = None  # two-phase mode only: e.g. 8 -> tag up to 8 lines/batches at once
+    LINES_PER_REQUEST = 1
+    # Two-phase mode only: label routine lines locally with a nearest-neighbour pre-labeler built from
+    # past LLM labels (scripts/feature_engineering/build_line_prelabeler.py); updated and re-saved after the run.
+    # A path that doesn't exist yet starts an empty pre-labeler over the prompt's codes, learning from this run
+    PRELABELER_PATH = None  # e.g. "outputs/line_prelabeler/line_prelabeler_v7.npz"
+    PRELABELER = None
+    if PRELABELER_PATH:
+        TAGGING_CODES = list(load_codebook(SELECTED_PROMPT_PATH))
+        if os.path.exists(PRELABELER_PATH):
+            PRELABELER = LinePrelabeler.load(PRELABELER_PATH)
+            if set(PRELABELER.codes) != set(TAGGING_CODES):
+                raise ValueError(
+                    f"Pre-labeler {PRELABELER_PATH} codes don't match the codebook of {SELECTED_PROMPT_PATH}: "
+                    f"{len(set(PRELABELER.codes) - set(TAGGING_CODES))} extra, "
+                    f"{len(set(TAGGING_CODES) - set(PRELABELER.codes))} missing"
+                )
+        else:
+            PRELABELER = LinePrelabeler(TAGGING_CODES)
+    FEATURE_STORE_DIR = None  # e.g. "outputs/feature_store" -> also append results to the Parquet feature store
+    # Hedging: a request slower than the recent p95 gets one duplicate (if the rate limiter has a free
+    # permit); the first response wins. Costs up to HEDGE_MAX_FRACTION extra requests.
+    HEDGE_REQUESTS = False
+    HEDGE_MAX_FRACTION = 0.1
+    HEDGER = RequestHedger(quantile=0.95, max_hedge_fraction=HEDGE_MAX_FRACTION) if HEDGE_REQUESTS else None
+    # Deadlines: each request attempt (rate-limit wait + HTTP call) gets REQUEST_TIMEOUT_S; timed-out work
+    # is retried/requeued. Once RUN_DEADLINE_S has passed the run pauses cleanly (None = no run limit).
+    RUN_DEADLINE_S = None  # e.g. 4 * 3600
+    REQUEST_TIMEOUT_S = 300
+    # Rate limiter metrics (permits, wait histogram, time at capacity) dumped every 15s while running;
+    # "prometheus" writes a node_exporter textfile, "json" a snapshot file
+    LIMITER_METRICS_PATH = None  # e.g. "outputs/metrics/rate_limiters.prom"
+    LIMITER_METRICS_FORMAT = "prometheus"
+    MODEL = "gpt-4o-2024-11-20"
     PATH_TO_CONV_DATA = "src/ml_scam_classification/data/call_transcripts_scam_determination/raw_data/call_transcripts_scam_determination_conv_only.csv"
 
     ######## MASTER SETTINGS - careful when adjusting these as they may have filesystem implications
@@ -35,6 +76,15 @@ if __name__ == "__main__":
     FORCE_ACCEPT_NONMAX_VERSION = False  # prompt user to double-check?
     RESPONSE_WRITEPATH = f"outputs/{time.time_ns()}__chatgpt__feat_out{VERSIONING_PREFIX}{str(VERSION_TO_USE)}.json"
 
+    # BUDGET - the run pauses cleanly once either ceiling is reached (None disables a ceiling)
+    MAX_RUN_COST_USD = 5.00
+    MAX_RUN_TOKENS = None
+    LEDGER = UsageLedger(
+        max_cost_usd=MAX_RUN_COST_USD,
+        max_total_tokens=MAX_RUN_TOKENS,
+        ledger_path=f"{os.path.splitext(RESPONSE_WRITEPATH)[0]}__usage.jsonl",
+    )
+
     # Ensure output dir exists
     os.makedirs(os.path.dirname(RESPONSE_WRITEPATH) or ".", exist_ok=True)
 
@@ -49,16 +99,35 @@ if __name__ == "__main__":
             FORCE_ACCEPT_NONMAX_VERSION=FORCE_ACCEPT_NONMAX_VERSION,
         )
 
-    # Run with required rate limiter (GPT_5_10RPM). The function will call rl.wait() internally.
+    # Rate limiter for MODEL from src/rate_limits/rate_limits.json (loaded/created here, on first use)
+    RL = get_rate_limit_registry().for_model(MODEL)
+
+    # Run deadline starts now (after any interactive checks above)
+    DEADLINE = Deadline.after(RUN_DEADLINE_S, request_timeout_s=REQUEST_TIMEOUT_S)
+    METRICS_DUMPER = (
+        LimiterMetricsDumper([RL], LIMITER_METRICS_PATH, fmt=LIMITER_METRICS_FORMAT).start()
+        if LIMITER_METRICS_PATH else None
+    )
+
+    # Run with required rate limiter (RL). The function will call rl.wait() internally.
     if n_args == 1:
         run_chatgpt_behavioral_analysis(
             prompt_filepath=SELECTED_PROMPT_PATH,
             continuation_prompt_filepath=SELECTED_PROMPT_CONT_PATH,
             path_to_data=PATH_TO_CONV_DATA,
             response_writepath=RESPONSE_WRITEPATH,
-            model="gpt-4o-2024-11-20",
+            model=MODEL,
             model_role="You are a call analysis system creating useful features to input to a scam detection model.",
-            rl=GPT_5_10RPM,  # <-- pass RL
+            rl=RL,  # <-- pass RL
+            ledger=LEDGER,
+            cleaning_prompt_filepath=CLEANING_PROMPT_PATH,
+            max_concurrent_line_requests=MAX_CONCURRENT_LINE_REQUESTS,
+            lines_per_request=LINES_PER_REQUEST,
+            prelabeler=PRELABELER,
+            feature_store_dir=FEATURE_STORE_DIR,
+            hedger=HEDGER,
+            deadline=DEADLINE,
+            prompt_version=f"v{VERSION_TO_USE}",
             start_transcript_index=0,
             end_transcript_index=1,
         )
@@ -68,9 +137,17 @@ if __name__ == "__main__":
             continuation_prompt_filepath=SELECTED_PROMPT_CONT_PATH,
             path_to_data=PATH_TO_CONV_DATA,
             response_writepath=RESPONSE_WRITEPATH,
-            model="gpt-4o-2024-11-20",
+            model=MODEL,
             model_role="You are a call analysis system creating useful features to input to a scam detection model.",
-            rl=GPT_5_10RPM,  # <-- pass RL
+            rl=RL,  # <-- pass RL
+            ledger=LEDGER,
+            cleaning_prompt_filepath=CLEANING_PROMPT_PATH,
+            max_concurrent_line_requests=MAX_CONCURRENT_LINE_REQUESTS,
+            lines_per_request=LINES_PER_REQUEST,
+            prelabeler=PRELABELER,
+            feature_store_dir=FEATURE_STORE_DIR,
+            hedger=HEDGER,
+            deadline=DEADLINE,
             start_transcript_index=0,
             end_transcript_index=1,
         )
@@ -80,9 +157,22 @@ if __name__ == "__main__":
             continuation_prompt_filepath=sys.argv[2],
             path_to_data=PATH_TO_CONV_DATA,
             response_writepath=RESPONSE_WRITEPATH,
-            model="gpt-4o-2024-11-20",
+            model=MODEL,
             model_role="You are a call analysis system creating useful features to input to a scam detection model.",
-            rl=GPT_5_10RPM,  # <-- pass RL
+            rl=RL,  # <-- pass RL
+            ledger=LEDGER,
+            cleaning_prompt_filepath=CLEANING_PROMPT_PATH,
+            max_concurrent_line_requests=MAX_CONCURRENT_LINE_REQUESTS,
+            lines_per_request=LINES_PER_REQUEST,
+            prelabeler=PRELABELER,
+            feature_store_dir=FEATURE_STORE_DIR,
+            hedger=HEDGER,
+            deadline=DEADLINE,
             start_transcript_index=0,
             end_transcript_index=1,
         )
+
+    if METRICS_DUMPER is not None:
+        METRICS_DUMPER.stop()
+    if PRELABELER is not None:
+        PRELABELER.save(PRELABELER_PATH)
@@ -4,9 +4,9 @@ import os
 
 from src.llm_tools.gemini_feature_extraction import run_gemini_behavioral_analysis
 from src.ml_scam_classification.utils.file_utils import ensure_file_versioning_ok
+from src.llm_tools.usage_ledger import UsageLedger
 
-# Project-specific rate limit object (blocks via rl.wait() inside Gemini calls)
-from settings.rate_limits.llms.gemini.pro_2_5 import GEMINI_2_5_PRO_5RPM as GEMINI_RL
+from src.rate_limits.registry import get_rate_limiter
 
 
 if __name__ == "__main__":
@@ -20,6 +20,10 @@ if __name__ == "__main__":
     PROMPT_FILE_ID_SUBSTR = "prompt"  # Assuming all prompt files contain kw: "prompt" somewhere in filename
     FORCE_ACCEPT_NONMAX_VERSION = False  # Will prompt user to double-check if set to true
 
+    # BUDGET - the run pauses cleanly once either ceiling is reached (None disables a ceiling)
+    MAX_RUN_COST_USD = 5.00
+    MAX_RUN_TOKENS = None
+
     ensure_file_versioning_ok(
         folder_to_check=PROMPT_FOLDER_LOCATION,
         versioning_prefix=VERSIONING_PREFIX,
@@ -36,23 +40,32 @@ if __name__ == "__main__":
 
     n_args = len(sys.argv)
 
+    LEDGER = UsageLedger(
+        max_cost_usd=MAX_RUN_COST_USD,
+        max_total_tokens=MAX_RUN_TOKENS,
+        ledger_path=f"outputs/{time.time_ns()}__gemini__usage{VERSIONING_PREFIX}{VERSION_TO_USE}.jsonl",
+    )
+
     if n_args == 1:
         run_gemini_behavioral_analysis(
             prompt_filepath=SELECTED_PROMPT_PATH,
             response_writepath=mk_output_path(),
-            rl=GEMINI_RL,  # <-- pass the rate limiter
+            rl=get_rate_limiter("gemini-2.5-pro"),  # <-- pass the rate limiter (src/rate_limits/rate_limits.json)
+            ledger=LEDGER,
         )
     elif n_args == 2:
         run_gemini_behavioral_analysis(
             prompt_filepath=sys.argv[1],
             response_writepath=mk_output_path(),
-            rl=GEMINI_RL,  # <-- pass the rate limiter
+            rl=get_rate_limiter("gemini-2.5-pro"),  # <-- pass the rate limiter (src/rate_limits/rate_limits.json)
+            ledger=LEDGER,
         )
     elif n_args == 3:
         run_gemini_behavioral_analysis(
             prompt_filepath=sys.argv[1],
             response_writepath=sys.argv[2],
-            rl=GEMINI_RL,  # <-- pass the rate limiter
+            rl=get_rate_limiter("gemini-2.5-pro"),  # <-- pass the rate limiter (src/rate_limits/rate_limits.json)
+            ledger=LEDGER,
         )
     else:
         raise ValueError("Usage: script.py [<path_to_prompt>] [<response_writepath>]")
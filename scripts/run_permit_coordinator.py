@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+from src.rate_limits.models.permit_coordinator import PermitCoordinator
+from src.rate_limits.registry import get_rate_limit_registry
+
+#=============================#
+#       MASTER SETTINGS       #
+#=============================#
+
+# Serves the rpm of this rate limit (from the rate limits config) to every worker process whose
+# config entry has "backend": "coordinator" and "coordinator_address" set to ADDRESS.
+RATE_LIMIT_NAME = "gpt-5"
+ADDRESS = "outputs/rate_limits/gpt-5.sock"  # Unix socket path, or ("0.0.0.0", 8765) for TCP
+LEASE_TTL_S = 5.0
+MAX_LEASE_SIZE = 100
+
+# ----------------------------#
+
+#============================#
+#         MAIN BLOCK         #
+#============================#
+
+if __name__ == "__main__":
+    spec = get_rate_limit_registry().spec(RATE_LIMIT_NAME)
+    coordinator = PermitCoordinator(spec.rpm, lease_ttl_s=LEASE_TTL_S, max_lease_size=MAX_LEASE_SIZE)
+    if isinstance(ADDRESS, str):
+        os.makedirs(os.path.dirname(ADDRESS) or ".", exist_ok=True)
+    print(f"Serving {spec.rpm} rpm for {RATE_LIMIT_NAME!r} at {ADDRESS}")
+    asyncio.run(coordinator.serve(ADDRESS))
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+_WS_RE = re.compile(r"\s+")
+
+_LOW_32 = np.uint64(0xFFFFFFFF)
+_SHIFT_32 = np.uint64(32)
+
+
+def normalize_transcript_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so cosmetic edits don't change shingles."""
+    text = _NON_WORD_RE.sub(" ", str(text).lower())
+    return _WS_RE.sub(" ", text).strip()
+
+
+def char_shingle_hashes(text: str, shingle_len: int = 9) -> np.ndarray:
+    """
+    Hash every `shingle_len`-character window of the normalized text to a uint64.
+
+    Vectorized polynomial hash: the text is viewed as a uint32 array of code points,
+    windows are taken with sliding_window_view and reduced with a dot product against
+    fixed powers (uint64 arithmetic wraps, which is fine for hashing).
+    Returns the unique shingle hashes (possibly empty).
+    """
+    norm = normalize_transcript_text(text)
+    if len(norm) < shingle_len:
+        if not norm:
+            return np.empty(0, dtype=np.uint64)
+        norm = norm.ljust(shingle_len)
+
+    codes = np.frombuffer(norm.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(codes, shingle_len)
+    powers = np.uint64(1_000_003) ** np.arange(shingle_len, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        hashes = (windows * powers).sum(axis=1, dtype=np.uint64)
+    return np.unique(hashes)
+
+
+def _optimal_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows <= num_perm so the LSH S-curve
+    inflection point (1 / bands) ** (1 / rows) is as close as possible to threshold.
+    """
+    best = (1, num_perm)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if bands < 1:
+            break
+        err = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH index for finding near-duplicate transcripts.
+
+    - Each transcript is reduced to its set of character shingles, then to a
+      `num_perm`-long MinHash signature (all permutations computed at once in NumPy).
+    - Signatures are split into LSH bands; transcripts sharing any band bucket are
+      candidate pairs, which are then confirmed by estimated Jaccard >= threshold.
+    - Confirmed pairs are merged with union-find; the lowest index in each cluster
+      is its representative (the one that should actually be sent to the LLM).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        *,
+        num_perm: int = 128,
+        shingle_len: int = 9,
+        seed: int = 1,
+    ):
+        if not (0.0 < threshold <= 1.0):
+            raise ValueError("threshold (Jaccard similarity) must be in (0, 1].")
+        if not (isinstance(num_perm, int) and num_perm > 0):
+            raise ValueError("num_perm must be a positive int.")
+        if not (isinstance(shingle_len, int) and shingle_len > 0):
+            raise ValueError("shingle_len must be a positive int.")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_len = shingle_len
+        self.bands, self.rows = _optimal_bands(num_perm, threshold)
+
+        rng = np.random.default_rng(seed)
+        # multiply-add-shift hash family ((a * x + b) mod 2**64) >> 32 over 32-bit keys,
+        # one (a, b) pair per permutation
+        max_u64 = np.iinfo(np.uint64).max
+        self._a = rng.integers(1, max_u64, size=num_perm, dtype=np.uint64, endpoint=True)
+        self._b = rng.integers(0, max_u64, size=num_perm, dtype=np.uint64, endpoint=True)
+
+        self._signatures: List[np.ndarray] = []
+        self._buckets: List[Dict[bytes, List[int]]] = [dict() for _ in range(self.bands)]
+        self._parent: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    # -- Signatures --
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (uint64[num_perm]) of one transcript."""
+        shingles = char_shingle_hashes(text, self.shingle_len)
+        if shingles.size == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        # fold 64-bit shingle hashes down to 32-bit keys
+        keys = (shingles ^ (shingles >> _SHIFT_32)) & _LOW_32
+        with np.errstate(over="ignore"):
+            permuted = (self._a[:, None] * keys[None, :] + self._b[:, None]) >> _SHIFT_32
+        return permuted.min(axis=1)
+
+    @staticmethod
+    def estimated_jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        return float(np.count_nonzero(sig_a == sig_b)) / sig_a.size
+
+    # -- Union-find --
+
+    def _find(self, i: int) -> int:
+        parent = self._parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def _union(self, i: int, j: int) -> None:
+        ri, rj = self._find(i), self._find(j)
+        if ri == rj:
+            return
+        # keep the lowest index as root so it stays the cluster representative
+        if ri < rj:
+            self._parent[rj] = ri
+        else:
+            self._parent[ri] = rj
+
+    # -- Indexing --
+
+    def add(self, text: str) -> int:
+        """Add a transcript, link it to any near-duplicates already indexed, and return its index."""
+        idx = len(self._signatures)
+        sig = self.signature(text)
+        self._signatures.append(sig)
+        self._parent.append(idx)
+
+        candidates = set()
+        band_width = self.rows
+        for band in range(self.bands):
+            key = sig[band * band_width:(band + 1) * band_width].tobytes()
+            bucket = self._buckets[band].setdefault(key, [])
+            candidates.update(bucket)
+            bucket.append(idx)
+
+        for other in candidates:
+            if self.estimated_jaccard(sig, self._signatures[other]) >= self.threshold:
+                self._union(idx, other)
+        return idx
+
+    def add_all(self, texts: Sequence[str]) -> "NearDuplicateIndex":
+        for text in texts:
+            self.add(text)
+        return self
+
+    # -- Results --
+
+    def representative(self, idx: int) -> int:
+        """Index of the transcript whose labels `idx` should reuse (itself if unique)."""
+        return self._find(idx)
+
+    def representatives(self) -> np.ndarray:
+        return np.array([self._find(i) for i in range(len(self))], dtype=np.int64)
+
+    def clusters(self, *, min_size: int = 2) -> Dict[int, List[int]]:
+        """Map representative index -> sorted member indices, for clusters of at least min_size."""
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(self)):
+            groups.setdefault(self._find(i), []).append(i)
+        return {rep: members for rep, members in groups.items() if len(members) >= min_size}
+
+    def report_rows(self) -> List[dict]:
+        """
+        One row per transcript in a duplicate cluster, e.g. for writing a CSV report:
+        transcript_idx, cluster_id (= representative idx), is_representative, est_jaccard_to_representative.
+        """
+        rows = []
+        for rep, members in sorted(self.clusters().items()):
+            rep_sig = self._signatures[rep]
+            for m in members:
+                rows.append({
+                    "transcript_idx": m,
+                    "cluster_id": rep,
+                    "is_representative": int(m == rep),
+                    "est_jaccard_to_representative": self.estimated_jaccard(self._signatures[m], rep_sig),
+                })
+        return rows
+
+
+def find_near_duplicate_representatives(
+    texts: Sequence[str],
+    threshold: float = 0.8,
+    **index_kwargs,
+) -> Tuple[np.ndarray, NearDuplicateIndex]:
+    """
+    Convenience wrapper: index all texts and return (representative idx per text, index).
+    representatives[i] == i for every transcript that must actually be processed.
+    """
+    index = NearDuplicateIndex(threshold, **index_kwargs).add_all(texts)
+    return index.representatives(), index
+
+
+def summarize_clusters(index: NearDuplicateIndex, *, source_labels: Optional[Sequence[str]] = None) -> str:
+    """Human-readable summary of the duplicate clusters found."""
+    clusters = index.clusters()
+    n_dupes = sum(len(m) - 1 for m in clusters.values())
+    lines = [
+        f"{len(index)} transcripts, {len(clusters)} near-duplicate clusters "
+        f"(Jaccard >= {index.threshold}), {n_dupes} transcripts reuse a representative's labels."
+    ]
+    for rep, members in sorted(clusters.items()):
+        if source_labels is not None:
+            desc = ", ".join(f"{m} ({source_labels[m]})" for m in members)
+        else:
+            desc = ", ".join(str(m) for m in members)
+        lines.append(f"   cluster {rep}: {desc}")
+    return "\n".join(lines)
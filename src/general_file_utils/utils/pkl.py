@@ -53,5 +53,5 @@ def overwrite_pkl(path: str, new_data) -> None:
     if not os.path.exists(path):
         raise FileNotFoundError(f"Attempted to overwrite .pkl file at non-existent path:\n{path}")
 
-    with open('data.pkl', 'wb') as file:
-        pickle.dump(new_data, file)
+    with open(path, 'wb') as file:
+        pickle.dump(new_data, file, protocol=pickle.HIGHEST_PROTOCOL)
@@ -1,11 +1,13 @@
 import os
+import json
 import time
-from typing import Protocol, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol, Optional, List, Sequence
 
 import pandas as pd
 
 from src.rate_limits.models.rate_limiter import RateLimiter
-from src.llm_tools.debug_utils import cout_log, cout_log_info
+from src.llm_tools.structured_logging import get_logger
 from src.ml_scam_classification.utils.json_utils import (
     is_json,
     convert_list_json_str_to_json_list,
@@ -19,6 +21,23 @@ from src.llm_tools.chatgpt_utils import (
     estimate_remaining_lines,
 )
 from src.llm_tools.llm_utils import get_json_from_llm_response
+from src.llm_tools.circuit_breaker import CircuitOpen
+from src.llm_tools.deadlines import Deadline, DeadlineExceeded
+from src.llm_tools.request_hedging import RequestHedger
+from src.llm_tools.usage_ledger import UsageLedger, BudgetExceeded
+from src.llm_tools.cleaned_transcripts import (
+    CLEANED_TRANSCRIPTS_DIR,
+    get_or_create_cleaned_transcript,
+    extract_behavior_tagging_instructions,
+    format_cleaned_lines_for_prompt,
+)
+from src.data_processing.near_duplicates import find_near_duplicate_representatives, summarize_clusters
+from src.ml_scam_classification.codebook.behavior_codebook import label_vector_to_behaviors_exhibited
+from src.ml_scam_classification.codebook.sparse_code_format import decode_sparse_response
+from src.ml_scam_classification.classification.line_prelabeler import LinePrelabeler
+from src.ml_scam_classification.features.feature_store import write_calls_to_feature_store
+
+log = get_logger("chatgpt_feature_extraction")
 
 # -- Data Loading and Filename Generation --
 
@@ -45,6 +64,12 @@ def process_transcript_into_behaviors_json(
     stop_index: Optional[int],
     *,
     rl: RateLimiter,
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
+    max_workers: Optional[int] = None,
+    lines_per_request: int = 1,
 ):
     """
     Process one transcript by:
@@ -52,6 +77,9 @@ def process_transcript_into_behaviors_json(
       2) Starting the conversation and extracting the first JSON answer
       3) Estimating how many extra responses (lines) are needed
       4) Iteratively continuing the conversation to collect all JSON responses
+         (or, with max_workers set and a known line count, requesting the remaining lines
+         concurrently, each request sharing the first exchange - which contains the cleaned
+         transcript - as its prefix; see fan_out_line_tagging)
     Returns a list of JSON responses (as strings).
     """
     # Add call transcript to main instructions to get first full prompt
@@ -70,6 +98,10 @@ def process_transcript_into_behaviors_json(
         rl=rl,                      # <-- inject rate limiter
         system_instructions=role,
         model=model,
+        ledger=ledger,
+        usage_tags=usage_tags,
+        hedger=hedger,
+        deadline=deadline,
     )
     print("Started initial request via ChatGPT conversation.")
 
@@ -85,6 +117,23 @@ def process_transcript_into_behaviors_json(
     remaining, is_estimated = estimate_remaining_lines(response, transcript_text)
     print("N Transcript lines remaining obtained.")
 
+    if max_workers is not None and not is_estimated:
+        json_parts.extend(fan_out_line_tagging(
+            conversation,
+            list(range(2, remaining + 2)),  # line 1 was handled by the first response
+            model,
+            rl=rl,
+            max_workers=max_workers,
+            lines_per_request=lines_per_request,
+            line_prefix="",
+            progress_prefix=build_progress_message(stop_index, total_transcripts, transcript_index),
+            ledger=ledger,
+            usage_tags=usage_tags,
+            hedger=hedger,
+            deadline=deadline,
+        ))
+        return json_parts
+
     for line in range(remaining):
         # Build progress message (extended info)
         progress_msg = (
@@ -100,6 +149,10 @@ def process_transcript_into_behaviors_json(
             prompt=cont_prompt,
             rl=rl,                   # <-- inject rate limiter
             model=model,
+            ledger=ledger,
+            usage_tags=usage_tags,
+            hedger=hedger,
+            deadline=deadline,
         )
         response = get_response_from_chatgpt_conversation(conversation)
 
@@ -116,6 +169,293 @@ def process_transcript_into_behaviors_json(
     return json_parts
 
 
+# -- Concurrent (fan-out) Line Tagging --
+
+def _parse_line_batch_response(response_text: str, line_nos: List[int]) -> List[str]:
+    """Parse a response for a batch of lines into one JSON string per line (in line order)."""
+    batch_json = get_json_from_llm_response(response_text)
+    if batch_json is None or not is_json(batch_json):
+        raise ValueError(f"Critical Error: JSON not parsed correctly for transcript lines {line_nos}.")
+    parsed = json.loads(batch_json)
+    if isinstance(parsed, dict):
+        parsed = [parsed]
+    if not isinstance(parsed, list) or len(parsed) != len(line_nos):
+        raise ValueError(
+            f"Critical Error: Expected {len(line_nos)} line json object(s) for lines {line_nos}, got: {batch_json[:200]}"
+        )
+    return [json.dumps(obj) for obj in parsed]
+
+
+def build_line_batch_request_prompt(line_nos: List[int], line_prefix: str = "L") -> str:
+    """The only part of a fan-out request that differs between requests (kept short, at the end)."""
+    if len(line_nos) == 1:
+        return (
+            f"Generate the json for line {line_prefix}{line_nos[0]} of the cleaned transcript only, "
+            "following the same structure. Directly following the json, output a line which says \"END OF JSON OUTPUT.\""
+        )
+    lines_str = ", ".join(f"{line_prefix}{n}" for n in line_nos)
+    return (
+        f"Generate the json for lines {lines_str} of the cleaned transcript only, following the same structure, "
+        "as a json list with one object per line in that order. "
+        "Directly following the json, output a line which says \"END OF JSON OUTPUT.\""
+    )
+
+
+def build_sparse_line_batch_request_prompt(line_nos: List[int], line_prefix: str = "L") -> str:
+    """Batch request for the sparse code-list format (one "L<n>|<C/R>|<codes>" line per segment)."""
+    lines_str = ", ".join(f"{line_prefix}{n}" for n in line_nos)
+    return f"Output the code line for segment(s) {lines_str} of the cleaned transcript only, in that order."
+
+
+def _parse_sparse_line_batch_response(response_text: str, line_nos: List[int], codes: Sequence[str]) -> List[str]:
+    """Decode a sparse batch response into one full per-line JSON string per line (in line order)."""
+    _, speakers, labels = decode_sparse_response(response_text, codes, expected_line_nos=line_nos)
+    return [
+        json.dumps({"speaker": speaker, "behaviors_exhibited": label_vector_to_behaviors_exhibited(vec, codes)})
+        for speaker, vec in zip(speakers, labels)
+    ]
+
+
+def fan_out_line_tagging(
+    prefix_conversation: list,
+    line_nos: List[int],
+    model: str,
+    *,
+    rl: RateLimiter,
+    max_workers: int,
+    lines_per_request: int = 1,
+    line_prefix: str = "L",
+    progress_prefix: str = "",
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
+    sparse_codes: Optional[Sequence[str]] = None,
+    max_requeues: int = 1,
+) -> List[str]:
+    """
+    Tag many transcript lines concurrently instead of one continue_conversation() after another.
+
+    Every request is prefix_conversation (the shared instructions + cleaned transcript, identical
+    across requests so provider-side prompt caching applies) plus one short user message asking
+    for a batch of `lines_per_request` lines. Requests run on `max_workers` threads, all sharing
+    `rl`; results are reassembled in line order.
+
+    With sparse_codes, the instructions must ask for the sparse code-list format (see
+    compile_sparse_tagging_instructions); responses are strictly decoded against sparse_codes
+    and expanded into the usual per-line json.
+
+    Batches that time out (DeadlineExceeded) are put back on the queue and re-run after the
+    others, up to max_requeues times, while the run deadline allows.
+    Returns one JSON string per line in line_nos.
+    """
+    if not (isinstance(max_workers, int) and max_workers >= 1):
+        raise ValueError("max_workers must be an int >= 1")
+    if not (isinstance(lines_per_request, int) and lines_per_request >= 1):
+        raise ValueError("lines_per_request must be an int >= 1")
+    if not (isinstance(max_requeues, int) and max_requeues >= 0):
+        raise ValueError("max_requeues must be an int >= 0")
+
+    batches = [line_nos[i:i + lines_per_request] for i in range(0, len(line_nos), lines_per_request)]
+
+    def _tag_batch(batch: List[int]) -> List[str]:
+        conversation = continue_conversation(
+            progress_message=f"{progress_prefix}, Transcript Lines {batch[0]}-{batch[-1]}/{line_nos[-1]}",
+            conversation=list(prefix_conversation),  # copy: continue_conversation appends in place
+            prompt=(
+                build_line_batch_request_prompt(batch, line_prefix)
+                if sparse_codes is None
+                else build_sparse_line_batch_request_prompt(batch, line_prefix)
+            ),
+            rl=rl,
+            model=model,
+            ledger=ledger,
+            usage_tags=usage_tags,
+            hedger=hedger,
+            deadline=deadline,
+        )
+        response_text = get_response_from_chatgpt_conversation(conversation)
+        if sparse_codes is not None:
+            return _parse_sparse_line_batch_response(response_text, batch, sparse_codes)
+        return _parse_line_batch_response(response_text, batch)
+
+    batch_results = {}
+    queue = list(range(len(batches)))
+    for n_requeues in range(max_requeues + 1):
+        timed_out = []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queue)) or 1) as executor:
+            futures = [(i, executor.submit(_tag_batch, batches[i])) for i in queue]
+            for i, future in futures:
+                try:
+                    batch_results[i] = future.result()
+                except DeadlineExceeded:
+                    timed_out.append(i)
+        if not timed_out:
+            break
+        if n_requeues == max_requeues or (deadline is not None and deadline.expired()):
+            raise DeadlineExceeded(
+                f"{len(timed_out)}/{len(batches)} line batches timed out "
+                f"(first lines: {[batches[i][0] for i in timed_out]})"
+            )
+        log.warning("Requeueing timed-out line batches", progress=progress_prefix, n_batches=len(timed_out))
+        queue = timed_out
+
+    return [line_json for i in range(len(batches)) for line_json in batch_results[i]]
+
+
+def build_cleaned_transcript_context(tagging_instructions: str, cleaned_lines: list) -> str:
+    """Codebook + the cached cleaned transcript: the shared prefix of every phase 2 request."""
+    return (
+        f"{tagging_instructions}\n\n"
+        "The transcript has already been cleaned and divided by speaker. "
+        "Each line below is one speaker segment, numbered and labeled with its speaker:\n\n"
+        f"{format_cleaned_lines_for_prompt(cleaned_lines)}"
+    )
+
+
+def build_line_tagging_prompt(tagging_instructions: str, cleaned_lines: list, line_no: int) -> str:
+    """First phase 2 message: codebook + the cached cleaned transcript, asking for one line's json."""
+    return (
+        f"{build_cleaned_transcript_context(tagging_instructions, cleaned_lines)}\n\n"
+        f"Generate the json for line L{line_no} only. "
+        "Directly following the json, output a line which says \"END OF JSON OUTPUT.\""
+    )
+
+
+def _line_json_with_cached_line(line_json: str, line: dict) -> dict:
+    line_obj = json.loads(line_json)
+    line_obj["transcript_segment"] = line["text"]
+    line_obj["speaker"] = line["speaker"]
+    return line_obj
+
+
+def tag_cleaned_transcript_lines(
+    cleaned_lines: list,
+    tagging_instructions: str,
+    model: str,
+    role: Optional[str],
+    progress_prefix: str,
+    *,
+    rl: RateLimiter,
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
+    max_workers: Optional[int] = None,
+    lines_per_request: int = 1,
+    prelabeler: Optional[LinePrelabeler] = None,
+    sparse_codes: Optional[Sequence[str]] = None,
+) -> list:
+    """
+    Phase 2: tag behaviors for every line of an already cleaned, speaker-attributed transcript.
+    The line count is known from phase 1, so no "Number of Lines" parsing/estimation is needed.
+    "transcript_segment" and "speaker" are taken from the cached lines, not from the model.
+
+    max_workers=None tags lines sequentially in one conversation. Otherwise every line (or
+    batch of lines_per_request lines) is an independent request sharing the codebook + cleaned
+    transcript as a common prefix, sent concurrently (see fan_out_line_tagging).
+
+    With a prelabeler, lines it is confident about (e.g. greetings) are labeled locally and only
+    the remaining lines are sent to the model; the model's labels are then added to the prelabeler.
+
+    With sparse_codes, the model answers in the sparse code-list format ("L12|C|1A,3E,7B"), which
+    needs far fewer output tokens; requests always go through fan_out_line_tagging (one worker
+    when max_workers is None) and "analysis" is left empty.
+    Returns a list of JSON strings (one per line, in line order).
+    """
+    line_objs_by_no = {}
+    llm_lines = list(cleaned_lines)
+    if prelabeler is not None and len(prelabeler) > 0:
+        labels, confident, top_sim = prelabeler.predict(
+            [line["text"] for line in cleaned_lines], [line["speaker"] for line in cleaned_lines]
+        )
+        for line, vec, is_confident, sim in zip(cleaned_lines, labels, confident, top_sim):
+            if is_confident:
+                line_objs_by_no[line["line_no"]] = {
+                    "transcript_segment": line["text"],
+                    "speaker": line["speaker"],
+                    "behaviors_exhibited": label_vector_to_behaviors_exhibited(
+                        vec, prelabeler.codes,
+                        analysis=f"Pre-labeled locally (nearest-neighbour similarity {sim:.3f}).",
+                    ),
+                }
+        llm_lines = [line for line in cleaned_lines if line["line_no"] not in line_objs_by_no]
+        log.info(
+            "Pre-labeled lines locally",
+            progress=progress_prefix,
+            n_prelabeled=len(line_objs_by_no),
+            n_sent_to_llm=len(llm_lines),
+        )
+
+    llm_line_objs = []
+    if sparse_codes is not None and max_workers is None:
+        max_workers = 1
+    if llm_lines and max_workers is not None:
+        prefix_conversation = []
+        if role:
+            prefix_conversation.append({"role": "system", "content": role})
+        prefix_conversation.append({
+            "role": "user",
+            "content": build_cleaned_transcript_context(tagging_instructions, cleaned_lines),
+        })
+        line_jsons = fan_out_line_tagging(
+            prefix_conversation,
+            [line["line_no"] for line in llm_lines],
+            model,
+            rl=rl,
+            max_workers=max_workers,
+            lines_per_request=lines_per_request,
+            progress_prefix=progress_prefix,
+            ledger=ledger,
+            usage_tags=usage_tags,
+            hedger=hedger,
+            deadline=deadline,
+            sparse_codes=sparse_codes,
+        )
+        llm_line_objs = [_line_json_with_cached_line(line_json, line) for line, line_json in zip(llm_lines, line_jsons)]
+    elif llm_lines:
+        conversation = None
+        for line in llm_lines:
+            line_no = line["line_no"]
+            progress_msg = f"{progress_prefix}, Transcript Line {line_no}/{len(cleaned_lines)}"
+            if conversation is None:
+                conversation = start_conversation(
+                    progress_message=progress_msg,
+                    prompt=build_line_tagging_prompt(tagging_instructions, cleaned_lines, line_no),
+                    rl=rl,
+                    system_instructions=role,
+                    model=model,
+                    ledger=ledger,
+                    usage_tags=usage_tags,
+                    hedger=hedger,
+                    deadline=deadline,
+                )
+            else:
+                conversation = continue_conversation(
+                    progress_message=progress_msg,
+                    conversation=conversation,
+                    prompt=f"Now generate the json for line L{line_no} only, following the same structure.",
+                    rl=rl,
+                    model=model,
+                    ledger=ledger,
+                    usage_tags=usage_tags,
+                    hedger=hedger,
+                    deadline=deadline,
+                )
+            line_json = get_json_from_llm_response(get_response_from_chatgpt_conversation(conversation))
+            if line_json is None or not is_json(line_json):
+                raise ValueError(f"Critical Error: JSON not parsed correctly for cleaned transcript line {line_no}.")
+            llm_line_objs.append(_line_json_with_cached_line(line_json, line))
+
+    for line, line_obj in zip(llm_lines, llm_line_objs):
+        line_objs_by_no[line["line_no"]] = line_obj
+    if prelabeler is not None and llm_line_objs:
+        # incremental retrain: the next transcript benefits from this one's paid labels
+        prelabeler.partial_fit_line_jsons(llm_line_objs)
+
+    return [json.dumps(line_objs_by_no[line["line_no"]]) for line in cleaned_lines]
+
+
 # -- Main Execution Function --
 
 def run_chatgpt_behavioral_analysis(
@@ -130,8 +470,26 @@ def run_chatgpt_behavioral_analysis(
     start_transcript_index: int = 0,
     end_transcript_index: int = 1,       # by default only do 1 transcript
     required_transcripts_col_name: str = "transcripts",  # double-check column used
+    near_duplicate_threshold: Optional[float] = None,  # e.g. 0.8 -> near-duplicates reuse labels
+    ledger: Optional[UsageLedger] = None,  # token/cost accounting + budget ceiling for the run
+    source: Optional[str] = None,          # tags recorded in the ledger
+    prompt_version: Optional[str] = None,  # defaults to the prompt filename
+    cleaning_prompt_filepath: Optional[str] = None,  # set -> two-phase mode (cached cleaning, then tagging)
+    cleaned_transcripts_dir: str = CLEANED_TRANSCRIPTS_DIR,
+    max_concurrent_line_requests: Optional[int] = None,  # two-phase mode: fan out line tagging
+    lines_per_request: int = 1,
+    prelabeler: Optional[LinePrelabeler] = None,  # two-phase mode: label routine lines locally
+    feature_store_dir: Optional[str] = None,  # also append all results to the Parquet feature store
+    hedger: Optional[RequestHedger] = None,   # hedge slow requests with a duplicate (tail latency)
+    deadline: Optional[Deadline] = None,      # run/request time budget; timed-out transcripts are requeued once
 ):
-    cout_log_info(1)
+    log.info(
+        "RUNNING CHATGPT BEHAVIORAL ANALYSIS",
+        prompt_filepath=prompt_filepath,
+        response_writepath=response_writepath,
+        model=model,
+        model_role=model_role,
+    )
 
     # Read prompts
     with open(prompt_filepath, "r", encoding="utf-8") as file:
@@ -140,7 +498,7 @@ def run_chatgpt_behavioral_analysis(
     with open(continuation_prompt_filepath, "r", encoding="utf-8") as file:
         continuation_prompt_str = file.read()
 
-    cout_log_info(2)
+    log.debug("RECEIVED SYSTEM PROMPT", prompt=prompt_instructions_from_file)
 
     # Load data
     try:
@@ -148,7 +506,7 @@ def run_chatgpt_behavioral_analysis(
     except Exception as e:
         raise RuntimeError(f"Failed to read CSV at {path_to_data}") from e
 
-    cout_log_info(3)
+    log.debug("DATA EXTRACTED FROM FILE", path_to_data=path_to_data, n_rows=len(df))
 
     if df.shape[1] > 1:
         raise ValueError(
@@ -165,22 +523,73 @@ def run_chatgpt_behavioral_analysis(
     # Ensure output directory exists
     os.makedirs(os.path.dirname(response_writepath) or ".", exist_ok=True)
 
-    conversation_idx = 0
-    list_all_json_results = []
-
-    for transcript_text in transcripts:
-        # Skip until start index
-        if conversation_idx < start_transcript_index:
-            conversation_idx += 1
-            continue
-        # Stop when reaching end index
-        if conversation_idx >= end_transcript_index:
-            break
-
-        conversation_idx += 1
-
-        cout_log_info(4)
+    # Near-duplicate transcripts (re-uploads, lightly edited copies) reuse their
+    # representative's behavior labels instead of costing API calls
+    representatives = None
+    if near_duplicate_threshold is not None:
+        representatives, near_duplicate_index = find_near_duplicate_representatives(
+            transcripts.astype(str).tolist(), threshold=near_duplicate_threshold
+        )
+        log.info(summarize_clusters(near_duplicate_index))
+    json_results_by_transcript_idx = {}
+    # first labels produced in each near-duplicate cluster, keyed by the cluster's representative: the
+    # representative itself may be outside [start, end) or from an earlier run
+    json_results_by_representative = {}
+    keep_results = representatives is not None or feature_store_dir is not None
+
+    def _keep_result(conversation_idx: int, json_to_write) -> None:
+        if keep_results:
+            json_results_by_transcript_idx[conversation_idx - 1] = json_to_write
+        if representatives is not None:
+            json_results_by_representative.setdefault(int(representatives[conversation_idx - 1]), json_to_write)
+
+    if prompt_version is None:
+        prompt_version = os.path.splitext(os.path.basename(prompt_filepath))[0]
+
+    # Two-phase mode: phase 1 (clean + caller/receiver attribution) is cached per transcript and
+    # cleaning prompt version, so reruns for a new behavior codebook skip straight to phase 2.
+    if cleaning_prompt_filepath is not None:
+        tagging_instructions = extract_behavior_tagging_instructions(prompt_instructions_from_file)
+
+    def _run_two_phase(conversation_idx: int, transcript_text: str, usage_tags: dict) -> bool:
+        cleaned = get_or_create_cleaned_transcript(
+            transcript_text,
+            rl=rl,
+            model=model,
+            cleaning_prompt_filepath=cleaning_prompt_filepath,
+            cache_dir=cleaned_transcripts_dir,
+            ledger=ledger,
+            usage_tags=usage_tags,
+            hedger=hedger,
+            deadline=deadline,
+        )
+        json_strings = tag_cleaned_transcript_lines(
+            cleaned["lines"],
+            tagging_instructions,
+            model,
+            model_role,
+            f"Call Transcript {conversation_idx}/{n_conversations}",
+            rl=rl,
+            ledger=ledger,
+            usage_tags=usage_tags,
+            hedger=hedger,
+            deadline=deadline,
+            max_workers=max_concurrent_line_requests,
+            lines_per_request=lines_per_request,
+            prelabeler=prelabeler,
+        )
+        json_to_write = convert_list_json_str_to_json_list(json_strings)
+        write_json_to_file(json_obj=json_to_write, output_path=response_writepath)
+        _keep_result(conversation_idx, json_to_write)
+        log.info(
+            "Finished writing response to output file",
+            response_writepath=response_writepath,
+            conversation_idx=conversation_idx,
+        )
+        return True
 
+    def _run_single_phase(conversation_idx: int, transcript_text: str, usage_tags: dict) -> bool:
+        """One conversation over the whole prompt; False if the user chose to stop the run."""
         # Build progress message
         extra = ""
         if start_transcript_index is not None and start_transcript_index > 0:
@@ -196,20 +605,27 @@ def run_chatgpt_behavioral_analysis(
             rl=rl,                        # <-- inject rate limiter
             system_instructions=model_role,
             model=model,
+            ledger=ledger,
+            usage_tags=usage_tags,
+            hedger=hedger,
+            deadline=deadline,
         )
 
         # Retrieve the response and ensure JSON
         response_text = conversation[-1]["content"]
 
-        cout_log_info(5)
-        cout_log_info(6)
+        log.info("RESPONSE", transcript_idx=conversation_idx - 1, response=response_text)
 
         first_json = get_json_from_llm_response(response_text)
 
-        cout_log_info(7)
+        log.debug("JSON FROM CURRENT LINE OF TRANSCRIPT", transcript_idx=conversation_idx - 1, line=0, json=first_json)
 
         if not is_json(first_json):
-            cout_log_info(8)
+            log.warning(
+                "Unexpected Response Format - json not parsed correctly from ChatGPT response",
+                snippet=first_json,
+                response=response_text,
+            )
             raise ValueError("Critical Error: JSON not parsed correctly from ChatGPT response. Terminating.")
 
         # Determine number of iterations
@@ -228,7 +644,11 @@ def run_chatgpt_behavioral_analysis(
             n_iterations_over_lines = int(n_lines_in_raw_transcript * 1.5)
             n_iterations_was_estimated = True
 
-        cout_log_info(9)
+        log.info(
+            "Performing Iterations over lines in cleaned transcript",
+            n_iterations_over_lines=n_iterations_over_lines,
+            estimated=n_iterations_was_estimated,
+        )
 
         # Collect JSON results
         json_strings = [first_json]
@@ -252,17 +672,19 @@ def run_chatgpt_behavioral_analysis(
                 prompt=continuation_prompt_str,
                 rl=rl,                     # <-- inject rate limiter
                 model=model,
+                ledger=ledger,
+                usage_tags=usage_tags,
+                hedger=hedger,
+                deadline=deadline,
             )
 
             # Latest response
             response_text = conversation[-1]["content"]
 
-            cout_log_info(5)
-
             if response_text == "":
                 raise ValueError("Called continue_conversation(), but response was empty.")
 
-            cout_log_info(6)
+            log.info("RESPONSE", transcript_idx=conversation_idx - 1, line=i + 1, response=response_text)
 
             if "```json" not in response_text:
                 raise ValueError("Critical Error: Could not locate ```json in response from continuation prompt. Terminating.")
@@ -271,7 +693,7 @@ def run_chatgpt_behavioral_analysis(
                 cont = input("Continue (y/n)? ")
                 if cont.lower() != "y":
                     print("\nTerminating... After fixing the issue, pick up where you left off by modifying the start_transcript_index parameter.")
-                    return
+                    return False
                 print("ChatGPT indicated it was done processing the transcript. Moving to the next transcript.")
                 break
 
@@ -282,10 +704,14 @@ def run_chatgpt_behavioral_analysis(
             except IndexError:
                 raise ValueError("Critical Error: JSON delimiters not found in continuation response. Terminating.")
 
-            cout_log_info(7)
+            log.debug("JSON FROM CURRENT LINE OF TRANSCRIPT", transcript_idx=conversation_idx - 1, line=i + 1, json=current_line_json)
 
             if not is_json(current_line_json):
-                cout_log_info(8)
+                log.warning(
+                    "Unexpected Response Format - json not parsed correctly from ChatGPT response",
+                    snippet=current_line_json,
+                    response=response_text,
+                )
                 raise ValueError("Critical Error: JSON not parsed correctly from continuation response. Exiting.")
 
             json_strings.append(current_line_json)
@@ -293,7 +719,114 @@ def run_chatgpt_behavioral_analysis(
         # Write combined JSON list to file
         json_to_write = convert_list_json_str_to_json_list(json_strings)
         write_json_to_file(json_obj=json_to_write, output_path=response_writepath)
+        _keep_result(conversation_idx, json_to_write)
+
+        log.info(
+            "Finished writing response to output file",
+            response_writepath=response_writepath,
+            conversation_idx=conversation_idx,
+        )
+        return True
+
+    run_transcript = _run_two_phase if cleaning_prompt_filepath is not None else _run_single_phase
+
+    # Transcripts whose requests timed out (run deadline not yet hit) or were shed by the open circuit
+    # are retried once after the rest. In two-phase mode phase 1 is cached, so a retry doesn't pay for
+    # cleaning again; a single-phase retry starts its conversation over.
+    deferred = []
+    in_progress_idx = None  # transcript being processed when the run is paused
+    conversation_idx = 0
+    list_all_json_results = []
+
+    try:
+        for transcript_text in transcripts:
+            # Skip until start index
+            if conversation_idx < start_transcript_index:
+                conversation_idx += 1
+                continue
+            # Stop when reaching end index
+            if conversation_idx >= end_transcript_index:
+                break
+
+            conversation_idx += 1
+
+            if representatives is not None:
+                representative_idx = int(representatives[conversation_idx - 1])
+                if representative_idx in json_results_by_representative:
+                    log.info(
+                        "Call Transcript %d is a near-duplicate of call transcript %d, reusing its cluster's behavior labels.",
+                        conversation_idx, representative_idx + 1,
+                    )
+                    json_to_write = json_results_by_representative[representative_idx]
+                    write_json_to_file(json_obj=json_to_write, output_path=response_writepath)
+                    _keep_result(conversation_idx, json_to_write)
+                    continue
+
+            usage_tags = {
+                "transcript_id": conversation_idx - 1,
+                "source": source,
+                "prompt_version": prompt_version,
+            }
+
+            log.debug("SUBSET OF DATA BEING APPENDED TO PROMPT", transcript_idx=conversation_idx - 1, transcript=transcript_text)
+
+            in_progress_idx = conversation_idx
+            try:
+                if not run_transcript(conversation_idx, transcript_text, usage_tags):
+                    return
+            except DeadlineExceeded as e:
+                if deadline is not None and deadline.expired():
+                    raise
+                log.warning(
+                    "Call Transcript %d timed out, requeueing it after the remaining transcripts.",
+                    conversation_idx,
+                    reason=str(e),
+                )
+                deferred.append((conversation_idx, transcript_text, usage_tags))
+            except CircuitOpen as e:
+                # provider is failing: wait for the breaker's probe instead of hammering it with every
+                # queued transcript (pauses the run if that wait would pass the run deadline)
+                if deadline is not None and deadline.remaining() <= e.retry_after_s:
+                    raise
+                log.warning(
+                    "Call Transcript %d shed by the open circuit, requeueing it and waiting %.0fs.",
+                    conversation_idx, e.retry_after_s,
+                )
+                deferred.append((conversation_idx, transcript_text, usage_tags))
+                time.sleep(e.retry_after_s)
+            in_progress_idx = None
+
+        while deferred:
+            if not run_transcript(*deferred[0]):
+                return
+            deferred.pop(0)
+
+    except (BudgetExceeded, DeadlineExceeded, CircuitOpen) as e:
+        # resume from the earliest unfinished transcript (transcripts after it that did finish are redone)
+        unfinished = sorted({idx for idx, _, _ in deferred} | ({in_progress_idx} - {None}))
+        resume_idx = unfinished[0] if unfinished else conversation_idx
+        log.warning(
+            "Pausing run at call transcript %d. Resume by setting start_transcript_index=%d.",
+            resume_idx, resume_idx - 1,
+            reason=str(e),
+            unfinished_transcripts=unfinished,
+        )
+
+    if feature_store_dir is not None:
+        written = write_calls_to_feature_store(
+            json_results_by_transcript_idx,
+            transcript_texts={idx: str(transcripts.iloc[idx]) for idx in json_results_by_transcript_idx},
+            prompt_version=prompt_version,
+            model=model,
+            source=source,
+            root_dir=feature_store_dir,
+        )
+        log.info("Wrote behavior labels to feature store", n_transcripts=len(json_results_by_transcript_idx), files=written)
 
-        cout_log_info(10)
+    if ledger is not None:
+        log.info("Usage: %s", ledger.format_summary())
+    log.info("Rate limiter: %s", rl.metrics.format_summary())
+    if hedger is not None:
+        log.info("Hedging: %s", hedger.format_summary(), **hedger.stats())
 
-    cout_log("Done.")
+    log.info("Done.")
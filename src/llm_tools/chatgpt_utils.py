@@ -1,15 +1,151 @@
 import requests
 import json
+import threading
 import time
 from typing import Protocol, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAI
 
 from src.rate_limits.models.rate_limiter import RateLimiter
 
 from src.ml_scam_classification.utils.file_utils import get_chatgpt_api_key
-from src.llm_tools.debug_utils import cout_log_info
+from src.llm_tools.circuit_breaker import CircuitBreaker, is_provider_failure_status
+from src.llm_tools.deadlines import Deadline, DeadlineExceeded, http_timeout
+from src.llm_tools.structured_logging import get_logger
+from src.llm_tools.request_hedging import HedgeCancelled, RequestHedger
+from src.llm_tools.single_flight import SingleFlight, request_cache_key
+from src.llm_tools.usage_ledger import UsageLedger
+
+CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+
+log = get_logger("chatgpt_utils")
+
+# Shared by every caller in this process: concurrent identical requests (same
+# request_cache_key) share one network call and one rate-limit slot.
+CHATGPT_SINGLE_FLIGHT = SingleFlight()
+
+# Shared by every caller in this process: once OpenAI requests mostly fail, new requests are
+# shed with CircuitOpen (without taking a rate-limit permit) until probe requests succeed again.
+CHATGPT_CIRCUIT_BREAKER = CircuitBreaker("openai")
+
+# Logged once per attempt sent (not for attempts cancelled by a hedge): the request timings
+# the pipeline simulator fits its latency model from (see LatencyModel.from_request_log).
+REQUEST_TIMING_EVENT = "ChatGPT request finished"
+
+
+# A hedged attempt books its rate limit permit only once it is this close (see _wait_for_permit)
+HEDGE_BOOK_AHEAD_S = 1.0
+
+
+def _log_request_timing(model: str, start: float, outcome: str, prompt_chars: int, completion_tokens=None) -> None:
+    log.info(
+        REQUEST_TIMING_EVENT,
+        model=model,
+        outcome=outcome,  # HTTP status code, "timeout" or "connection_error"
+        latency_s=round(time.perf_counter() - start, 3),
+        prompt_chars=prompt_chars,
+        completion_tokens=completion_tokens,
+    )
+
+
+def _prompt_chars(messages: list) -> int:
+    return sum(len(m.get("content") or "") for m in messages)
+
+
+def _post_chat_completion(
+    headers: dict,
+    payload: dict,
+    *,
+    rl: RateLimiter,
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
+):
+    """
+    POST a chat completion, deduplicated against identical in-flight requests.
+    Only the leading request waits on the rate limiter and is recorded in the ledger;
+    followers reuse its response. With a hedger, the leader's request is hedged (a slow
+    attempt gets a duplicate, the first response wins); each attempt sent is recorded.
+    Every attempt has an HTTP timeout; with a deadline, the rate-limit wait and the call
+    together get the attempt's budget and DeadlineExceeded is raised when it runs out.
+    Every attempt goes through CHATGPT_CIRCUIT_BREAKER (CircuitOpen while the circuit is open).
+    """
+    def _send(cancelled=None):
+        if ledger is not None:
+            ledger.ensure_within_budget(payload["model"])
+        is_probe = CHATGPT_CIRCUIT_BREAKER.before_request()
+        try:
+            request_deadline = _wait_for_permit(rl, deadline, cancelled)
+            if cancelled is not None and cancelled.is_set():
+                raise HedgeCancelled()
+        except BaseException:
+            CHATGPT_CIRCUIT_BREAKER.release(is_probe)
+            raise
+        start = time.perf_counter()
+        prompt_chars = _prompt_chars(payload["messages"])
+        try:
+            response = requests.post(
+                CHAT_COMPLETIONS_URL, headers=headers, json=payload, timeout=http_timeout(request_deadline)
+            )
+        except requests.Timeout as e:
+            CHATGPT_CIRCUIT_BREAKER.record_failure(is_probe)
+            _log_request_timing(payload["model"], start, "timeout", prompt_chars)
+            raise DeadlineExceeded(f"Chat completion timed out: {e}") from e
+        except requests.ConnectionError:
+            CHATGPT_CIRCUIT_BREAKER.record_failure(is_probe)
+            _log_request_timing(payload["model"], start, "connection_error", prompt_chars)
+            raise
+        except BaseException:
+            CHATGPT_CIRCUIT_BREAKER.release(is_probe)
+            raise
+        if is_provider_failure_status(response.status_code):
+            CHATGPT_CIRCUIT_BREAKER.record_failure(is_probe)
+        else:
+            CHATGPT_CIRCUIT_BREAKER.record_success(is_probe)
+        usage = response.json().get("usage") if response.status_code == 200 else None
+        _log_request_timing(
+            payload["model"], start, str(response.status_code), prompt_chars,
+            completion_tokens=(usage or {}).get("completion_tokens"),
+        )
+        if ledger is not None and response.status_code == 200:
+            ledger.record_openai_usage(payload["model"], usage, **(usage_tags or {}))
+        return response
+
+    fn = _send if hedger is None else (lambda: hedger.run(_send, rl=rl))
+    return CHATGPT_SINGLE_FLIGHT.do(request_cache_key(payload, endpoint=CHAT_COMPLETIONS_URL), fn)
+
+
+def _wait_for_permit(
+    rl: RateLimiter, deadline: Optional[Deadline], cancelled: Optional[threading.Event] = None
+) -> Optional[Deadline]:
+    """
+    Block until the rate limiter allows a request; returns this attempt's deadline (None without one).
+    A hedged attempt (with `cancelled`) idles until the next permit is at most HEDGE_BOOK_AHEAD_S
+    away before booking it, and raises HedgeCancelled if it loses meanwhile, so a loser still
+    queued on the limiter never uses up a permit.
+    """
+    request_deadline = None if deadline is None else deadline.for_request()
+    if cancelled is not None:
+        while True:
+            if cancelled.is_set():
+                raise HedgeCancelled()
+            wait_s = rl.seconds_until_available()  # non-blocking peek
+            if wait_s <= HEDGE_BOOK_AHEAD_S:
+                break
+            if request_deadline is not None and wait_s > request_deadline.remaining():
+                raise DeadlineExceeded(f"Next rate limit permit is {wait_s:.3f}s away, past the timeout")
+            cancelled.wait(wait_s - HEDGE_BOOK_AHEAD_S)
+    if request_deadline is None:
+        rl.wait()
+        return None
+    request_deadline.check("waiting on the rate limiter")
+    try:
+        rl.wait(timeout_s=request_deadline.wait_timeout_s())
+    except TimeoutError as e:
+        raise DeadlineExceeded(str(e)) from e
+    return request_deadline
 
 
 def send_prompt_to_chatgpt(
@@ -19,39 +155,95 @@ def send_prompt_to_chatgpt(
     model: str = "gpt-4o-2024-11-20",
     system_instructions: str = "You are a call analysis system creating useful features to input to a scam detection model.",
     progress_message: str = "Sending prompt to ChatGPT (may take up to 60s)",
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
 ) -> str:
     openai_api_key: Optional[str] = None
 
-    cout_log_info(1)
-
     # Get ChatGPT API Key
     load_dotenv()  # Correctly load environment variables
     openai_api_key = get_chatgpt_api_key()  # Gets the API key from the .env file
     client = OpenAI(api_key=openai_api_key)
 
-    cout_log_info(2)
+    log.info("Sending prompt to ChatGPT... (may take up to 60s).", progress=progress_message, model=model)
 
-    # --- Block here until allowed by rate limit
-    rl.wait()
+    messages = [
+        {"role": "system", "content": system_instructions},
+        {"role": "user", "content": prompt},
+    ]
 
-    response_stream = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system_instructions},
-            {"role": "user", "content": prompt},
-        ],
-        stream=True,
+    def _send(cancelled=None):
+        if ledger is not None:
+            ledger.ensure_within_budget(model)
+        is_probe = CHATGPT_CIRCUIT_BREAKER.before_request()
+        try:
+            request_deadline = _wait_for_permit(rl, deadline, cancelled)
+            if cancelled is not None and cancelled.is_set():
+                raise HedgeCancelled()
+        except BaseException:
+            CHATGPT_CIRCUIT_BREAKER.release(is_probe)
+            raise
+
+        start = time.perf_counter()
+        try:
+            response_stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=http_timeout(request_deadline)[1],  # streamed: bounds each wait for the next chunk
+            )
+        except APITimeoutError as e:
+            CHATGPT_CIRCUIT_BREAKER.record_failure(is_probe)
+            _log_request_timing(model, start, "timeout", _prompt_chars(messages))
+            raise DeadlineExceeded(f"Chat completion timed out: {e}") from e
+        except APIConnectionError:
+            CHATGPT_CIRCUIT_BREAKER.record_failure(is_probe)
+            _log_request_timing(model, start, "connection_error", _prompt_chars(messages))
+            raise
+        except APIStatusError as e:
+            if is_provider_failure_status(e.status_code):
+                CHATGPT_CIRCUIT_BREAKER.record_failure(is_probe)
+            else:
+                CHATGPT_CIRCUIT_BREAKER.record_success(is_probe)
+            _log_request_timing(model, start, str(e.status_code), _prompt_chars(messages))
+            raise
+        except BaseException:
+            CHATGPT_CIRCUIT_BREAKER.release(is_probe)
+            raise
+        CHATGPT_CIRCUIT_BREAKER.record_success(is_probe)
+
+        # Combine the streaming response chunks into a single response string
+        full_response = ""
+        completion_tokens = None
+        for chunk in response_stream:
+            if cancelled is not None and cancelled.is_set():
+                # lost the hedge race: closing the stream stops generation (usage isn't reported)
+                response_stream.close()
+                raise HedgeCancelled()
+            if request_deadline is not None and request_deadline.expired():
+                response_stream.close()
+                raise DeadlineExceeded("Chat completion stream ran past its deadline")
+            # The final chunk carries usage and has no choices
+            if not chunk.choices:
+                if chunk.usage is not None:
+                    completion_tokens = chunk.usage.completion_tokens
+                    if ledger is not None:
+                        ledger.record_openai_usage(model, chunk.usage.model_dump(), **(usage_tags or {}))
+                continue
+            # For chat completions, each chunk's content is in chunk.choices[0].delta.content
+            if hasattr(chunk.choices[0].delta, "content") and chunk.choices[0].delta.content is not None:
+                full_response += chunk.choices[0].delta.content
+        _log_request_timing(model, start, "200", _prompt_chars(messages), completion_tokens=completion_tokens)
+        return full_response
+
+    return CHATGPT_SINGLE_FLIGHT.do(
+        request_cache_key({"model": model, "messages": messages}, endpoint=CHAT_COMPLETIONS_URL),
+        _send if hedger is None else (lambda: hedger.run(_send, rl=rl)),
     )
 
-    # Combine the streaming response chunks into a single response string
-    full_response = ""
-    for chunk in response_stream:
-        # For chat completions, each chunk's content is in chunk.choices[0].delta.content
-        if hasattr(chunk.choices[0].delta, "content") and chunk.choices[0].delta.content is not None:
-            full_response += chunk.choices[0].delta.content
-
-    return full_response
-
     # TODO - multiple high-temperature responses, then come to a consensus (majority, weighted vote, or similar)
     # TODO - research models of emotionspace, intentionspace, etc. Or maybe just have a dataset with labeled emotions, intent, sentiment, and fine tume on it
 
@@ -67,6 +259,10 @@ def start_conversation(
     rl: RateLimiter,
     system_instructions: Optional[str] = None,
     model: str = "gpt-4o-2024-11-20",
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
     **extra_params,
 ):
     """
@@ -76,7 +272,13 @@ def start_conversation(
       - progress_message (str): A log message label (unused here except for symmetry).
       - prompt (str): The initial user prompt.
       - rl (RateLimiter): Rate limiter; .wait() will block until a request is allowed.
+        Concurrent identical requests share a single call (see CHATGPT_SINGLE_FLIGHT).
       - system_instructions (str, optional): Optional system message to guide the assistant.
+      - ledger (UsageLedger, optional): Records token usage/cost and enforces the run budget.
+      - usage_tags (dict, optional): transcript_id / source / prompt_version to record usage under.
+      - hedger (RequestHedger, optional): Hedge slow requests with a duplicate (see RequestHedger).
+      - deadline (Deadline, optional): Run/request time budget; DeadlineExceeded is raised when it runs out.
+        Without one, the default HTTP timeouts still apply.
       - extra_params: Other optional parameters (like temperature, max_tokens, etc.).
 
     Returns:
@@ -84,12 +286,10 @@ def start_conversation(
         including the assistant’s response.
     """
 
-    cout_log_info(1)
-
     load_dotenv()  # Correctly load environment variables
     API_KEY = get_chatgpt_api_key()  # Gets the API key from the .env file
 
-    cout_log_info(2)
+    log.info("Sending prompt to ChatGPT... (may take up to 60s).", progress=progress_message, model=model)
 
     HEADERS = {
         "Authorization": f"Bearer {API_KEY}",
@@ -111,11 +311,10 @@ def start_conversation(
     # Merge in any extra parameters (such as temperature, max_tokens, etc.)
     payload.update(extra_params)
 
-    # --- Block here until allowed by rate limit
-    rl.wait()
-
-    # Call the Chat Completions API.
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=HEADERS, json=payload)
+    # Call the Chat Completions API (rate-limited and deduplicated inside).
+    response = _post_chat_completion(
+        HEADERS, payload, rl=rl, ledger=ledger, usage_tags=usage_tags, hedger=hedger, deadline=deadline
+    )
 
     if response.status_code != 200:
         raise Exception(f"API request failed: {response.text}")
@@ -136,7 +335,12 @@ def continue_conversation(
     prompt: str,
     *,
     rl: RateLimiter,
+    progress_message: str = "",
     model: str = "gpt-4o-2024-11-20",
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
     **extra_params,
 ):
     """
@@ -147,18 +351,22 @@ def continue_conversation(
       - conversation (list): The existing conversation history.
       - prompt (str): The new user prompt to add.
       - rl (RateLimiter): Rate limiter; .wait() will block before each API call.
+      - progress_message (str): A log message label.
+      - ledger (UsageLedger, optional): Records token usage/cost and enforces the run budget.
+      - usage_tags (dict, optional): transcript_id / source / prompt_version to record usage under.
+      - hedger (RequestHedger, optional): Hedge slow requests with a duplicate (see RequestHedger).
+      - deadline (Deadline, optional): Run/request time budget; DeadlineExceeded is raised when it runs out.
+        Without one, the default HTTP timeouts still apply.
       - extra_params: Other optional parameters for the API call.
 
     Returns:
       - conversation (list): The updated conversation history with the new assistant response appended.
     """
 
-    cout_log_info(1)
-
     load_dotenv()  # Correctly load environment variables
     API_KEY = get_chatgpt_api_key()  # Gets the API key from the .env file
 
-    cout_log_info(2)
+    log.info("Sending prompt to ChatGPT... (may take up to 60s).", progress=progress_message, model=model)
 
     HEADERS = {
         "Authorization": f"Bearer {API_KEY}",
@@ -173,16 +381,34 @@ def continue_conversation(
 
     max_retries = 5
     for attempt in range(max_retries):
-        # --- Block on EVERY network attempt to respect RPM precisely
-        rl.wait()
-
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=HEADERS, json=payload)
+        if deadline is not None:
+            deadline.check(f"attempt {attempt + 1}/{max_retries}")
+        # --- Block on EVERY network attempt to respect RPM precisely (done inside)
+        try:
+            response = _post_chat_completion(
+                HEADERS, payload, rl=rl, ledger=ledger, usage_tags=usage_tags, hedger=hedger, deadline=deadline
+            )
+        except (DeadlineExceeded, requests.ConnectionError) as e:
+            # timed out or dropped connection: a failed attempt, retried while the run deadline allows
+            if attempt == max_retries - 1 or (deadline is not None and deadline.expired()):
+                raise
+            log.warning(
+                "Attempt %d/%d failed (%s). Retrying...",
+                attempt + 1, max_retries, type(e).__name__,
+                progress=progress_message, error=str(e),
+            )
+            time.sleep(1 if deadline is None else min(1, deadline.remaining()))
+            continue
         if response.status_code == 200:
             break
         else:
             if attempt < max_retries - 1:
-                print(f"Attempt {attempt+1}/{max_retries} failed with status code {response.status_code}. Retrying...")
-                time.sleep(1)  # Optional backoff between attempts
+                log.warning(
+                    "Attempt %d/%d failed with status code %d. Retrying...",
+                    attempt + 1, max_retries, response.status_code,
+                    progress=progress_message,
+                )
+                time.sleep(1 if deadline is None else min(1, deadline.remaining()))  # Optional backoff between attempts
             else:
                 raise Exception(f"API request failed after {max_retries} attempts: {response.text}")
 
@@ -258,7 +484,7 @@ def estimate_remaining_lines(response_text, raw_transcript_text):
 
 # Example usage (adjust to your app structure):
 if __name__ == "__main__":
-    # from settings.ratelimits import GPT4O_15RPM as RL   # example
+    # from src.rate_limits.registry import get_rate_limiter; RL = get_rate_limiter("gpt-5")   # example
     # conv = start_conversation("Starting...", "Hello, who are you?", rl=RL, system_instructions="You are a helpful assistant.")
     # print("Conversation after starting:")
     # print(json.dumps(conv, indent=2))
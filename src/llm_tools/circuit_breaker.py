@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+from src.llm_tools.structured_logging import get_logger
+
+log = get_logger("circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_provider_failure_status(status_code: int) -> bool:
+    """HTTP statuses that mean the provider is failing (overloaded or erroring), not the request."""
+    return status_code == 429 or status_code >= 500
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of sending a request while a provider's circuit is open. Runs catch this to stop cleanly."""
+
+    def __init__(self, provider: str, retry_after_s: float):
+        super().__init__(f"Circuit for {provider} is open; next probe in {retry_after_s:.1f}s")
+        self.provider = provider
+        self.retry_after_s = retry_after_s
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by every worker sending requests to one provider.
+
+    - closed: requests flow; the outcomes of the last `window` requests are kept, and once at
+      least min_requests have been seen with an error rate >= failure_rate_threshold the circuit opens.
+    - open: requests are shed immediately with CircuitOpen (before taking a rate-limit permit),
+      for open_s seconds; each failed probe doubles that, up to max_open_s.
+    - half_open: at most max_probes requests are let through at a time; probe_successes_to_close
+      successes close the circuit again, a single failure reopens it.
+    Only provider failures should be recorded as failures (5xx, 429, timeouts, dropped
+    connections), not request errors such as a 400. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        *,
+        failure_rate_threshold: float = 0.5,
+        window: int = 20,
+        min_requests: int = 10,
+        open_s: float = 30.0,
+        max_open_s: float = 600.0,
+        max_probes: int = 1,
+        probe_successes_to_close: int = 2,
+    ):
+        if not 0 < failure_rate_threshold <= 1:
+            raise ValueError(f"failure_rate_threshold must be in (0, 1], got {failure_rate_threshold}")
+        if not (isinstance(min_requests, int) and min_requests >= 1 and isinstance(window, int) and window >= min_requests):
+            raise ValueError("min_requests must be an int >= 1 and window an int >= min_requests")
+        if not 0 < open_s <= max_open_s:
+            raise ValueError("Need 0 < open_s <= max_open_s")
+        if not (isinstance(max_probes, int) and max_probes >= 1):
+            raise ValueError("max_probes must be an int >= 1")
+        if not (isinstance(probe_successes_to_close, int) and probe_successes_to_close >= 1):
+            raise ValueError("probe_successes_to_close must be an int >= 1")
+        self.provider = provider
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_requests = min_requests
+        self.open_s = open_s
+        self.max_open_s = max_open_s
+        self.max_probes = max_probes
+        self.probe_successes_to_close = probe_successes_to_close
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self._state = CLOSED
+        self._current_open_s = open_s
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.n_shed = 0
+        self.n_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_locked()
+            return self._state
+
+    def _refresh_locked(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self._current_open_s:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            log.info("Circuit half-open, sending probe requests", provider=self.provider)
+
+    def _open_locked(self, reason: str) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.n_opened += 1
+        self._outcomes.clear()
+        log.warning(
+            "Circuit opened, shedding requests",
+            provider=self.provider,
+            reason=reason,
+            open_s=round(self._current_open_s, 1),
+        )
+
+    def retry_after_s(self) -> float:
+        """Seconds until the circuit lets a probe through (0.0 when requests may be sent now)."""
+        with self._lock:
+            self._refresh_locked()
+            if self._state == OPEN:
+                return max(0.0, self._opened_at + self._current_open_s - time.monotonic())
+            return 0.0
+
+    def before_request(self) -> bool:
+        """
+        Admit a request or raise CircuitOpen. Returns True if the request is a half-open probe;
+        pass that to record_success/record_failure/release once the request is done.
+        """
+        with self._lock:
+            self._refresh_locked()
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and self._probes_in_flight < self.max_probes:
+                self._probes_in_flight += 1
+                return True
+            self.n_shed += 1
+            retry_after = max(0.0, self._opened_at + self._current_open_s - time.monotonic()) if self._state == OPEN else 0.0
+        raise CircuitOpen(self.provider, retry_after)
+
+    def record_success(self, is_probe: bool = False) -> None:
+        with self._lock:
+            if is_probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if self._state != HALF_OPEN:
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.probe_successes_to_close:
+                    self._state = CLOSED
+                    self._current_open_s = self.open_s
+                    log.info("Circuit closed", provider=self.provider)
+            elif self._state == CLOSED:
+                self._outcomes.append(False)
+
+    def record_failure(self, is_probe: bool = False) -> None:
+        with self._lock:
+            if is_probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if self._state == HALF_OPEN:
+                    self._current_open_s = min(2 * self._current_open_s, self.max_open_s)
+                    self._open_locked("probe request failed")
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append(True)
+            n = len(self._outcomes)
+            error_rate = sum(self._outcomes) / n
+            if n >= self.min_requests and error_rate >= self.failure_rate_threshold:
+                self._open_locked(f"error rate {error_rate:.0%} over the last {n} requests")
+
+    def release(self, is_probe: bool = False) -> None:
+        """The admitted request was never sent (cancelled, deadline hit while queued): not an outcome."""
+        if is_probe:
+            with self._lock:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh_locked()
+            n = len(self._outcomes)
+            return {
+                "provider": self.provider,
+                "state": self._state,
+                "error_rate": sum(self._outcomes) / n if n else 0.0,
+                "n_opened": self.n_opened,
+                "n_shed": self.n_shed,
+            }
+
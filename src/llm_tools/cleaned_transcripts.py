@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import List, Optional
+
+from src.rate_limits.models.rate_limiter import RateLimiter
+from src.llm_tools.chatgpt_utils import start_conversation, get_response_from_chatgpt_conversation
+from src.llm_tools.llm_utils import get_json_from_llm_response
+from src.llm_tools.structured_logging import get_logger
+from src.llm_tools.deadlines import Deadline
+from src.llm_tools.request_hedging import RequestHedger
+from src.llm_tools.usage_ledger import UsageLedger
+
+CLEANING_PROMPT_PATH = "src/ml_scam_classification/prompting/prompt_cleaning_v1.txt"
+CLEANED_TRANSCRIPTS_DIR = "outputs/cleaned_transcripts"
+VALID_SPEAKERS = ("Caller", "Receiver")
+
+# Phase 2 reuses the behavior section of the full (single-conversation) prompts, so the
+# codebook only lives in one file. Everything before this marker is phase 1 (cleaning +
+# speaker attribution), and everything from the tail marker on asks the model to do phase 1.
+BEHAVIOR_SECTION_MARKER = "**3. BEHAVIOR IDENTIFICATION**"
+PROMPT_TAIL_MARKER = "Finally, This prompt's output is long."
+# Prompt versions differ in case and bold markup ("3. BEHAVIOR IDENTIFICATION", "Finally, this ..."),
+# so both markers are matched case-insensitively, with the bold optional
+_BEHAVIOR_SECTION_RE = re.compile(
+    r"(?:\*\*)?" + re.escape(BEHAVIOR_SECTION_MARKER.strip("*")) + r"(?:\*\*)?", re.IGNORECASE
+)
+_PROMPT_TAIL_RE = re.compile(re.escape(PROMPT_TAIL_MARKER), re.IGNORECASE)
+
+log = get_logger("cleaned_transcripts")
+
+
+def transcript_sha256(transcript_text: str) -> str:
+    return hashlib.sha256(str(transcript_text).encode("utf-8")).hexdigest()
+
+
+def prompt_version_from_path(prompt_filepath: str) -> str:
+    """e.g. ".../prompt_cleaning_v1.txt" -> "prompt_cleaning_v1" """
+    return os.path.splitext(os.path.basename(prompt_filepath))[0]
+
+
+def cleaned_transcript_path(transcript_text: str, cleaning_prompt_version: str, cache_dir: str = CLEANED_TRANSCRIPTS_DIR) -> str:
+    """Artifacts are keyed by cleaning prompt version and transcript hash."""
+    return os.path.join(cache_dir, cleaning_prompt_version, f"{transcript_sha256(transcript_text)}.json")
+
+
+def parse_cleaned_transcript_response(response_text: str) -> List[dict]:
+    """
+    Parse the phase 1 response into [{"line_no", "speaker", "text"}, ...] (line_no starts at 1).
+    Raises ValueError if the json is missing, empty or has unknown speakers.
+    """
+    json_str = get_json_from_llm_response(response_text)
+    if json_str is None:
+        raise ValueError("Critical Error: No cleaned transcript json found in phase 1 response.")
+    entries = json.loads(json_str)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("Critical Error: Phase 1 response json must be a non-empty list of lines.")
+
+    lines = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or "line" not in entry or "speaker" not in entry:
+            raise ValueError(f"Critical Error: Phase 1 line {i + 1} is missing \"line\" or \"speaker\": {entry!r}")
+        speaker = str(entry["speaker"]).strip().capitalize()
+        if speaker not in VALID_SPEAKERS:
+            raise ValueError(f"Critical Error: Phase 1 line {i + 1} has unknown speaker {entry['speaker']!r}")
+        lines.append({"line_no": i + 1, "speaker": speaker, "text": str(entry["line"])})
+    return lines
+
+
+def load_cleaned_transcript(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_cleaned_transcript(artifact: dict, path: str) -> None:
+    """Write atomically so an interrupted run never leaves a half-written artifact behind."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def get_or_create_cleaned_transcript(
+    transcript_text: str,
+    *,
+    rl: RateLimiter,
+    model: str,
+    cleaning_prompt_filepath: str = CLEANING_PROMPT_PATH,
+    cache_dir: str = CLEANED_TRANSCRIPTS_DIR,
+    system_instructions: Optional[str] = None,
+    ledger: Optional[UsageLedger] = None,
+    usage_tags: Optional[dict] = None,
+    hedger: Optional[RequestHedger] = None,
+    deadline: Optional[Deadline] = None,
+) -> dict:
+    """
+    Phase 1: return the cleaned, speaker-attributed transcript artifact, calling the LLM only
+    if no artifact exists yet for (cleaning prompt version, transcript hash).
+
+    Artifact format:
+      {"transcript_sha256", "cleaning_prompt_version", "model", "created_ns",
+       "lines": [{"line_no", "speaker", "text"}, ...]}
+    """
+    cleaning_prompt_version = prompt_version_from_path(cleaning_prompt_filepath)
+    path = cleaned_transcript_path(transcript_text, cleaning_prompt_version, cache_dir)
+
+    artifact = load_cleaned_transcript(path)
+    if artifact is not None:
+        log.info("Using cached cleaned transcript", path=path, n_lines=len(artifact["lines"]))
+        return artifact
+
+    with open(cleaning_prompt_filepath, "r", encoding="utf-8") as f:
+        cleaning_prompt = f.read()
+
+    conversation = start_conversation(
+        progress_message="Phase 1: cleaning transcript and attributing speakers",
+        prompt=f"{cleaning_prompt}\n\nCall Transcript:\n\n{transcript_text}",
+        rl=rl,
+        system_instructions=system_instructions,
+        model=model,
+        ledger=ledger,
+        usage_tags=usage_tags,
+        hedger=hedger,
+        deadline=deadline,
+    )
+    lines = parse_cleaned_transcript_response(get_response_from_chatgpt_conversation(conversation))
+
+    artifact = {
+        "transcript_sha256": transcript_sha256(transcript_text),
+        "cleaning_prompt_version": cleaning_prompt_version,
+        "model": model,
+        "created_ns": time.time_ns(),
+        "lines": lines,
+    }
+    write_cleaned_transcript(artifact, path)
+    log.info("Wrote cleaned transcript artifact", path=path, n_lines=len(lines))
+    return artifact
+
+
+def extract_behavior_tagging_instructions(prompt_text: str) -> str:
+    """
+    Cut the phase 2 (behavior tagging) instructions out of a full single-conversation prompt
+    such as prompt_conner_v7.txt. Prompts without the section marker are used as-is.
+    """
+    start = _BEHAVIOR_SECTION_RE.search(prompt_text)
+    if start is not None:
+        prompt_text = prompt_text[start.start():]
+    end = _PROMPT_TAIL_RE.search(prompt_text)
+    if end is not None:
+        prompt_text = prompt_text[:end.start()]
+    return prompt_text.strip()
+
+
+def format_cleaned_lines_for_prompt(lines: List[dict]) -> str:
+    """One line per segment: 'L<n> [<Speaker>]: <text>'."""
+    return "\n".join(f"L{l['line_no']} [{l['speaker']}]: {l['text']}" for l in lines)
@@ -0,0 +1,174 @@
+import json
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.rate_limits.models.rate_limiter import RateLimiter
+from src.llm_tools.chatgpt_feature_extraction import tag_cleaned_transcript_lines
+from src.llm_tools.cleaned_transcripts import (
+    CLEANING_PROMPT_PATH,
+    CLEANED_TRANSCRIPTS_DIR,
+    get_or_create_cleaned_transcript,
+)
+from src.llm_tools.structured_logging import get_logger
+from src.llm_tools.circuit_breaker import CircuitOpen
+from src.llm_tools.usage_ledger import UsageLedger, BudgetExceeded
+from src.ml_scam_classification.codebook.behavior_codebook import line_jsons_to_label_matrix
+from src.ml_scam_classification.codebook.codebook_compiler import compile_tagging_instructions
+from src.ml_scam_classification.codebook.codebook_diff import CodebookDiff
+from src.ml_scam_classification.features.feature_store import (
+    FEATURE_STORE_DIR,
+    KEY_COLS,
+    PARTITION_COLS,
+    read_feature_store,
+    write_feature_store,
+)
+
+log = get_logger("codebook_relabel")
+
+
+def build_partial_tagging_instructions(codebook: Dict[str, dict], codes: List[str], *, level: str = "full") -> str:
+    """Phase 2 instructions covering only `codes` (the changed labels), in the v7 line json format."""
+    return compile_tagging_instructions(codebook, level, codes=codes)
+
+
+def relabel_changed_codes(
+    transcripts: Dict[int, str],
+    diff: CodebookDiff,
+    new_codebook: Dict[str, dict],
+    *,
+    rl: RateLimiter,
+    model: str,
+    old_prompt_version: str,
+    new_prompt_version: str,
+    role: Optional[str] = None,
+    store_model: Optional[str] = None,
+    source: Optional[str] = None,
+    feature_store_dir: str = FEATURE_STORE_DIR,
+    cleaning_prompt_filepath: str = CLEANING_PROMPT_PATH,
+    cleaned_transcripts_dir: str = CLEANED_TRANSCRIPTS_DIR,
+    ledger: Optional[UsageLedger] = None,
+    max_concurrent_line_requests: Optional[int] = None,
+    lines_per_request: int = 1,
+    max_skipped_fraction: float = 0.05,
+) -> List[str]:
+    """
+    Carry labels from `old_prompt_version` over to `new_prompt_version` in the feature store,
+    asking the model only for the labels the codebook diff says changed (added or reworded).
+
+    - Rows are read from the store partition (old_prompt_version, store_model or model, source).
+    - Unchanged/recategorized code columns are copied, removed codes are dropped.
+    - Changed codes are requested per line over the cached cleaned transcript (phase 2 only),
+      so line numbers line up with the stored rows.
+    - Transcripts with no text or whose cleaned line count differs from the stored rows are
+      skipped. All transcripts are cleaned before any tagging, and if more than
+      max_skipped_fraction of them would be skipped, ValueError is raised before tagging (so the
+      new partition never silently loses a large share of transcripts).
+    - The merged rows are appended under new_prompt_version. Returns the written file paths.
+
+    transcripts: {transcript_id: raw transcript text}, the same texts the old labels came from.
+    """
+    to_relabel = diff.to_relabel
+    filters = {"prompt_version": old_prompt_version, "model": store_model or model}
+    if source is not None:
+        filters["source"] = source
+    old_table = read_feature_store(feature_store_dir, filters=filters)
+    old_table = old_table.select([*KEY_COLS, *PARTITION_COLS, *[c for c in diff.to_keep if c in old_table.column_names]])
+    old_table = old_table.sort_by([("transcript_id", "ascending"), ("line_no", "ascending")])
+    transcript_ids = pc.unique(old_table.column("transcript_id")).to_pylist()
+    log.info(
+        "Relabeling changed codes",
+        old_prompt_version=old_prompt_version,
+        new_prompt_version=new_prompt_version,
+        n_transcripts=len(transcript_ids),
+        n_rows=old_table.num_rows,
+        n_codes_kept=len(diff.to_keep),
+        n_codes_requested=len(to_relabel),
+    )
+
+    tagging_instructions = build_partial_tagging_instructions(new_codebook, to_relabel) if to_relabel else None
+    cleaned_by_id = {}
+    skipped = {}  # transcript_id -> reason
+    merged_parts = []
+    try:
+        if to_relabel:
+            # Clean (cached) every transcript first, so mismatches are counted before any tagging is paid for
+            n_rows_by_id = {
+                vc["values"]: vc["counts"] for vc in pc.value_counts(old_table.column("transcript_id")).to_pylist()
+            }
+            for transcript_id in transcript_ids:
+                if transcript_id not in transcripts:
+                    skipped[transcript_id] = "no transcript text"
+                    continue
+                cleaned = get_or_create_cleaned_transcript(
+                    transcripts[transcript_id],
+                    rl=rl,
+                    model=model,
+                    cleaning_prompt_filepath=cleaning_prompt_filepath,
+                    cache_dir=cleaned_transcripts_dir,
+                    ledger=ledger,
+                    usage_tags={"transcript_id": transcript_id, "source": source, "prompt_version": new_prompt_version},
+                )
+                if len(cleaned["lines"]) != n_rows_by_id[transcript_id]:
+                    skipped[transcript_id] = (
+                        f"{len(cleaned['lines'])} cleaned lines vs {n_rows_by_id[transcript_id]} stored rows"
+                    )
+                    continue
+                cleaned_by_id[transcript_id] = cleaned
+            if skipped:
+                log.warning(
+                    "Skipping transcripts that can't be aligned with their stored rows",
+                    n_transcripts_skipped=len(skipped),
+                    n_transcripts=len(transcript_ids),
+                    skipped=skipped,
+                )
+            if transcript_ids and len(skipped) / len(transcript_ids) > max_skipped_fraction:
+                raise ValueError(
+                    f"{len(skipped)} of {len(transcript_ids)} transcripts would be skipped, above "
+                    f"max_skipped_fraction={max_skipped_fraction}; nothing was relabeled"
+                )
+
+        for i, transcript_id in enumerate(transcript_ids):
+            if transcript_id in skipped:
+                continue
+            rows = old_table.filter(pc.equal(old_table.column("transcript_id"), transcript_id))
+            if to_relabel:
+                json_strings = tag_cleaned_transcript_lines(
+                    cleaned_by_id[transcript_id]["lines"],
+                    tagging_instructions,
+                    model,
+                    role,
+                    f"Relabel Transcript {i + 1}/{len(transcript_ids)}",
+                    rl=rl,
+                    ledger=ledger,
+                    usage_tags={"transcript_id": transcript_id, "source": source, "prompt_version": new_prompt_version},
+                    max_workers=max_concurrent_line_requests,
+                    lines_per_request=lines_per_request,
+                )
+                labels = line_jsons_to_label_matrix([json.loads(s) for s in json_strings], to_relabel)
+                for j, code in enumerate(to_relabel):
+                    rows = rows.append_column(code, pa.array(labels[:, j], type=pa.bool_()))
+            merged_parts.append(rows)
+    except (BudgetExceeded, CircuitOpen) as e:
+        log.warning(
+            "Pausing relabel run; rows relabeled so far are still written.",
+            n_transcripts_done=len(merged_parts),
+            reason=str(e),
+        )
+
+    if not merged_parts:
+        return []
+    merged = pa.concat_tables(merged_parts)
+    idx = merged.column_names.index("prompt_version")
+    merged = merged.set_column(idx, "prompt_version", pa.array([new_prompt_version] * merged.num_rows, type=pa.string()))
+    written = write_feature_store(merged, feature_store_dir)
+    log.info(
+        "Wrote relabeled rows",
+        n_rows=merged.num_rows,
+        n_transcripts=len(merged_parts),
+        n_transcripts_skipped=len(skipped),
+        files=written,
+    )
+    return written
+
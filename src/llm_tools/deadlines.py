@@ -0,0 +1,73 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# (connect, read) seconds for requests/OpenAI calls made without a deadline: no call may block forever
+DEFAULT_CONNECT_TIMEOUT_S = 10.0
+DEFAULT_READ_TIMEOUT_S = 300.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """A request (rate-limit wait + HTTP call) or a whole run ran out of time."""
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """
+    Time budget for a run of LLM requests.
+    - expires_at: time.monotonic() at which the whole run must stop (inf = no run limit)
+    - request_timeout_s: budget of each single request attempt (rate-limit wait + HTTP call),
+      always cut short by the run deadline. None = only the run deadline (and the default
+      HTTP timeouts) apply.
+    Pass the same Deadline down a run; each attempt takes its own for_request() budget.
+    """
+
+    expires_at: float = math.inf
+    request_timeout_s: Optional[float] = None
+
+    def __post_init__(self):
+        if self.request_timeout_s is not None and not self.request_timeout_s > 0:
+            raise ValueError(f"request_timeout_s must be > 0, got {self.request_timeout_s}")
+
+    @classmethod
+    def after(cls, seconds: Optional[float] = None, *, request_timeout_s: Optional[float] = None) -> "Deadline":
+        """Deadline `seconds` from now (None = no run limit)."""
+        if seconds is not None and seconds < 0:
+            raise ValueError(f"seconds must be >= 0, got {seconds}")
+        expires_at = math.inf if seconds is None else time.monotonic() + seconds
+        return cls(expires_at, request_timeout_s)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what: str = "request") -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded before {what}")
+
+    def for_request(self) -> "Deadline":
+        """Budget for one request attempt starting now: min(run deadline, now + request_timeout_s)."""
+        if self.request_timeout_s is None:
+            return self
+        return Deadline(min(self.expires_at, time.monotonic() + self.request_timeout_s), self.request_timeout_s)
+
+    def wait_timeout_s(self) -> Optional[float]:
+        """Timeout to pass to RateLimiter.wait() (None when there is no limit)."""
+        return None if math.isinf(self.expires_at) else self.remaining()
+
+
+def http_timeout(deadline: Optional[Deadline]) -> Tuple[float, float]:
+    """
+    (connect, read) timeout for an HTTP call: the defaults, cut down to what is left of the
+    deadline. For a non-streamed completion the server sends nothing until it is done, so the
+    read timeout bounds the whole call; for streams it bounds the gap between chunks.
+    """
+    if deadline is None:
+        return DEFAULT_CONNECT_TIMEOUT_S, DEFAULT_READ_TIMEOUT_S
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline exceeded before the HTTP call")
+    return min(DEFAULT_CONNECT_TIMEOUT_S, remaining), min(DEFAULT_READ_TIMEOUT_S, remaining)
@@ -1,7 +1,7 @@
 import os
 import time
 import pandas as pd
-from typing import Protocol
+from typing import Protocol, Optional
 
 from google import genai
 from google.genai import types
@@ -12,6 +12,7 @@ from src.ml_scam_classification.utils.file_utils import (
     ensure_file_versioning_ok,
 )
 from src.llm_tools.llm_utils import get_json_from_llm_response
+from src.llm_tools.usage_ledger import UsageLedger, BudgetExceeded
 
 
 NS_PER_MINUTE = 60_000_000_000  # 60 seconds in ns
@@ -21,6 +22,9 @@ def run_gemini_behavioral_analysis(
     prompt_filepath: str,
     response_writepath: str,
     rl: RateLimiter,
+    ledger: Optional[UsageLedger] = None,
+    source: Optional[str] = None,
+    prompt_version: Optional[str] = None,
 ) -> None:
     """
     Run Gemini behavioral analysis with strict rate limiting.
@@ -33,6 +37,10 @@ def run_gemini_behavioral_analysis(
         Path to append JSON responses.
     rl : RateLimiterLike
         An object providing a .wait() method that blocks until a request is allowed.
+    ledger : UsageLedger, optional
+        Records token usage/cost per request; the run stops cleanly once its budget is reached.
+    source, prompt_version : str, optional
+        Tags recorded with each ledger entry (prompt_version defaults to the prompt filename).
     """
     if not isinstance(prompt_filepath, str) or not isinstance(response_writepath, str):
         raise ValueError("ERROR - Expected string paths for prompt_filepath and response_writepath.")
@@ -56,16 +64,28 @@ def run_gemini_behavioral_analysis(
     )
     conversations_small = conversations[:2]
 
-    for _, row in conversations_small.iterrows():
+    model = "gemini-2.5-pro"
+    if prompt_version is None:
+        prompt_version = os.path.splitext(os.path.basename(prompt_filepath))[0]
+
+    for transcript_idx, row in conversations_small.iterrows():
         complete_prompt = f"{system_prompt}\n\ncall transcript:\n\n{row['TEXT']}"
         print("complete prompt:")
         print(complete_prompt)
 
+        if ledger is not None:
+            try:
+                ledger.ensure_within_budget(model)
+            except BudgetExceeded as e:
+                print(f"\n(!!!) - {e}")
+                print(f"Pausing run at transcript index {transcript_idx}.")
+                break
+
         # --- BLOCK HERE until allowed by rate limit
         rl.wait()
 
         response = client.models.generate_content(
-            model="gemini-2.5-pro",
+            model=model,
             contents=complete_prompt,
             config=types.GenerateContentConfig(
                 thinking_config=types.ThinkingConfig(thinking_budget=32768)
@@ -73,9 +93,21 @@ def run_gemini_behavioral_analysis(
         )
         print(response)
 
+        if ledger is not None:
+            ledger.record_gemini_usage(
+                model,
+                response.usage_metadata,
+                transcript_id=transcript_idx,
+                source=source,
+                prompt_version=prompt_version,
+            )
+
         json_str = get_json_from_llm_response(response.text)
 
         # Append JSON result per conversation
         with open(response_writepath, "a", encoding="utf-8") as f:
             f.write(json_str)
             f.write("\n")  # separator per record
+
+    if ledger is not None:
+        print(f"Usage: {ledger.format_summary()}")
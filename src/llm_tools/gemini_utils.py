@@ -48,8 +48,8 @@ def run_simple_gemini_test(
 if __name__ == "__main__":
     # Example usage: import your project-specific rate limiter singleton and run
     #
-    # from settings.ratelimits import GEMINI_2_5_PRO_5RPM
-    # run_simple_gemini_test(rl=GEMINI_2_5_PRO_5RPM)
+    # from src.rate_limits.registry import get_rate_limiter
+    # run_simple_gemini_test(rl=get_rate_limiter("gemini-2.5-pro"))
     #
     # Keeping __main__ empty avoids hard-coding a specific settings dependency here.
     pass
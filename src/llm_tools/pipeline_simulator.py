@@ -0,0 +1,409 @@
+import contextlib
+import glob
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.llm_tools.chatgpt_utils import REQUEST_TIMING_EVENT
+from src.llm_tools.cleaned_transcripts import CLEANED_TRANSCRIPTS_DIR
+from src.rate_limits.models import gcra_rate_limiter, rate_limiter
+from src.rate_limits.models.gcra_rate_limiter import GCRARateLimiter
+from src.rate_limits.models.rate_limiter import RateLimiter
+
+# Discrete-event simulation of a two-phase behavioral analysis run (run_chatgpt_behavioral_analysis):
+# hours of requests are simulated in seconds of CPU, on a virtual clock, with the real rate
+# limiter code deciding when each request may go out.
+
+
+@dataclass(frozen=True)
+class LatencyModel:
+    """
+    Per-attempt latency and error model. A successful attempt takes
+    (overhead_s + s_per_output_token * output tokens) * lognormal(0, sigma) seconds;
+    an attempt fails (non-200, timeout, dropped connection) with probability error_rate,
+    after a log-normal latency with median error_latency_s.
+    Fit it from logged request timings with from_request_log().
+    """
+
+    overhead_s: float = 1.0
+    s_per_output_token: float = 0.02
+    sigma: float = 0.3
+    error_rate: float = 0.02
+    error_latency_s: float = 1.0
+
+    @classmethod
+    def from_request_log(cls, jsonl_path: str, *, model: Optional[str] = None) -> "LatencyModel":
+        """
+        Fit from the structured JSONL log (cout_log_jsonl) of past runs: every REQUEST_TIMING_EVENT
+        record is one attempt. Latency is regressed on completion_tokens where the log has them
+        (otherwise s_per_output_token is 0 and overhead_s is the median latency).
+        """
+        if not os.path.exists(jsonl_path):
+            raise FileNotFoundError(f"Request log not found: {jsonl_path}")
+        records = []
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("msg") == REQUEST_TIMING_EVENT and (model is None or record.get("model") == model):
+                    records.append(record)
+        if not records:
+            raise ValueError(f"No {REQUEST_TIMING_EVENT!r} records{f' for model {model!r}' if model else ''} in {jsonl_path}")
+
+        ok = [r for r in records if r["outcome"] == "200"]
+        failed = [r for r in records if r["outcome"] != "200"]
+        if not ok:
+            raise ValueError(f"No successful requests to fit latencies from in {jsonl_path}")
+        latency = np.array([r["latency_s"] for r in ok], dtype=float)
+        tokens = np.array([r.get("completion_tokens") or np.nan for r in ok], dtype=float)
+
+        has_tokens = ~np.isnan(tokens)
+        if has_tokens.sum() >= 10 and np.ptp(tokens[has_tokens]) > 0:
+            slope, intercept = np.polyfit(tokens[has_tokens], latency[has_tokens], 1)
+            s_per_output_token, overhead_s = max(0.0, slope), max(0.05, intercept)
+            predicted = overhead_s + s_per_output_token * tokens[has_tokens]
+            residuals = np.log(np.maximum(latency[has_tokens], 1e-3) / predicted)
+        else:
+            s_per_output_token, overhead_s = 0.0, float(np.median(latency))
+            residuals = np.log(np.maximum(latency, 1e-3) / overhead_s)
+        return cls(
+            overhead_s=float(overhead_s),
+            s_per_output_token=float(s_per_output_token),
+            sigma=float(residuals.std()) if residuals.size > 1 else 0.0,
+            error_rate=len(failed) / len(records),
+            error_latency_s=float(np.median([r["latency_s"] for r in failed])) if failed else 1.0,
+        )
+
+    def sample(self, rng: np.random.Generator, output_tokens: float):
+        """(latency_s, succeeded) for one attempt."""
+        if rng.random() < self.error_rate:
+            return self.error_latency_s * float(rng.lognormal(0.0, self.sigma)), False
+        median_s = self.overhead_s + self.s_per_output_token * output_tokens
+        return median_s * float(rng.lognormal(0.0, self.sigma)), True
+
+
+@dataclass(frozen=True)
+class SchedulingStrategy:
+    """
+    How a run schedules its requests; the first two fields are the run_chatgpt_behavioral_analysis
+    arguments of the same name.
+    - max_concurrent_line_requests=None tags lines one after another in one conversation;
+      otherwise batches of lines_per_request lines are fanned out on that many workers.
+    - max_concurrent_transcripts: transcripts in progress at once (the run loop does 1).
+    - n_api_keys: keys the load is spread over (transcripts round robin), each with its own rpm.
+    - limiter_backend / burst: "deque" (RateLimiter) or "gcra" (GCRARateLimiter).
+    """
+
+    max_concurrent_line_requests: Optional[int] = None
+    lines_per_request: int = 1
+    max_concurrent_transcripts: int = 1
+    n_api_keys: int = 1
+    limiter_backend: str = "deque"
+    burst: int = 1
+
+    def __post_init__(self):
+        if self.max_concurrent_line_requests is not None and self.max_concurrent_line_requests < 1:
+            raise ValueError("max_concurrent_line_requests must be None or >= 1")
+        if min(self.lines_per_request, self.max_concurrent_transcripts, self.n_api_keys, self.burst) < 1:
+            raise ValueError("lines_per_request, max_concurrent_transcripts, n_api_keys and burst must be >= 1")
+        if self.limiter_backend not in ("deque", "gcra"):
+            raise ValueError(f"limiter_backend must be \"deque\" or \"gcra\", got {self.limiter_backend!r}")
+        if self.limiter_backend == "deque" and self.burst != 1:
+            raise ValueError("burst is only supported by the gcra backend")
+
+
+@dataclass(frozen=True)
+class Workload:
+    """
+    The transcripts to process, by cleaned line count (see cleaned_transcript_line_counts),
+    and how requests behave: output tokens per cleaned line in phase 1 and per tagged line in
+    phase 2 (json tagging is far longer than the sparse format), and continue_conversation's
+    retries (max_attempts per request, retry_sleep_s between them). A request that exhausts its
+    attempts fails its transcript. request_timeout_s turns slower attempts into timeouts.
+    """
+
+    transcript_lines: Sequence[int]
+    cleaning_tokens_per_line: float = 30.0
+    tagging_tokens_per_line: float = 150.0
+    cleaning_cached_fraction: float = 0.0  # transcripts whose phase 1 artifact is already cached
+    max_attempts: int = 5
+    retry_sleep_s: float = 1.0
+    request_timeout_s: Optional[float] = None
+
+
+def cleaned_transcript_line_counts(cache_dir: str = CLEANED_TRANSCRIPTS_DIR, cleaning_prompt_version: Optional[str] = None) -> List[int]:
+    """Line counts of the cached phase 1 artifacts (all cleaning prompt versions by default)."""
+    pattern = os.path.join(cache_dir, cleaning_prompt_version or "*", "*.json")
+    counts = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            counts.append(len(json.load(f)["lines"]))
+    if not counts:
+        raise FileNotFoundError(f"No cleaned transcript artifacts match {pattern}")
+    return counts
+
+
+class _VirtualTime:
+    """Stands in for the time module inside the limiter modules: time only moves when the simulation moves it."""
+
+    def __init__(self, start_ns: int):
+        self.start_ns = start_ns
+        self.now_ns = start_ns
+
+    def time_ns(self) -> int:
+        return self.now_ns
+
+    def time(self) -> float:
+        return self.now_ns / 1e9
+
+    def monotonic(self) -> float:
+        return (self.now_ns - self.start_ns) / 1e9
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds: float) -> None:
+        self.now_ns += int(round(seconds * 1e9))
+
+
+@contextlib.contextmanager
+def _limiters_on_virtual_time(clock: _VirtualTime):
+    """Point the limiter modules' `time` at the virtual clock (process-wide: don't run real limiters meanwhile)."""
+    modules = (rate_limiter, gcra_rate_limiter)
+    real = [m.time for m in modules]
+    for m in modules:
+        m.time = clock
+    try:
+        yield
+    finally:
+        for m, t in zip(modules, real):
+            m.time = t
+
+
+class _SimulatedLimiter:
+    """A real limiter on the virtual clock: acquire(now) is when wait() called at now would return."""
+
+    def __init__(self, limiter, clock: _VirtualTime):
+        self.limiter = limiter
+        self.clock = clock
+
+    def acquire(self, now_ns: int) -> int:
+        # both limiters reserve under their lock and sleep outside it, so callers never queue
+        # behind each other's sleeps: the permit time only depends on the call time
+        self.clock.now_ns = now_ns
+        self.limiter.wait()
+        return self.clock.now_ns
+
+
+class _Process:
+    __slots__ = ("gen", "parent", "pending", "send_value")
+
+    def __init__(self, gen, parent=None):
+        self.gen = gen
+        self.parent = parent
+        self.pending = 0
+        self.send_value = None
+
+
+class _EventLoop:
+    """
+    Minimal discrete-event engine. Processes are generators that yield either a delay in seconds
+    (sleep) or a list of generators (run them concurrently, resume when all have finished).
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self._heap = []
+        self._seq = itertools.count()
+
+    def _schedule(self, at: float, proc: _Process) -> None:
+        heapq.heappush(self._heap, (at, next(self._seq), proc))
+
+    def run(self, gen) -> None:
+        self._schedule(self.now, _Process(gen))
+        while self._heap:
+            self.now, _, proc = heapq.heappop(self._heap)
+            self._step(proc)
+
+    def _step(self, proc: _Process) -> None:
+        try:
+            yielded = proc.gen.send(proc.send_value)
+        except StopIteration:
+            parent = proc.parent
+            if parent is not None:
+                parent.pending -= 1
+                if parent.pending == 0:
+                    self._schedule(self.now, parent)
+            return
+        if isinstance(yielded, list):
+            proc.pending = len(yielded)
+            if not yielded:
+                self._schedule(self.now, proc)
+            for child in yielded:
+                self._schedule(self.now, _Process(child, parent=proc))
+        else:
+            self._schedule(self.now + max(0.0, float(yielded)), proc)
+
+
+class PipelineSimulator:
+    """
+    Simulates one run of the two-phase pipeline under a SchedulingStrategy and predicts its
+    throughput (transcripts/hour) and queueing (requests waiting on the rate limiter, permit
+    waits, requests in flight, per-transcript latency).
+
+    Scheduling mirrors run_chatgpt_behavioral_analysis: per transcript, one phase 1 (cleaning)
+    request unless cached, then phase 2 tagging either sequentially or fanned out
+    (fan_out_line_tagging). Every attempt, retries included, takes a permit from a real
+    RateLimiter / GCRARateLimiter running on the virtual clock (state in a temporary directory).
+    Deterministic for a given seed.
+    """
+
+    def __init__(self, workload: Workload, latency_model: LatencyModel, *, rpm: int, seed: int = 0):
+        if not (isinstance(rpm, int) and rpm > 0):
+            raise ValueError("rpm (requests per minute) must be a positive int.")
+        if not workload.transcript_lines:
+            raise ValueError("workload.transcript_lines must not be empty")
+        self.workload = workload
+        self.latency_model = latency_model
+        self.rpm = rpm
+        self.seed = seed
+
+    def _make_limiter(self, strategy: SchedulingStrategy, directory: str, key_index: int):
+        if strategy.limiter_backend == "gcra":
+            path = os.path.join(directory, f"key{key_index}__gcra{self.rpm}.pkl")
+            return GCRARateLimiter(self.rpm, path, burst=strategy.burst, create_pkl_w_state=True,
+                                   print_updates=False, requests_per_log_write=10**9)
+        path = os.path.join(directory, f"key{key_index}__prev{self.rpm}.pkl")
+        return RateLimiter(self.rpm, path, create_pkl_w_deque=True, print_updates=False, requests_per_log_write=10**9)
+
+    def run(self, strategy: SchedulingStrategy) -> dict:
+        """Simulate the whole workload under strategy; returns the predicted run statistics."""
+        cpu_start = time.process_time()
+        wl = self.workload
+        rng = np.random.default_rng(self.seed)
+        loop = _EventLoop()
+        clock = _VirtualTime(time.time_ns())
+        start_ns = clock.start_ns
+        permit_waits, queue_events, flight_events, transcript_latencies = [], [], [], []
+        counts = {"attempts": 0, "failed_attempts": 0, "failed_transcripts": 0}
+
+        def _request(limiter: _SimulatedLimiter, output_tokens: float):
+            for attempt in range(wl.max_attempts):
+                now_ns = start_ns + int(loop.now * 1e9)
+                granted_s = max(loop.now, (limiter.acquire(now_ns) - start_ns) / 1e9)  # ns rounding
+                permit_waits.append(granted_s - loop.now)
+                queue_events.extend(((loop.now, 1), (granted_s, -1)))
+                yield granted_s - loop.now
+
+                latency_s, ok = self.latency_model.sample(rng, output_tokens)
+                if wl.request_timeout_s is not None and latency_s > wl.request_timeout_s:
+                    latency_s, ok = wl.request_timeout_s, False
+                flight_events.extend(((loop.now, 1), (loop.now + latency_s, -1)))
+                counts["attempts"] += 1
+                yield latency_s
+                if ok:
+                    return True
+                counts["failed_attempts"] += 1
+                if attempt < wl.max_attempts - 1:
+                    yield wl.retry_sleep_s
+            return False
+
+        def _transcript(index: int, n_lines: int, limiter: _SimulatedLimiter):
+            started = loop.now
+            failed = []
+            if rng.random() >= wl.cleaning_cached_fraction:
+                ok = yield from _request(limiter, wl.cleaning_tokens_per_line * n_lines)
+                if not ok:
+                    failed.append(index)
+            if not failed and strategy.max_concurrent_line_requests is None:
+                for _ in range(n_lines):
+                    if not (yield from _request(limiter, wl.tagging_tokens_per_line)):
+                        failed.append(index)
+                        break
+            elif not failed:
+                k = strategy.lines_per_request
+                batches = [min(k, n_lines - i) for i in range(0, n_lines, k)]
+
+                def _line_worker():
+                    while batches:
+                        if not (yield from _request(limiter, wl.tagging_tokens_per_line * batches.pop())):
+                            failed.append(index)
+
+                yield [_line_worker() for _ in range(min(strategy.max_concurrent_line_requests, len(batches)))]
+            if failed:
+                counts["failed_transcripts"] += 1
+            transcript_latencies.append(loop.now - started)
+
+        with tempfile.TemporaryDirectory() as directory, _limiters_on_virtual_time(clock):
+            limiters = [_SimulatedLimiter(self._make_limiter(strategy, directory, k), clock)
+                        for k in range(strategy.n_api_keys)]
+            pending = list(enumerate(wl.transcript_lines))[::-1]
+
+            def _transcript_worker():
+                while pending:
+                    index, n_lines = pending.pop()
+                    yield from _transcript(index, n_lines, limiters[index % len(limiters)])
+
+            loop.run(_worker_pool(_transcript_worker, strategy.max_concurrent_transcripts))
+
+        makespan_s = loop.now
+        queue_mean, queue_max = _time_weighted_level(queue_events, makespan_s)
+        in_flight_mean, in_flight_max = _time_weighted_level(flight_events, makespan_s)
+        n_done = len(wl.transcript_lines) - counts["failed_transcripts"]
+        waits = np.asarray(permit_waits)
+        latencies = np.asarray(transcript_latencies)
+        return {
+            **asdict(strategy),
+            "n_transcripts": len(wl.transcript_lines),
+            "n_failed_transcripts": counts["failed_transcripts"],
+            "makespan_h": makespan_s / 3600,
+            "transcripts_per_hour": n_done / (makespan_s / 3600) if makespan_s > 0 else float("nan"),
+            "n_attempts": counts["attempts"],
+            "n_failed_attempts": counts["failed_attempts"],
+            "limiter_utilization": counts["attempts"] / (self.rpm * strategy.n_api_keys * makespan_s / 60) if makespan_s > 0 else float("nan"),
+            "permit_wait_s_mean": float(waits.mean()),
+            "permit_wait_s_p95": float(np.quantile(waits, 0.95)),
+            "waiting_for_permit_mean": queue_mean,
+            "waiting_for_permit_max": queue_max,
+            "in_flight_mean": in_flight_mean,
+            "in_flight_max": in_flight_max,
+            "transcript_latency_s_p50": float(np.quantile(latencies, 0.5)),
+            "transcript_latency_s_p95": float(np.quantile(latencies, 0.95)),
+            "sim_cpu_s": time.process_time() - cpu_start,
+        }
+
+
+def _worker_pool(worker, n: int):
+    """Process running n copies of worker() concurrently (a pool of n workers on a shared queue)."""
+    yield [worker() for _ in range(n)]
+
+
+def _time_weighted_level(events, end_s: float):
+    """(time-weighted mean, max) of a level changed by (time, +1/-1) events."""
+    if not events or end_s <= 0:
+        return 0.0, 0
+    events = sorted(events)
+    times = np.array([t for t, _ in events])
+    levels = np.cumsum([d for _, d in events])
+    durations = np.diff(np.append(times, end_s))
+    return float((levels * durations).sum() / end_s), int(levels.max())
+
+
+def compare_strategies(
+    strategies: Dict[str, SchedulingStrategy],
+    workload: Workload,
+    latency_model: LatencyModel,
+    *,
+    rpm: int,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Simulate every strategy on the same workload (and seed); one row per strategy, fastest first."""
+    simulator = PipelineSimulator(workload, latency_model, rpm=rpm, seed=seed)
+    rows = [{"strategy": name, **simulator.run(strategy)} for name, strategy in strategies.items()]
+    return pd.DataFrame(rows).sort_values("transcripts_per_hour", ascending=False, ignore_index=True)
@@ -0,0 +1,371 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.rate_limits.models.rate_limiter import RateLimiter
+from src.llm_tools.chatgpt_feature_extraction import tag_cleaned_transcript_lines
+from src.llm_tools.cleaned_transcripts import (
+    CLEANING_PROMPT_PATH,
+    CLEANED_TRANSCRIPTS_DIR,
+    extract_behavior_tagging_instructions,
+    get_or_create_cleaned_transcript,
+)
+from src.llm_tools.structured_logging import get_logger
+from src.llm_tools.circuit_breaker import CircuitOpen
+from src.llm_tools.usage_ledger import UsageLedger, BudgetExceeded
+from src.ml_scam_classification.codebook.behavior_codebook import (
+    line_jsons_to_label_matrix,
+    load_codebook,
+    parse_prompt_codebook,
+)
+from src.ml_scam_classification.evaluation.label_metrics import bootstrap_label_metrics, summary_metrics
+from src.ml_scam_classification.features.call_aggregates import offsets_from_sorted_ids
+from src.ml_scam_classification.features.feature_store import (
+    FEATURE_STORE_DIR,
+    code_columns,
+    match_transcript_keys,
+    read_feature_store,
+    table_to_label_matrix,
+    transcript_keys,
+)
+
+log = get_logger("prompt_evaluation")
+
+OUTPUT_FORMATS = ("json", "sparse")
+
+
+@dataclass(frozen=True)
+class PromptVariant:
+    """
+    One arm of the comparison: a tagging prompt run with a model.
+    output_format "sparse" means the prompt asks for the sparse code-list format
+    (see compile_sparse_tagging_instructions) instead of per-line json.
+    codebook_path: the codebook a compiled prompt was built from (features*.json), checked
+    instead of the prompt text, for compacted prompts whose wording differs by design.
+    """
+    name: str
+    prompt_filepath: str
+    model: str
+    role: Optional[str] = None
+    output_format: str = "json"
+    lines_per_request: int = 1
+    codebook_path: Optional[str] = None
+
+    def __post_init__(self):
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got {self.output_format!r}")
+
+
+@dataclass
+class VariantRun:
+    variant: str
+    transcript_id: int
+    latency_s: float
+    labels: Optional[np.ndarray] = None  # (n_lines, n_codes) over the reference codes
+    error: Optional[str] = None
+
+
+def stratified_sample(strata: Sequence, n: int, *, seed: int = 0) -> np.ndarray:
+    """
+    Up to n row indices, allocated to each stratum (e.g. "scam|youtube1") in proportion to its
+    size, with at least one row per stratum. Returned in ascending order.
+    """
+    strata = np.asarray(strata)
+    rng = np.random.default_rng(seed)
+    values, inverse, counts = np.unique(strata, return_inverse=True, return_counts=True)
+    if n >= len(strata):
+        return np.arange(len(strata))
+    quota = np.maximum(1, np.floor(counts * n / len(strata))).astype(int)
+    # hand out the remainder to the strata with the largest fractional share
+    for i in np.argsort(-(counts * n / len(strata) - quota))[: max(0, n - quota.sum())]:
+        quota[i] += 1
+    picked = [
+        rng.choice(np.flatnonzero(inverse == k), size=min(quota[k], counts[k]), replace=False)
+        for k in range(len(values))
+    ]
+    return np.sort(np.concatenate(picked))
+
+
+def _normalized_description(description: str) -> str:
+    return " ".join(description.split()).rstrip(".").casefold()
+
+
+def codebook_mismatches(codebook: Dict[str, dict], reference_codebook: Dict[str, dict], codes: Sequence[str]) -> List[str]:
+    """Codes of `codes` that `codebook` is missing or describes differently (whitespace/case aside)."""
+    problems = []
+    for code in codes:
+        if code not in codebook:
+            problems.append(f"{code}: missing")
+        elif code in reference_codebook and _normalized_description(codebook[code]["description"]) != (
+            _normalized_description(reference_codebook[code]["description"])
+        ):
+            problems.append(f"{code}: {codebook[code]['description']!r} != {reference_codebook[code]['description']!r}")
+    return problems
+
+
+def load_reference_labels(
+    feature_store_dir: str = FEATURE_STORE_DIR,
+    *,
+    prompt_version: str,
+    transcript_ids: Optional[Sequence[int]] = None,
+    filters: Optional[dict] = None,
+):
+    """({transcript_id: (n_lines, n_codes) bool labels}, codes) from a reference partition of the feature store."""
+    filters = dict(filters or {}, prompt_version=prompt_version)
+    if transcript_ids is not None:
+        filters["transcript_id"] = [int(t) for t in transcript_ids]
+    table = read_feature_store(feature_store_dir, filters=filters)
+    table = table.sort_by([("transcript_id", "ascending"), ("line_no", "ascending")])
+    codes = code_columns(table)
+    labels = table_to_label_matrix(table, codes)
+    ids, offsets = offsets_from_sorted_ids(table.column("transcript_id").to_numpy())
+    return {int(t): labels[offsets[i]:offsets[i + 1]] for i, t in enumerate(ids)}, codes
+
+
+def sample_reference_transcripts(
+    df: pd.DataFrame,
+    n: int,
+    *,
+    prompt_version: str,
+    feature_store_dir: str = FEATURE_STORE_DIR,
+    label_col: Optional[str] = None,
+    onehot_cols: Sequence[str] = (),
+    seed: int = 0,
+    transcripts_col: str = "transcripts",
+) -> Tuple[Dict[int, str], Dict[int, np.ndarray], List[str]]:
+    """
+    Stratified sample of up to n transcripts of `df` (e.g. the compiled csv) that have reference
+    labels in the store partition `prompt_version`. Returns (transcripts, reference_labels, codes),
+    both dicts keyed by the reference's transcript_id, ready for run_prompt_ab_evaluation.
+
+    - Reference transcripts are found in df by transcript_sha256, not by row number. Ones stored
+      without it are skipped; if any other isn't in df, ValueError is raised (the reference was
+      annotated on a different transcripts csv).
+    - Strata: the value of label_col, plus which of onehot_cols (e.g. source one-hots) is set.
+    """
+    reference, codes = load_reference_labels(feature_store_dir, prompt_version=prompt_version)
+    if not reference:
+        raise ValueError(
+            f"No reference labels under prompt_version={prompt_version!r} in {feature_store_dir} "
+            f"(import them with scripts/ETL/import_reference_labels.py)"
+        )
+    ids = sorted(reference)
+    key_table = read_feature_store(
+        feature_store_dir, filters={"prompt_version": prompt_version}, columns=["transcript_id", "transcript_sha256"]
+    )
+    keys = transcript_keys(key_table, ids)
+    rows = match_transcript_keys(keys, df[transcripts_col].astype(str))
+    unkeyed = [t for t, k in zip(ids, keys) if k is None]
+    if unkeyed:
+        log.warning("Reference transcripts stored without transcript_sha256 are skipped", n_skipped=len(unkeyed))
+    unmatched = [t for t, k, row in zip(ids, keys, rows) if k is not None and row < 0]
+    if unmatched:
+        raise ValueError(
+            f"{len(unmatched)} of {len(ids)} reference transcripts (e.g. transcript_id {unmatched[:5]}) are not "
+            f"in the transcripts csv: the reference labels were made from a different csv"
+        )
+
+    eligible_ids = [t for t, row in zip(ids, rows) if row >= 0]
+    eligible = df.iloc[rows[rows >= 0]]
+    strata = eligible[label_col].astype(str) if label_col is not None else pd.Series("", index=eligible.index)
+    present_onehot_cols = [c for c in onehot_cols if c in df.columns]
+    if present_onehot_cols:
+        strata = strata + "|" + eligible[present_onehot_cols].idxmax(axis=1)
+    picked = stratified_sample(strata.to_numpy(), n, seed=seed)
+    transcripts = {eligible_ids[i]: str(eligible[transcripts_col].iloc[i]) for i in picked}
+    return transcripts, {t: reference[t] for t in transcripts}, codes
+
+
+def run_prompt_ab_evaluation(
+    variants: Sequence[PromptVariant],
+    transcripts: Dict[int, str],
+    reference_labels: Dict[int, np.ndarray],
+    codes: Sequence[str],
+    *,
+    rl: RateLimiter,
+    ledger: Optional[UsageLedger] = None,
+    max_concurrent_transcripts: int = 4,
+    max_concurrent_line_requests: Optional[int] = None,
+    cleaning_model: Optional[str] = None,
+    cleaning_prompt_filepath: str = CLEANING_PROMPT_PATH,
+    cleaned_transcripts_dir: str = CLEANED_TRANSCRIPTS_DIR,
+    n_boot: int = 1000,
+    reference_codebook: Optional[Dict[str, dict]] = None,
+) -> pd.DataFrame:
+    """
+    Run every variant on every transcript concurrently (one job per (variant, transcript) on
+    a thread pool, all sharing `rl` and `ledger`), and score each against the reference labels.
+
+    All variants tag the same cached cleaned transcripts (phase 1 runs once per transcript,
+    before the variants fan out), so their lines align with each other and with the reference.
+    Usage is recorded in the ledger with prompt_version=<variant name>.
+    Returns one row per variant (see summarize_variant_runs).
+
+    Every variant is scored against the same `codes`, so each variant's codebook (parsed from its
+    tagging instructions, or its codebook_path) must define them the way reference_codebook does
+    (default: the first variant's codebook). Variants that don't are skipped with a warning.
+    """
+    names = [v.name for v in variants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Variant names must be unique, got: {names}")
+    transcript_ids = [t for t in transcripts if t in reference_labels]
+    if len(transcript_ids) < len(transcripts):
+        log.warning("Transcripts without reference labels are skipped", n_skipped=len(transcripts) - len(transcript_ids))
+
+    instructions = {}
+    for v in variants:
+        with open(v.prompt_filepath, "r", encoding="utf-8") as f:
+            instructions[v.name] = extract_behavior_tagging_instructions(f.read())
+
+    # same code ids can mean different behaviors in different prompt versions
+    checked = []
+    for v in variants:
+        codebook = load_codebook(v.codebook_path) if v.codebook_path else parse_prompt_codebook(instructions[v.name])
+        if reference_codebook is None:
+            reference_codebook = codebook
+        problems = codebook_mismatches(codebook, reference_codebook, codes)
+        if problems:
+            log.warning(
+                "Variant codebook does not match the reference codes, skipping variant",
+                variant=v.name,
+                n_mismatched_codes=len(problems),
+                examples=problems[:5],
+            )
+            continue
+        checked.append(v)
+    if not checked:
+        raise ValueError("No variant's codebook matches the reference codes; nothing to compare")
+    variants = checked
+    names = [v.name for v in variants]
+
+    # phase 1 once per transcript (cached on disk), shared by every variant
+    cleaned_lines = {}
+    for t in transcript_ids:
+        cleaned = get_or_create_cleaned_transcript(
+            transcripts[t],
+            rl=rl,
+            model=cleaning_model or variants[0].model,
+            cleaning_prompt_filepath=cleaning_prompt_filepath,
+            cache_dir=cleaned_transcripts_dir,
+            ledger=ledger,
+            usage_tags={"transcript_id": t, "prompt_version": "cleaning"},
+        )
+        if len(cleaned["lines"]) != len(reference_labels[t]):
+            log.warning(
+                "Cleaned transcript and reference have different line counts, skipping",
+                transcript_id=t,
+                n_cleaned_lines=len(cleaned["lines"]),
+                n_reference_lines=len(reference_labels[t]),
+            )
+            continue
+        cleaned_lines[t] = cleaned["lines"]
+
+    def _run(job) -> VariantRun:
+        variant, t = job
+        start = time.perf_counter()
+        try:
+            if ledger is not None:
+                ledger.ensure_within_budget(variant.model)
+            json_strings = tag_cleaned_transcript_lines(
+                cleaned_lines[t],
+                instructions[variant.name],
+                variant.model,
+                variant.role,
+                f"A/B {variant.name}, Call Transcript {t}",
+                rl=rl,
+                ledger=ledger,
+                usage_tags={"transcript_id": t, "prompt_version": variant.name},
+                max_workers=max_concurrent_line_requests,
+                lines_per_request=variant.lines_per_request,
+                sparse_codes=codes if variant.output_format == "sparse" else None,
+            )
+            labels = line_jsons_to_label_matrix([json.loads(s) for s in json_strings], codes)
+            return VariantRun(variant.name, t, time.perf_counter() - start, labels=labels)
+        except (BudgetExceeded, CircuitOpen) as e:
+            return VariantRun(variant.name, t, 0.0, error=f"skipped: {e}")
+        except Exception as e:
+            log.warning("Variant run failed", variant=variant.name, transcript_id=t, error=repr(e))
+            return VariantRun(variant.name, t, time.perf_counter() - start, error=repr(e))
+
+    # interleave variants so a budget stop leaves every variant with a comparable sample
+    jobs = [(v, t) for t in cleaned_lines for v in variants]
+    with ThreadPoolExecutor(max_workers=max_concurrent_transcripts) as executor:
+        runs = list(executor.map(_run, jobs))
+
+    return summarize_variant_runs(runs, reference_labels, names, ledger=ledger, n_boot=n_boot)
+
+
+def summarize_variant_runs(
+    runs: List[VariantRun],
+    reference_labels: Dict[int, np.ndarray],
+    variant_names: Sequence[str],
+    *,
+    ledger: Optional[UsageLedger] = None,
+    n_boot: int = 1000,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Per variant: label accuracy and macro/micro precision, recall and F1 over all scored lines
+    (pooled), latency and, with a ledger, tokens and cost per transcript. Only transcripts every
+    variant completed are scored, so the quality numbers compare the same lines.
+
+    With n_boot > 0, macro_f1 and micro_f1 get 95% intervals from a bootstrap over transcripts.
+    """
+    ok = {}
+    for r in runs:
+        if r.error is None:
+            ok.setdefault(r.transcript_id, {})[r.variant] = r
+    common = sorted(t for t, by_variant in ok.items() if len(by_variant) == len(variant_names))
+
+    usage = ledger.summary_by("prompt_version") if ledger is not None else pd.DataFrame()
+    usage = usage.set_index("prompt_version") if not usage.empty else usage
+
+    rows = []
+    for name in variant_names:
+        variant_runs = [r for r in runs if r.variant == name]
+        latencies = np.array([r.latency_s for r in variant_runs if r.error is None])
+        row = {
+            "variant": name,
+            "n_transcripts_scored": len(common),
+            "n_failed": sum(r.error is not None for r in variant_runs),
+            "latency_s_mean": float(latencies.mean()) if latencies.size else float("nan"),
+            "latency_s_p90": float(np.percentile(latencies, 90)) if latencies.size else float("nan"),
+        }
+        if common:
+            y_true = np.vstack([reference_labels[t] for t in common])
+            y_pred = np.vstack([ok[t][name].labels for t in common])
+            row["n_lines_scored"] = len(y_true)
+            row.update(summary_metrics(y_true, y_pred))
+            if n_boot > 0:
+                groups = np.repeat(common, [len(reference_labels[t]) for t in common])
+                intervals = bootstrap_label_metrics(y_true, y_pred, groups=groups, n_boot=n_boot, seed=seed)
+                for metric in ("macro_f1", "micro_f1"):
+                    row[f"{metric}_ci_low"] = intervals[metric]["ci_low"]
+                    row[f"{metric}_ci_high"] = intervals[metric]["ci_high"]
+        else:
+            row["macro_f1"] = float("nan")
+        if not usage.empty and name in usage.index:
+            n_done = max(1, int(np.count_nonzero([r.error is None for r in variant_runs])))
+            row["tokens_per_transcript"] = float(usage.loc[name, "total_tokens"]) / n_done
+            row["output_tokens_per_transcript"] = float(usage.loc[name, "completion_tokens"]) / n_done
+            row["cost_usd_per_transcript"] = float(usage.loc[name, "cost_usd"]) / n_done
+        rows.append(row)
+
+    report = pd.DataFrame(rows)
+    cost_col = "cost_usd_per_transcript" if "cost_usd_per_transcript" in report.columns else "latency_s_mean"
+    report["on_frontier"] = pareto_frontier(report["macro_f1"].to_numpy(), report[cost_col].to_numpy())
+    return report
+
+
+def pareto_frontier(quality: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    """True for variants no other variant beats on both quality (higher) and cost (lower)."""
+    quality = np.nan_to_num(np.asarray(quality, dtype=float), nan=-np.inf)
+    cost = np.nan_to_num(np.asarray(cost, dtype=float), nan=np.inf)
+    better_or_equal = (quality[None, :] >= quality[:, None]) & (cost[None, :] <= cost[:, None])
+    strictly_better = (quality[None, :] > quality[:, None]) | (cost[None, :] < cost[:, None])
+    return ~np.any(better_or_equal & strictly_better, axis=1)
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional, TypeVar
+
+import numpy as np
+
+from src.rate_limits.models.rate_limiter import RateLimiter
+from src.llm_tools.structured_logging import get_logger
+
+log = get_logger("request_hedging")
+
+T = TypeVar("T")
+
+
+class HedgeCancelled(Exception):
+    """Raised by an attempt that noticed it lost the race (its `cancelled` event is set)."""
+
+
+class RequestHedger:
+    """
+    Hedged requests: if an attempt is still running after the hedge delay (the `quantile` of
+    recent attempt latencies, clamped to [min_delay_s, max_delay_s]), fire one duplicate; the
+    first successful result wins and the other attempt is cancelled.
+
+    - attempt(cancelled) is the blocking request. It gets a threading.Event that is set once it
+      has lost; it should check it while queued for a rate limit permit (before booking one),
+      after getting the permit and between streamed chunks, and raise HedgeCancelled, so a loser
+      that hasn't been sent yet never is and doesn't use up a permit while queued.
+      Threads can't be killed, so a loser already blocked in a non-streamed POST runs to
+      completion in the background and its result is discarded.
+    - A duplicate is only fired when the rate limiter has a permit free right now
+      (rl.seconds_until_available() == 0, a non-blocking peek) and hedges stay under
+      max_hedge_fraction of requests.
+    - No hedging until min_samples attempt latencies have been seen.
+    Thread-safe; share one hedger per provider/model.
+    """
+
+    def __init__(
+        self,
+        *,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 500,
+        min_delay_s: float = 2.0,
+        max_delay_s: float = 120.0,
+        max_hedge_fraction: float = 0.1,
+        max_workers: int = 32,
+    ):
+        if not 0 < quantile < 1:
+            raise ValueError(f"quantile must be in (0, 1), got {quantile}")
+        if not (isinstance(min_samples, int) and min_samples >= 1 and isinstance(window, int) and window >= min_samples):
+            raise ValueError("min_samples must be an int >= 1 and window an int >= min_samples")
+        if not 0 <= min_delay_s <= max_delay_s:
+            raise ValueError("Need 0 <= min_delay_s <= max_delay_s")
+        if not 0 <= max_hedge_fraction <= 1:
+            raise ValueError(f"max_hedge_fraction must be in [0, 1], got {max_hedge_fraction}")
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay_s = min_delay_s
+        self.max_delay_s = max_delay_s
+        self.max_hedge_fraction = max_hedge_fraction
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._attempt_latencies = deque(maxlen=window)
+        self._request_latencies = deque(maxlen=window)
+        self.n_requests = 0
+        self.n_hedged = 0
+        self.n_hedge_wins = 0
+        self.n_skipped_no_headroom = 0
+        self.n_failed_attempts = 0
+        self.latency_saved_s = 0.0  # measured on hedge wins whose losing primary still completed
+
+    def hedge_delay_s(self) -> Optional[float]:
+        """Current hedge delay, or None while there are fewer than min_samples latencies."""
+        with self._lock:
+            if len(self._attempt_latencies) < self.min_samples:
+                return None
+            delay = float(np.quantile(np.fromiter(self._attempt_latencies, dtype=np.float64), self.quantile))
+        return min(max(delay, self.min_delay_s), self.max_delay_s)
+
+    def _may_hedge(self, rl: Optional[RateLimiter]) -> bool:
+        with self._lock:
+            if self.n_hedged + 1 > self.max_hedge_fraction * self.n_requests:
+                return False
+        if rl is not None and rl.seconds_until_available() > 0:
+            with self._lock:
+                self.n_skipped_no_headroom += 1
+            return False
+        return True
+
+    def _submit(self, attempt: Callable[[threading.Event], T]):
+        cancelled = threading.Event()
+        start = time.perf_counter()
+
+        def _timed():
+            result = attempt(cancelled)
+            elapsed = time.perf_counter() - start
+            # losers that still completed are real latencies too; leaving them out would bias the delay low
+            with self._lock:
+                self._attempt_latencies.append(elapsed)
+            return result
+
+        return self._executor.submit(_timed), cancelled
+
+    def run(self, attempt: Callable[[threading.Event], T], *, rl: Optional[RateLimiter] = None) -> T:
+        start = time.perf_counter()
+        with self._lock:
+            self.n_requests += 1
+        primary, primary_cancelled = self._submit(attempt)
+        attempts = {primary: primary_cancelled}
+
+        delay = self.hedge_delay_s()
+        if delay is not None:
+            done, _ = wait([primary], timeout=delay)
+            if not done and self._may_hedge(rl):
+                hedge, hedge_cancelled = self._submit(attempt)
+                attempts[hedge] = hedge_cancelled
+                with self._lock:
+                    self.n_hedged += 1
+                log.info("Hedging slow request", hedge_delay_s=round(delay, 3))
+
+        winner, first_error, pending = None, None, set(attempts)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = future
+                    break
+                with self._lock:
+                    self.n_failed_attempts += 1
+                first_error = first_error or future.exception()
+        if winner is None:
+            raise first_error
+
+        for future, cancelled in attempts.items():
+            if future is not winner:
+                cancelled.set()
+                future.cancel()
+        result = winner.result()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._request_latencies.append(elapsed)
+            if winner is not primary:
+                self.n_hedge_wins += 1
+        if winner is not primary:
+            primary.add_done_callback(lambda f: self._record_saving(f, elapsed, start))
+        return result
+
+    def _record_saving(self, primary: Future, winner_elapsed: float, start: float) -> None:
+        if primary.cancelled() or primary.exception() is not None:
+            return
+        with self._lock:
+            self.latency_saved_s += max(0.0, (time.perf_counter() - start) - winner_elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = np.fromiter(self._request_latencies, dtype=np.float64)
+            n_requests = self.n_requests
+            stats = {
+                "n_requests": n_requests,
+                "n_hedged": self.n_hedged,
+                "n_hedge_wins": self.n_hedge_wins,
+                "n_skipped_no_headroom": self.n_skipped_no_headroom,
+                "n_failed_attempts": self.n_failed_attempts,
+                "hedge_rate": self.n_hedged / n_requests if n_requests else 0.0,
+                "hedge_win_rate": self.n_hedge_wins / self.n_hedged if self.n_hedged else 0.0,
+                "latency_saved_s": self.latency_saved_s,
+            }
+        stats["latency_p50_s"] = float(np.quantile(latencies, 0.5)) if latencies.size else float("nan")
+        stats["latency_p95_s"] = float(np.quantile(latencies, 0.95)) if latencies.size else float("nan")
+        stats["hedge_delay_s"] = self.hedge_delay_s()
+        return stats
+
+    def format_summary(self) -> str:
+        s = self.stats()
+        return (
+            f"{s['n_requests']} requests, {s['n_hedged']} hedged ({s['hedge_rate']:.1%} extra requests), "
+            f"{s['n_hedge_wins']} hedge wins, {s['latency_saved_s']:.1f}s saved, "
+            f"p50 {s['latency_p50_s']:.2f}s / p95 {s['latency_p95_s']:.2f}s"
+        )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+def request_cache_key(payload: dict, *, endpoint: str = "") -> str:
+    """
+    Stable hash identifying an LLM request.
+
+    The payload is serialized canonically (sorted keys, no whitespace) so that two
+    requests with the same model, messages and params always map to the same key,
+    regardless of dict insertion order. Use this key anywhere requests need to be
+    matched up (single-flight dedup, response caching, etc.).
+
+    Parameters:
+      - payload (dict): The JSON-serializable request body.
+      - endpoint (str): Optional endpoint/provider id, so identical bodies sent to
+        different APIs don't collide.
+
+    Returns:
+      - str: hex sha256 digest.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{endpoint}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "n_waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.n_waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+
+    - The first caller for a key (the "leader") runs fn().
+    - Callers arriving with the same key while the leader is in flight block and
+      receive the leader's result (or re-raise the leader's exception).
+    - Once the leader finishes, the key is forgotten; later calls run fn() again.
+      (This is dedup of in-flight work, not a cache.)
+    """
+
+    __slots__ = ("_lock", "_calls", "n_calls", "n_shared")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.n_calls = 0   # number of times fn() actually ran
+        self.n_shared = 0  # number of callers that got a result without running fn()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.n_waiters += 1
+                self.n_shared += 1
+                is_leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.n_calls += 1
+                is_leader = True
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
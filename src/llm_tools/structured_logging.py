@@ -0,0 +1,188 @@
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+DISABLED = 100
+
+_LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_LEVELS_BY_NAME = {name: level for level, name in _LEVEL_NAMES.items()}
+
+
+@dataclass(frozen=True)
+class LogConfig:
+    """
+    Logging settings, read once per process (see load_log_config).
+
+    .env variables:
+      - cout_log ("True"/"False"): console logging on/off. When off, WARNING and above still print
+        (the old force=True messages).
+      - cout_log_level ("DEBUG"/"INFO"/"WARNING"/"ERROR"): minimum level for console and JSONL. Default INFO.
+      - cout_log_jsonl (path): optional JSONL sink; every record at or above the level is appended in full.
+    """
+    console_enabled: bool = True
+    level: int = INFO
+    jsonl_path: Optional[str] = None
+    max_console_field_chars: int = 1000
+
+    @property
+    def console_level(self) -> int:
+        return self.level if self.console_enabled else max(self.level, WARNING)
+
+    @property
+    def jsonl_level(self) -> int:
+        return self.level if self.jsonl_path else DISABLED
+
+
+_config: Optional[LogConfig] = None
+_config_lock = threading.Lock()
+_loggers: Dict[str, "StructuredLogger"] = {}
+_jsonl_file = None
+
+
+def _parse_bool_env(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    if value.lower() not in ("true", "false"):
+        raise ValueError(f"Please set environment variable with id \"{name}\" to \"True\" or \"False\"")
+    return value.lower() == "true"
+
+
+def load_log_config() -> LogConfig:
+    """Read logging settings from the environment/.env (only on first call; cached afterwards)."""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                load_dotenv()
+                level_name = (os.getenv("cout_log_level") or "INFO").upper()
+                if level_name not in _LEVELS_BY_NAME:
+                    raise ValueError(f"cout_log_level must be one of {list(_LEVELS_BY_NAME)}, got {level_name!r}")
+                _config = LogConfig(
+                    console_enabled=_parse_bool_env("cout_log", True),
+                    level=_LEVELS_BY_NAME[level_name],
+                    jsonl_path=os.getenv("cout_log_jsonl") or None,
+                )
+    return _config
+
+
+def configure(config: LogConfig) -> None:
+    """Override the logging config at runtime (e.g. from a script), updating existing loggers."""
+    global _config, _jsonl_file
+    with _config_lock:
+        _config = config
+        if _jsonl_file is not None:
+            _jsonl_file.close()
+            _jsonl_file = None
+    for logger in _loggers.values():
+        logger._apply_config(config)
+
+
+def _write_jsonl(record: dict) -> None:
+    global _jsonl_file
+    with _config_lock:
+        if _jsonl_file is None:
+            path = _config.jsonl_path
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            _jsonl_file = open(path, "a", encoding="utf-8", buffering=1)  # line-buffered
+        _jsonl_file.write(json.dumps(record, default=str) + "\n")
+
+
+def _truncate(value, limit: int) -> str:
+    s = str(value)
+    if len(s) <= limit:
+        return s
+    return f"{s[:limit]}... (output truncated)"
+
+
+class StructuredLogger:
+    """
+    Leveled logger with explicit structured fields.
+
+    - log.info("msg %s", arg, key=value, ...) - msg is only %-formatted if the level is enabled,
+      and fields are only serialized if a sink will receive them.
+    - A disabled level costs one attribute lookup and an int comparison. Guard expensive
+      argument construction with `if log.debug_enabled:`.
+    - Console output: "[LEVEL] name: msg" followed by one indented "key: value" line per field
+      (values truncated to max_console_field_chars). JSONL output: full values.
+    """
+
+    __slots__ = ("name", "_min_level", "_console_level", "_jsonl_level", "_max_field_chars", "debug_enabled")
+
+    def __init__(self, name: str, config: LogConfig):
+        self.name = name
+        self._apply_config(config)
+
+    def _apply_config(self, config: LogConfig) -> None:
+        self._console_level = config.console_level
+        self._jsonl_level = config.jsonl_level
+        self._min_level = min(self._console_level, self._jsonl_level)
+        self._max_field_chars = config.max_console_field_chars
+        self.debug_enabled = self._min_level <= DEBUG
+
+    def is_enabled_for(self, level: int) -> bool:
+        return level >= self._min_level
+
+    def log(self, level: int, msg: str, *args, **fields) -> None:
+        if level < self._min_level:
+            return
+        self._emit(level, msg, args, fields)
+
+    def debug(self, msg: str, *args, **fields) -> None:
+        if DEBUG < self._min_level:
+            return
+        self._emit(DEBUG, msg, args, fields)
+
+    def info(self, msg: str, *args, **fields) -> None:
+        if INFO < self._min_level:
+            return
+        self._emit(INFO, msg, args, fields)
+
+    def warning(self, msg: str, *args, **fields) -> None:
+        if WARNING < self._min_level:
+            return
+        self._emit(WARNING, msg, args, fields)
+
+    def error(self, msg: str, *args, **fields) -> None:
+        if ERROR < self._min_level:
+            return
+        self._emit(ERROR, msg, args, fields)
+
+    def _emit(self, level: int, msg: str, args: tuple, fields: dict) -> None:
+        text = msg % args if args else msg
+
+        if level >= self._console_level:
+            lines = [f"[{_LEVEL_NAMES.get(level, level)}] {self.name}: {text}"]
+            limit = self._max_field_chars
+            for key, value in fields.items():
+                lines.append(f"   {key}: {_truncate(value, limit)}")
+            print("\n".join(lines), file=sys.stderr if level >= WARNING else sys.stdout)
+
+        if level >= self._jsonl_level:
+            record = {
+                "ts_ns": time.time_ns(),
+                "level": _LEVEL_NAMES.get(level, level),
+                "logger": self.name,
+                "msg": text,
+            }
+            record.update(fields)
+            _write_jsonl(record)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Get (or create) the logger for `name`. Config is loaded on first use only."""
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = StructuredLogger(name, load_log_config())
+        _loggers[name] = logger
+    return logger
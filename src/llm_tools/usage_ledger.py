@@ -0,0 +1,224 @@
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.general_file_utils.utils.json import load_json_from_path
+from src.llm_tools.structured_logging import get_logger
+
+log = get_logger("usage_ledger")
+
+MODEL_PRICES_PATH = "src/ml_scam_classification/settings/model_prices.json"
+_SNAPSHOT_SUFFIX_RE = re.compile(r"-\d{4}-\d{2}-\d{2}$")
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised when a run's token or dollar ceiling has been reached. Runs catch this to stop cleanly."""
+
+
+def load_model_prices(path: str = MODEL_PRICES_PATH) -> Dict[str, dict]:
+    """Model id -> {"input", "cached_input", "output"} prices in USD per 1M tokens."""
+    return load_json_from_path(path)["usd_per_1m_tokens"]
+
+
+def _lookup_price(prices: Dict[str, dict], model: str) -> dict:
+    if model in prices:
+        return prices[model]
+    # dated snapshots (e.g. "gpt-4o-2024-08-06") fall back to their base id. Nothing else does: a prefix
+    # match would price e.g. gpt-5-nano as gpt-5 or gpt-4o-realtime-preview as gpt-4o
+    base = _SNAPSHOT_SUFFIX_RE.sub("", model)
+    if base == model or base not in prices:
+        raise KeyError(f"No price configured for model {model!r} in {MODEL_PRICES_PATH}")
+    return prices[base]
+
+
+@dataclass
+class UsageRecord:
+    timestamp_ns: int
+    model: str
+    prompt_tokens: int
+    cached_tokens: int
+    completion_tokens: int
+    cost_usd: float
+    transcript_id: Optional[str] = None
+    source: Optional[str] = None
+    prompt_version: Optional[str] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class UsageLedger:
+    """
+    Records token usage per LLM request, prices it, and enforces a per-run budget.
+
+    - record_openai_usage / record_gemini_usage: add one request's usage (as returned by the API).
+    - ensure_within_budget(model): raises BudgetExceeded once max_cost_usd or max_total_tokens is hit,
+      and KeyError if model has no configured price. Call it before each request so the run
+      stops before spending more (and never fails after a paid response arrives).
+    - A response for an unpriced model is still recorded, with cost_usd NaN and a warning.
+    - ledger_path: optional .jsonl file, one line appended per request.
+    - summary_by(...): aggregate tokens/cost by transcript_id, source and/or prompt_version.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_cost_usd: Optional[float] = None,
+        max_total_tokens: Optional[int] = None,
+        ledger_path: Optional[str] = None,
+        prices: Optional[Dict[str, dict]] = None,
+    ):
+        if max_cost_usd is not None and not (isinstance(max_cost_usd, (int, float)) and max_cost_usd > 0):
+            raise ValueError("max_cost_usd must be a positive number or None")
+        if max_total_tokens is not None and not (isinstance(max_total_tokens, int) and max_total_tokens > 0):
+            raise ValueError("max_total_tokens must be a positive int or None")
+        if ledger_path is not None and not ledger_path.endswith(".jsonl"):
+            raise ValueError("ledger_path must be a .jsonl file")
+
+        self.max_cost_usd = max_cost_usd
+        self.max_total_tokens = max_total_tokens
+        self.ledger_path = ledger_path
+        self.prices = prices if prices is not None else load_model_prices()
+
+        self.records: List[UsageRecord] = []
+        self.total_cost_usd = 0.0
+        self.total_tokens = 0
+        self._lock = threading.Lock()
+
+        if ledger_path is not None:
+            os.makedirs(os.path.dirname(ledger_path) or ".", exist_ok=True)
+
+    # -- Recording --
+
+    def price(self, model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+        p = _lookup_price(self.prices, model)
+        uncached = max(prompt_tokens - cached_tokens, 0)
+        return (uncached * p["input"] + cached_tokens * p["cached_input"] + completion_tokens * p["output"]) / 1e6
+
+    def _price_or_nan(self, model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+        # the response is already paid for: losing it to a missing price would be worse than a NaN cost
+        try:
+            return self.price(model, prompt_tokens, cached_tokens, completion_tokens)
+        except KeyError as e:
+            log.warning("Recording usage without a cost", model=model, reason=str(e))
+            return float("nan")
+
+    def record(
+        self,
+        model: str,
+        *,
+        prompt_tokens: int,
+        cached_tokens: int = 0,
+        completion_tokens: int,
+        transcript_id=None,
+        source: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+    ) -> UsageRecord:
+        rec = UsageRecord(
+            timestamp_ns=time.time_ns(),
+            model=model,
+            prompt_tokens=int(prompt_tokens),
+            cached_tokens=int(cached_tokens),
+            completion_tokens=int(completion_tokens),
+            cost_usd=self._price_or_nan(model, prompt_tokens, cached_tokens, completion_tokens),
+            transcript_id=None if transcript_id is None else str(transcript_id),
+            source=source,
+            prompt_version=prompt_version,
+        )
+        with self._lock:
+            self.records.append(rec)
+            if rec.cost_usd == rec.cost_usd:  # not NaN (unpriced model)
+                self.total_cost_usd += rec.cost_usd
+            self.total_tokens += rec.total_tokens
+            if self.ledger_path is not None:
+                with open(self.ledger_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(rec)) + "\n")
+        return rec
+
+    def record_openai_usage(self, model: str, usage: Optional[dict], **tags) -> Optional[UsageRecord]:
+        """Record the "usage" object of a Chat Completions response (no-op if missing)."""
+        if not usage:
+            return None
+        details = usage.get("prompt_tokens_details") or {}
+        return self.record(
+            model,
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            cached_tokens=details.get("cached_tokens", 0) or 0,
+            completion_tokens=usage.get("completion_tokens", 0),
+            **tags,
+        )
+
+    def record_gemini_usage(self, model: str, usage_metadata, **tags) -> Optional[UsageRecord]:
+        """Record a google-genai response.usage_metadata (thinking tokens are billed as output)."""
+        if usage_metadata is None:
+            return None
+        return self.record(
+            model,
+            prompt_tokens=getattr(usage_metadata, "prompt_token_count", 0) or 0,
+            cached_tokens=getattr(usage_metadata, "cached_content_token_count", 0) or 0,
+            completion_tokens=(getattr(usage_metadata, "candidates_token_count", 0) or 0)
+                              + (getattr(usage_metadata, "thoughts_token_count", 0) or 0),
+            **tags,
+        )
+
+    # -- Budget --
+
+    def budget_exceeded(self) -> bool:
+        if self.max_cost_usd is not None and self.total_cost_usd >= self.max_cost_usd:
+            return True
+        if self.max_total_tokens is not None and self.total_tokens >= self.max_total_tokens:
+            return True
+        return False
+
+    def ensure_within_budget(self, model: Optional[str] = None) -> None:
+        if model is not None:
+            _lookup_price(self.prices, model)  # KeyError before the request is sent, not after
+        if self.budget_exceeded():
+            raise BudgetExceeded(
+                f"Run budget reached: ${self.total_cost_usd:.4f} spent (limit: {self.max_cost_usd}), "
+                f"{self.total_tokens} tokens used (limit: {self.max_total_tokens})"
+            )
+
+    # -- Reporting --
+
+    def to_df(self) -> pd.DataFrame:
+        df = pd.DataFrame([asdict(r) for r in self.records])
+        if not df.empty:
+            df["total_tokens"] = df["prompt_tokens"] + df["completion_tokens"]
+        return df
+
+    def summary_by(self, *keys: str) -> pd.DataFrame:
+        """
+        Aggregate usage by any of "transcript_id", "source", "prompt_version", "model".
+        Includes n_requests and, when grouping by more than transcripts, tokens_per_transcript.
+        """
+        df = self.to_df()
+        if df.empty:
+            return df
+        keys = list(keys) or ["model"]
+        grouped = df.groupby(keys, dropna=False)
+        out = grouped[["prompt_tokens", "cached_tokens", "completion_tokens", "total_tokens", "cost_usd"]].sum()
+        out["n_requests"] = grouped.size()
+        if "transcript_id" not in keys:
+            n_transcripts = grouped["transcript_id"].nunique()
+            out["tokens_per_transcript"] = out["total_tokens"] / n_transcripts.where(n_transcripts > 0)
+        return out.reset_index()
+
+    def tokens_per_transcript(self) -> float:
+        df = self.to_df()
+        if df.empty or df["transcript_id"].nunique() == 0:
+            return 0.0
+        return float(df["total_tokens"].sum() / df["transcript_id"].nunique())
+
+    def format_summary(self) -> str:
+        return (
+            f"{len(self.records)} requests, {self.total_tokens} tokens, ${self.total_cost_usd:.4f} "
+            f"({self.tokens_per_transcript():.0f} tokens/transcript)"
+        )
@@ -0,0 +1,261 @@
+import json
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.data_processing.near_duplicates import normalize_transcript_text
+from src.ml_scam_classification.codebook.behavior_codebook import (
+    infer_behavior_codes,
+    line_jsons_to_label_matrix,
+)
+
+SPEAKERS = ("Caller", "Receiver")
+
+
+def hashed_char_ngram_vector(
+    text: str,
+    *,
+    n_features: int = 2048,
+    ngram_range: Tuple[int, int] = (2, 4),
+) -> np.ndarray:
+    """
+    L2-normalized, log-scaled counts of hashed character n-grams (float32[n_features]).
+
+    Each n-gram size is hashed in one vectorized pass (sliding windows dotted with fixed
+    powers, uint64 wrap-around), then bucketed with np.bincount.
+    """
+    norm = f" {normalize_transcript_text(text)} "
+    codes = np.frombuffer(norm.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    counts = np.zeros(n_features, dtype=np.float32)
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        if codes.size < n:
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(codes, n)
+        powers = np.uint64(1_000_003) ** np.arange(n, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            hashes = (windows * powers).sum(axis=1, dtype=np.uint64) + np.uint64(n) * np.uint64(0x9E3779B97F4A7C15)
+            hashes ^= hashes >> np.uint64(29)
+        counts += np.bincount((hashes % np.uint64(n_features)).astype(np.int64), minlength=n_features)
+    np.log1p(counts, out=counts)
+    norm_l2 = np.linalg.norm(counts)
+    if norm_l2 > 0:
+        counts /= norm_l2
+    return counts
+
+
+class LinePrelabeler:
+    """
+    Nearest-neighbour behavior pre-labeler for single transcript lines.
+
+    - Trained on lines the LLM already labeled: each line is a hashed char n-gram vector,
+      and its labels a bool vector over `codes`.
+    - predict() finds the k most cosine-similar labeled lines from the same speaker and
+      takes their similarity-weighted label vote. A line is "confident" when its nearest
+      neighbour is at least `min_similarity` and every label's vote agrees at least
+      `min_agreement` (1.0 = neighbours unanimous on all labels).
+    - Only non-confident lines need to go to the LLM; their labels are then fed back
+      with partial_fit(), so the model keeps improving as labels accumulate.
+    """
+
+    def __init__(
+        self,
+        codes: Sequence[str],
+        *,
+        n_features: int = 2048,
+        ngram_range: Tuple[int, int] = (2, 4),
+        k: int = 5,
+        min_similarity: float = 0.9,
+        min_agreement: float = 1.0,
+    ):
+        if not codes:
+            raise ValueError("codes must be a non-empty list of behavior codes")
+        if not (isinstance(k, int) and k >= 1):
+            raise ValueError("k must be an int >= 1")
+        if not (0.0 < min_similarity <= 1.0):
+            raise ValueError("min_similarity must be in (0, 1]")
+        if not (0.0 <= min_agreement <= 1.0):
+            raise ValueError("min_agreement must be in [0, 1]")
+
+        self.codes = list(codes)
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.k = k
+        self.min_similarity = min_similarity
+        self.min_agreement = min_agreement
+
+        # Grown geometrically by partial_fit; only the first self._n rows are valid
+        self._X = np.zeros((0, n_features), dtype=np.float32)
+        self._Y = np.zeros((0, len(self.codes)), dtype=bool)
+        self._speaker = np.zeros(0, dtype=np.int8)
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    # -- Features --
+
+    def vectorize(self, texts: Sequence[str]) -> np.ndarray:
+        X = np.empty((len(texts), self.n_features), dtype=np.float32)
+        for i, text in enumerate(texts):
+            X[i] = hashed_char_ngram_vector(text, n_features=self.n_features, ngram_range=self.ngram_range)
+        return X
+
+    @staticmethod
+    def _speaker_ids(speakers: Sequence[str]) -> np.ndarray:
+        return np.array([SPEAKERS.index(s) if s in SPEAKERS else -1 for s in speakers], dtype=np.int8)
+
+    # -- Training --
+
+    def _reserve(self, n_new: int) -> None:
+        needed = self._n + n_new
+        if needed <= self._X.shape[0]:
+            return
+        capacity = max(needed, 2 * self._X.shape[0], 256)
+        X = np.zeros((capacity, self.n_features), dtype=np.float32)
+        Y = np.zeros((capacity, len(self.codes)), dtype=bool)
+        speaker = np.zeros(capacity, dtype=np.int8)
+        X[:self._n], Y[:self._n], speaker[:self._n] = self._X[:self._n], self._Y[:self._n], self._speaker[:self._n]
+        self._X, self._Y, self._speaker = X, Y, speaker
+
+    def partial_fit(self, texts: Sequence[str], speakers: Sequence[str], labels: np.ndarray) -> "LinePrelabeler":
+        """Add newly labeled lines. labels: (n_lines, n_codes) bool matrix in self.codes order."""
+        labels = np.asarray(labels, dtype=bool)
+        if labels.shape != (len(texts), len(self.codes)):
+            raise ValueError(f"labels must have shape ({len(texts)}, {len(self.codes)}), got {labels.shape}")
+        if len(speakers) != len(texts):
+            raise ValueError("texts and speakers must have the same length")
+        n_new = len(texts)
+        self._reserve(n_new)
+        sl = slice(self._n, self._n + n_new)
+        self._X[sl] = self.vectorize(texts)
+        self._Y[sl] = labels
+        self._speaker[sl] = self._speaker_ids(speakers)
+        self._n += n_new
+        return self
+
+    def partial_fit_line_jsons(self, line_objs: Sequence[dict]) -> "LinePrelabeler":
+        """Add LLM-labeled line jsons ({"transcript_segment", "speaker", "behaviors_exhibited"})."""
+        line_objs = [o for o in line_objs if o.get("transcript_segment") is not None]
+        if not line_objs:
+            return self
+        return self.partial_fit(
+            [o["transcript_segment"] for o in line_objs],
+            [o.get("speaker", "") for o in line_objs],
+            line_jsons_to_label_matrix(line_objs, self.codes),
+        )
+
+    # -- Inference --
+
+    def predict(
+        self,
+        texts: Sequence[str],
+        speakers: Sequence[str],
+        *,
+        chunk_size: int = 512,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (labels bool[n, n_codes], confident bool[n], top_similarity float32[n]).
+        With no training data, nothing is confident.
+        """
+        n = len(texts)
+        labels = np.zeros((n, len(self.codes)), dtype=bool)
+        confident = np.zeros(n, dtype=bool)
+        top_sim = np.zeros(n, dtype=np.float32)
+        if self._n == 0 or n == 0:
+            return labels, confident, top_sim
+
+        X_train = self._X[:self._n]
+        Y_train = self._Y[:self._n].astype(np.float32)
+        speaker_train = self._speaker[:self._n]
+        k = min(self.k, self._n)
+
+        Xq = self.vectorize(texts)
+        speaker_q = self._speaker_ids(speakers)
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            sims = Xq[start:stop] @ X_train.T
+            # lines from the other speaker can never be neighbours
+            sims[speaker_q[start:stop, None] != speaker_train[None, :]] = -1.0
+
+            nn_idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            nn_sims = np.take_along_axis(sims, nn_idx, axis=1)
+            weights = np.clip(nn_sims, 0.0, None)
+            weight_sums = weights.sum(axis=1, keepdims=True)
+            weight_sums[weight_sums == 0] = 1.0
+
+            votes = np.einsum("qk,qkl->ql", weights, Y_train[nn_idx]) / weight_sums
+            agreement = np.abs(votes - 0.5) * 2.0
+
+            labels[start:stop] = votes >= 0.5
+            top_sim[start:stop] = nn_sims.max(axis=1)
+            confident[start:stop] = (top_sim[start:stop] >= self.min_similarity) & (
+                agreement.min(axis=1) >= self.min_agreement
+            )
+        return labels, confident, top_sim
+
+    # -- Persistence --
+
+    def save(self, path: str) -> None:
+        if not path.endswith(".npz"):
+            raise ValueError("LinePrelabeler path must be a .npz file")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        config = {
+            "codes": self.codes,
+            "n_features": self.n_features,
+            "ngram_range": list(self.ngram_range),
+            "k": self.k,
+            "min_similarity": self.min_similarity,
+            "min_agreement": self.min_agreement,
+        }
+        np.savez_compressed(
+            path,
+            X=self._X[:self._n].astype(np.float16),
+            Y=np.packbits(self._Y[:self._n], axis=1),
+            speaker=self._speaker[:self._n],
+            config=np.array(json.dumps(config)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LinePrelabeler":
+        with np.load(path) as data:
+            config = json.loads(str(data["config"]))
+            model = cls(
+                config["codes"],
+                n_features=config["n_features"],
+                ngram_range=tuple(config["ngram_range"]),
+                k=config["k"],
+                min_similarity=config["min_similarity"],
+                min_agreement=config["min_agreement"],
+            )
+            n = data["X"].shape[0]
+            model._X = data["X"].astype(np.float32)
+            model._Y = np.unpackbits(data["Y"], axis=1, count=len(model.codes)).astype(bool)
+            model._speaker = data["speaker"]
+            model._n = n
+        return model
+
+    @classmethod
+    def from_line_jsons(cls, line_objs: Sequence[dict], codes: Optional[Sequence[str]] = None, **kwargs) -> "LinePrelabeler":
+        """Build from already labeled line jsons (codes inferred from the data if not given)."""
+        line_objs = list(line_objs)
+        codes = list(codes) if codes is not None else infer_behavior_codes(line_objs)
+        return cls(codes, **kwargs).partial_fit_line_jsons(line_objs)
+
+
+def load_labeled_line_jsons(paths: Sequence[str]) -> List[dict]:
+    """Read LLM output files (json list of per-line objects, or jsonl of lists/objects) into one list of line objects."""
+    line_objs: List[dict] = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        if not content:
+            continue
+        try:
+            chunks = [json.loads(content)]
+        except json.JSONDecodeError:
+            chunks = [json.loads(line) for line in content.splitlines() if line.strip()]
+        for chunk in chunks:
+            items = chunk if isinstance(chunk, list) else [chunk]
+            line_objs.extend(o for o in items if isinstance(o, dict) and "behaviors_exhibited" in o)
+    return line_objs
@@ -0,0 +1,252 @@
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.rate_limits.models.rate_limiter import RateLimiter
+from src.llm_tools.chatgpt_utils import start_conversation, get_response_from_chatgpt_conversation
+from src.llm_tools.chatgpt_feature_extraction import build_line_tagging_prompt
+from src.llm_tools.cleaned_transcripts import VALID_SPEAKERS
+from src.llm_tools.llm_utils import get_json_from_llm_response
+from src.llm_tools.structured_logging import get_logger
+from src.llm_tools.usage_ledger import UsageLedger
+from src.ml_scam_classification.codebook.behavior_codebook import (
+    label_vector_to_behaviors_exhibited,
+    line_json_to_label_vector,
+)
+from src.ml_scam_classification.classification.line_prelabeler import LinePrelabeler
+from src.ml_scam_classification.classification.scam_classifier import ScamClassifier
+
+log = get_logger("live_call_scorer")
+
+LABELED_LOCAL = "local"
+LABELED_LLM = "llm"
+LABELED_LOCAL_PROVISIONAL = "local_provisional"  # LLM escalation still in flight; corrected by poll()
+
+
+@dataclass(frozen=True)
+class LiveScore:
+    line_no: int
+    speaker: str
+    p_scam: float
+    labeled_by: str
+    latency_s: float
+    n_pending_escalations: int
+
+
+class LiveCallScorer:
+    """
+    Incremental scam scoring for a call in progress.
+
+    Feed utterances with add_utterance() as they are transcribed. Each line is labeled by the
+    local pre-labeler when it is confident; otherwise it is escalated to the LLM (same line
+    schema and prompt as two-phase tagging, with the lines so far as context). The per-call
+    feature vector is kept as running per-code sums, so each utterance costs O(n_codes) on
+    top of its labeling, independent of how long the call already is.
+
+    Latency budget: an escalation is only started if `rl` can grant a permit within the
+    budget, and add_utterance() waits for the LLM at most until the budget is spent. Past
+    that, the line's local labels are used provisionally and replaced once the LLM answers
+    (see poll()), again as an O(n_codes) adjustment of the running sums.
+    """
+
+    def __init__(
+        self,
+        classifier: ScamClassifier,
+        *,
+        rl: Optional[RateLimiter] = None,
+        prelabeler: Optional[LinePrelabeler] = None,
+        model: Optional[str] = None,
+        tagging_instructions: Optional[str] = None,
+        role: Optional[str] = None,
+        latency_budget_s: float = 2.0,
+        max_concurrent_escalations: int = 2,
+        ledger: Optional[UsageLedger] = None,
+        usage_tags: Optional[dict] = None,
+    ):
+        if prelabeler is not None and prelabeler.codes != classifier.codes:
+            raise ValueError("prelabeler and classifier must be trained on the same behavior codes (in the same order)")
+        escalation_args = (rl, model, tagging_instructions)
+        if any(a is not None for a in escalation_args) and any(a is None for a in escalation_args):
+            raise ValueError("LLM escalation needs all of rl, model and tagging_instructions (or none of them)")
+        if latency_budget_s <= 0:
+            raise ValueError("latency_budget_s must be > 0")
+
+        self.classifier = classifier
+        self.codes = classifier.codes
+        self.prelabeler = prelabeler
+        self.rl = rl
+        self.model = model
+        self.tagging_instructions = tagging_instructions
+        self.role = role
+        self.latency_budget_s = latency_budget_s
+        self.ledger = ledger
+        self.usage_tags = usage_tags
+
+        n_codes = len(self.codes)
+        self._counts = np.zeros(n_codes, dtype=np.int32)
+        self._caller_counts = np.zeros(n_codes, dtype=np.int32)
+        self._receiver_counts = np.zeros(n_codes, dtype=np.int32)
+        self._n_caller = 0
+        self._lines: List[dict] = []         # {"line_no", "speaker", "text"} as in cleaned transcripts
+        self._labels: List[np.ndarray] = []  # current label vector per line
+        self._labeled_by: List[str] = []
+        self._pending: Dict[int, Future] = {}
+        self._executor = (
+            ThreadPoolExecutor(max_workers=max_concurrent_escalations) if rl is not None else None
+        )
+
+    @property
+    def escalation_enabled(self) -> bool:
+        return self._executor is not None
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    # -- Running features --
+
+    def _apply(self, line_idx: int, labels: np.ndarray, sign: int) -> None:
+        delta = sign * labels.astype(np.int32)
+        self._counts += delta
+        if self._lines[line_idx]["speaker"] == "Caller":
+            self._caller_counts += delta
+        else:
+            self._receiver_counts += delta
+
+    def feature_vector(self) -> np.ndarray:
+        """Same features as call_feature_vector() over the lines so far, from the running sums."""
+        n_codes = len(self.codes)
+        vec = np.zeros(4 * n_codes + 2, dtype=np.float32)
+        n_lines = len(self._lines)
+        if n_lines == 0:
+            return vec
+        n_receiver = n_lines - self._n_caller
+        vec[:n_codes] = self._counts > 0
+        vec[n_codes:2 * n_codes] = self._counts / n_lines
+        if self._n_caller:
+            vec[2 * n_codes:3 * n_codes] = self._caller_counts / self._n_caller
+        if n_receiver:
+            vec[3 * n_codes:4 * n_codes] = self._receiver_counts / n_receiver
+        vec[-2] = np.log1p(n_lines)
+        vec[-1] = self._n_caller / n_lines
+        return vec
+
+    def p_scam(self) -> float:
+        return float(self.classifier.predict_proba(self.feature_vector())[0])
+
+    # -- LLM escalation --
+
+    def _tag_with_llm(self, line_no: int, lines_so_far: List[dict]) -> np.ndarray:
+        conversation = start_conversation(
+            progress_message=f"Live call, Transcript Line {line_no}",
+            prompt=build_line_tagging_prompt(self.tagging_instructions, lines_so_far, line_no),
+            rl=self.rl,
+            system_instructions=self.role,
+            model=self.model,
+            ledger=self.ledger,
+            usage_tags=self.usage_tags,
+        )
+        line_json = get_json_from_llm_response(get_response_from_chatgpt_conversation(conversation))
+        if line_json is None:
+            raise ValueError(f"Critical Error: JSON not parsed correctly for live call line {line_no}.")
+        return line_json_to_label_vector(json.loads(line_json), self.codes)
+
+    def _resolve(self, line_idx: int, future: Future) -> None:
+        try:
+            llm_labels = future.result()
+        except Exception as e:
+            log.warning("LLM escalation failed, keeping local labels", line_no=line_idx + 1, error=repr(e))
+            self._labeled_by[line_idx] = LABELED_LOCAL
+            return
+        self._apply(line_idx, self._labels[line_idx], -1)
+        self._apply(line_idx, llm_labels, +1)
+        self._labels[line_idx] = llm_labels
+        self._labeled_by[line_idx] = LABELED_LLM
+        if self.prelabeler is not None:
+            line = self._lines[line_idx]
+            self.prelabeler.partial_fit([line["text"]], [line["speaker"]], llm_labels[None, :])
+
+    def poll(self) -> float:
+        """Fold in any escalations that have finished since the last call. Returns the current p_scam."""
+        for line_idx, future in list(self._pending.items()):
+            if future.done():
+                del self._pending[line_idx]
+                self._resolve(line_idx, future)
+        return self.p_scam()
+
+    # -- Streaming API --
+
+    def add_utterance(self, text: str, speaker: str) -> LiveScore:
+        """Label one new utterance, update the running features and return the rolling score."""
+        start = time.perf_counter()
+        if speaker not in VALID_SPEAKERS:
+            raise ValueError(f"speaker must be one of {VALID_SPEAKERS}, got {speaker!r}")
+        self.poll()
+
+        line_idx = len(self._lines)
+        line = {"line_no": line_idx + 1, "speaker": speaker, "text": str(text)}
+        self._lines.append(line)
+        if speaker == "Caller":
+            self._n_caller += 1
+
+        labels = np.zeros(len(self.codes), dtype=bool)
+        confident = False
+        if self.prelabeler is not None:
+            pred, conf, _ = self.prelabeler.predict([line["text"]], [speaker])
+            labels, confident = pred[0], bool(conf[0])
+
+        labeled_by = LABELED_LOCAL
+        if (
+            not confident
+            and self.escalation_enabled
+            and self.rl.seconds_until_available() < self.latency_budget_s - (time.perf_counter() - start)
+        ):
+            future = self._executor.submit(self._tag_with_llm, line["line_no"], list(self._lines))
+            try:
+                labels = future.result(timeout=max(0.0, self.latency_budget_s - (time.perf_counter() - start)))
+                labeled_by = LABELED_LLM
+                if self.prelabeler is not None:
+                    self.prelabeler.partial_fit([line["text"]], [speaker], labels[None, :])
+            except FutureTimeoutError:
+                self._pending[line_idx] = future
+                labeled_by = LABELED_LOCAL_PROVISIONAL
+            except Exception as e:
+                log.warning("LLM escalation failed, using local labels", line_no=line["line_no"], error=repr(e))
+
+        self._labels.append(labels)
+        self._labeled_by.append(labeled_by)
+        self._apply(line_idx, labels, +1)
+
+        return LiveScore(
+            line_no=line["line_no"],
+            speaker=speaker,
+            p_scam=self.p_scam(),
+            labeled_by=labeled_by,
+            latency_s=time.perf_counter() - start,
+            n_pending_escalations=len(self._pending),
+        )
+
+    def finish(self) -> float:
+        """Wait for outstanding escalations, fold them in and return the final p_scam."""
+        for line_idx, future in list(self._pending.items()):
+            del self._pending[line_idx]
+            self._resolve(line_idx, future)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        return self.p_scam()
+
+    def line_jsons(self) -> List[dict]:
+        """The call so far in the per-line behavior json schema (current labels)."""
+        return [
+            {
+                "transcript_segment": line["text"],
+                "speaker": line["speaker"],
+                "behaviors_exhibited": label_vector_to_behaviors_exhibited(
+                    labels, self.codes, analysis=f"Labeled by: {labeled_by}."
+                ),
+            }
+            for line, labels, labeled_by in zip(self._lines, self._labels, self._labeled_by)
+        ]
@@ -0,0 +1,342 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.ml_scam_classification.codebook.behavior_codebook import line_jsons_to_label_matrix
+from src.ml_scam_classification.evaluation.label_metrics import (
+    bootstrap_label_metrics,
+    bootstrap_statistic,
+    summary_metrics,
+)
+from src.ml_scam_classification.features.call_aggregates import aggregate_line_jsons
+
+SCAM_LABEL_COL = "call_is_scam__onehot"
+
+_OUTPUT_INDEX_RE = re.compile(r"_(\d{5,})\.json$")
+
+
+# -- Per-call Feature Vectors --
+
+def call_feature_names(codes: Sequence[str]) -> List[str]:
+    names = []
+    for prefix in ("any", "rate", "caller_rate", "receiver_rate"):
+        names.extend(f"{prefix}__{code}" for code in codes)
+    names.extend(["log_n_lines", "caller_line_fraction"])
+    return names
+
+
+def call_feature_vector(line_objs: Sequence[dict], codes: Sequence[str]) -> np.ndarray:
+    """
+    Fixed-length float32 vector for one call from its per-line behavior jsons:
+    per code, whether it occurs at all, the fraction of lines exhibiting it, and the same
+    fraction over Caller and Receiver lines separately; then log(1 + n_lines) and the
+    fraction of lines spoken by the Caller. Length is 4 * len(codes) + 2.
+    """
+    n_codes = len(codes)
+    vec = np.zeros(4 * n_codes + 2, dtype=np.float32)
+    if not line_objs:
+        return vec
+    labels = line_jsons_to_label_matrix(line_objs, codes)
+    is_caller = np.array([o.get("speaker") == "Caller" for o in line_objs], dtype=bool)
+    n_lines = len(line_objs)
+    n_caller = int(is_caller.sum())
+    n_receiver = n_lines - n_caller
+
+    vec[:n_codes] = labels.any(axis=0)
+    vec[n_codes:2 * n_codes] = labels.mean(axis=0)
+    if n_caller:
+        vec[2 * n_codes:3 * n_codes] = labels[is_caller].mean(axis=0)
+    if n_receiver:
+        vec[3 * n_codes:4 * n_codes] = labels[~is_caller].mean(axis=0)
+    vec[-2] = np.log1p(n_lines)
+    vec[-1] = n_caller / n_lines
+    return vec
+
+
+def calls_to_feature_matrix(calls: Sequence[Sequence[dict]], codes: Sequence[str]) -> np.ndarray:
+    """(n_calls, n_features) float32 matrix, one row per call (same features as call_feature_vector)."""
+    return aggregate_line_jsons(calls, codes).classifier_features()
+
+
+def load_call_behavior_jsons(paths: Sequence[str]) -> Dict[int, List[dict]]:
+    """
+    Read per-call output files named like generate_output_filename() produces
+    ("<base>_<transcript index, zero-padded>.json") into {transcript_idx: [line objs]}.
+    """
+    calls = {}
+    for path in paths:
+        m = _OUTPUT_INDEX_RE.search(os.path.basename(path))
+        if m is None:
+            raise ValueError(f"Cannot read a transcript index from output filename: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            line_objs = json.load(f)
+        if not isinstance(line_objs, list):
+            raise ValueError(f"Expected a json list of per-line behavior objects in {path}")
+        calls[int(m.group(1))] = line_objs
+    return calls
+
+
+def _binary_labels(y: np.ndarray) -> np.ndarray:
+    """0/1 int8 labels; NaN (unlabeled calls) would silently cast to 0, so it is rejected."""
+    y = np.asarray(y)
+    if y.dtype.kind == "f" and np.isnan(y).any():
+        raise ValueError(f"{int(np.isnan(y).sum())} labels are NaN; drop unlabeled calls before training")
+    return y.astype(np.int8)
+
+
+# -- Metrics --
+
+def roc_auc(y_true: np.ndarray, scores: np.ndarray) -> float:
+    """Rank-based (Mann-Whitney) ROC AUC with tie handling. NaN if only one class is present."""
+    y_true = np.asarray(y_true, dtype=bool)
+    n_pos = int(y_true.sum())
+    n_neg = len(y_true) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return float("nan")
+    order = np.argsort(scores, kind="mergesort")
+    sorted_scores = scores[order]
+    ranks = np.empty(len(scores), dtype=np.float64)
+    # average ranks over ties
+    _, first_idx, counts = np.unique(sorted_scores, return_index=True, return_counts=True)
+    avg_ranks = first_idx + (counts + 1) / 2.0
+    ranks[order] = np.repeat(avg_ranks, counts)
+    return float((ranks[y_true].sum() - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg))
+
+
+def _log_loss(y: np.ndarray, p: np.ndarray) -> float:
+    p = np.clip(p, 1e-7, 1 - 1e-7)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+# -- Model --
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+
+def fit_logistic_regression(
+    X: np.ndarray,
+    y: np.ndarray,
+    *,
+    l2: float = 1.0,
+    max_iter: int = 50,
+    tol: float = 1e-6,
+) -> Tuple[np.ndarray, float]:
+    """
+    L2-regularized logistic regression by Newton's method (IRLS); the bias is not penalized.
+    X should already be standardized. Returns (weights, bias).
+    """
+    n, d = X.shape
+    Xb = np.hstack([X.astype(np.float64), np.ones((n, 1))])
+    y = y.astype(np.float64)
+    w = np.zeros(d + 1)
+    penalty = np.full(d + 1, l2)
+    penalty[-1] = 0.0
+    for _ in range(max_iter):
+        p = _sigmoid(Xb @ w)
+        grad = Xb.T @ (p - y) + penalty * w
+        hess = (Xb * (p * (1 - p))[:, None]).T @ Xb + np.diag(penalty + 1e-9)
+        step = np.linalg.solve(hess, grad)
+        w -= step
+        if np.max(np.abs(step)) < tol:
+            break
+    return w[:-1], float(w[-1])
+
+
+def stratified_folds(y: np.ndarray, n_folds: int, *, seed: int = 0) -> List[np.ndarray]:
+    """Test-index arrays for n_folds stratified folds."""
+    rng = np.random.default_rng(seed)
+    folds = [[] for _ in range(n_folds)]
+    for cls in np.unique(y):
+        idx = rng.permutation(np.flatnonzero(y == cls))
+        for k, chunk in enumerate(np.array_split(idx, n_folds)):
+            folds[k].extend(chunk.tolist())
+    return [np.sort(np.array(f, dtype=np.int64)) for f in folds]
+
+
+class ScamClassifier:
+    """
+    Logistic regression over per-call behavior feature vectors (see call_feature_vector).
+    Scoring a call is a dot product, so it takes well under a millisecond once the
+    per-line behavior jsons exist.
+    """
+
+    def __init__(
+        self,
+        codes: Sequence[str],
+        weights: np.ndarray,
+        bias: float,
+        mean: np.ndarray,
+        std: np.ndarray,
+        *,
+        threshold: float = 0.5,
+        l2: float = 1.0,
+        cv_metrics: Optional[dict] = None,
+    ):
+        self.codes = list(codes)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.std = np.asarray(std, dtype=np.float32)
+        self.threshold = threshold
+        self.l2 = l2
+        self.cv_metrics = cv_metrics or {}
+
+    @property
+    def feature_names(self) -> List[str]:
+        return call_feature_names(self.codes)
+
+    # -- Training --
+
+    @staticmethod
+    def _standardize_params(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        mean = X.mean(axis=0)
+        std = X.std(axis=0)
+        std[std == 0] = 1.0
+        return mean, std
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, codes: Sequence[str], *, l2: float = 1.0, **kwargs) -> "ScamClassifier":
+        X = np.asarray(X, dtype=np.float32)
+        y = _binary_labels(y)
+        if X.shape != (len(y), 4 * len(codes) + 2):
+            raise ValueError(f"X must have shape ({len(y)}, {4 * len(codes) + 2}), got {X.shape}")
+        if len(np.unique(y)) != 2:
+            raise ValueError("Training labels must contain both scam (1) and non-scam (0) calls")
+        mean, std = cls._standardize_params(X)
+        weights, bias = fit_logistic_regression((X - mean) / std, y, l2=l2)
+        return cls(codes, weights, bias, mean, std, l2=l2, **kwargs)
+
+    @classmethod
+    def cross_validate(
+        cls,
+        X: np.ndarray,
+        y: np.ndarray,
+        codes: Sequence[str],
+        *,
+        l2_grid: Sequence[float] = (0.1, 1.0, 10.0, 100.0),
+        n_folds: int = 5,
+        max_workers: Optional[int] = None,
+        seed: int = 0,
+        n_boot: int = 1000,
+    ) -> Tuple["ScamClassifier", dict]:
+        """
+        Stratified k-fold CV over l2_grid, with every (l2, fold) fit running concurrently
+        (NumPy releases the GIL in the linear algebra). Refits on all data with the l2 that
+        has the best mean out-of-fold AUC. Returns (model, cv_metrics).
+
+        With n_boot > 0, the best l2's out-of-fold AUC and scam-class F1 get 95% bootstrap
+        intervals (cv_metrics["best_ci"]).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        y = _binary_labels(y)
+        folds = stratified_folds(y, n_folds, seed=seed)
+
+        def _run(job: Tuple[float, int]) -> Tuple[float, int, np.ndarray]:
+            l2, k = job
+            test_idx = folds[k]
+            train_mask = np.ones(len(y), dtype=bool)
+            train_mask[test_idx] = False
+            model = cls.fit(X[train_mask], y[train_mask], codes, l2=l2)
+            return l2, k, model.predict_proba(X[test_idx])
+
+        jobs = [(l2, k) for l2 in l2_grid for k in range(n_folds)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_run, jobs))
+
+        per_l2, oof_by_l2 = {}, {}
+        for l2 in l2_grid:
+            oof = np.zeros(len(y), dtype=np.float64)
+            for res_l2, k, proba in results:
+                if res_l2 == l2:
+                    oof[folds[k]] = proba
+            label_metrics = summary_metrics(y[:, None], (oof >= 0.5)[:, None])
+            per_l2[l2] = {
+                "l2": l2,
+                "auc": roc_auc(y, oof),
+                "accuracy": label_metrics["accuracy"],
+                "precision": label_metrics["micro_precision"],
+                "recall": label_metrics["micro_recall"],
+                "f1": label_metrics["micro_f1"],
+                "log_loss": _log_loss(y, oof),
+            }
+            oof_by_l2[l2] = oof
+        best = max(per_l2.values(), key=lambda m: (np.nan_to_num(m["auc"], nan=-1.0), -m["log_loss"]))
+        cv_metrics = {
+            "n_calls": int(len(y)),
+            "n_scam": int(y.sum()),
+            "n_folds": n_folds,
+            "best": best,
+            "grid": list(per_l2.values()),
+        }
+        if n_boot > 0:
+            oof = oof_by_l2[best["l2"]]
+            auc_ci = bootstrap_statistic(roc_auc, y, oof, n_boot=n_boot, seed=seed, max_workers=max_workers)
+            label_ci = bootstrap_label_metrics(
+                y[:, None], (oof >= 0.5)[:, None], n_boot=n_boot, seed=seed, max_workers=max_workers
+            )
+            cv_metrics["best_ci"] = {
+                "auc": [auc_ci["ci_low"], auc_ci["ci_high"]],
+                "f1": [label_ci["micro_f1"]["ci_low"], label_ci["micro_f1"]["ci_high"]],
+                "accuracy": [label_ci["accuracy"]["ci_low"], label_ci["accuracy"]["ci_high"]],
+            }
+        return cls.fit(X, y, codes, l2=best["l2"], cv_metrics=cv_metrics), cv_metrics
+
+    # -- Inference --
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        return ((X - self.mean) / self.std) @ self.weights + self.bias
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """P(scam) per row."""
+        return _sigmoid(self.decision_function(X).astype(np.float64))
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return (self.predict_proba(X) >= self.threshold).astype(np.int8)
+
+    def score_call(self, line_objs: Sequence[dict]) -> float:
+        """P(scam) for one call given its per-line behavior jsons."""
+        return float(self.predict_proba(call_feature_vector(line_objs, self.codes))[0])
+
+    def top_features(self, n: int = 10) -> List[Tuple[str, float]]:
+        """Features with the largest standardized weights (positive = pushes toward scam)."""
+        order = np.argsort(-np.abs(self.weights))[:n]
+        names = self.feature_names
+        return [(names[i], float(self.weights[i])) for i in order]
+
+    # -- Persistence --
+
+    def save(self, path: str) -> None:
+        if not path.endswith(".npz"):
+            raise ValueError("ScamClassifier path must be a .npz file")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta = {
+            "codes": self.codes,
+            "bias": self.bias,
+            "threshold": self.threshold,
+            "l2": self.l2,
+            "cv_metrics": self.cv_metrics,
+        }
+        np.savez_compressed(
+            path, weights=self.weights, mean=self.mean, std=self.std, meta=np.array(json.dumps(meta))
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ScamClassifier":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(
+                meta["codes"],
+                data["weights"],
+                meta["bias"],
+                data["mean"],
+                data["std"],
+                threshold=meta["threshold"],
+                l2=meta["l2"],
+                cv_metrics=meta["cv_metrics"],
+            )
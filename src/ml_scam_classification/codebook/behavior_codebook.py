@@ -0,0 +1,125 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from src.general_file_utils.utils.json import load_json_from_path
+
+FEATURES_V2_PATH = "src/ml_scam_classification/prompting/features_v2.json"
+
+_CODE_RE = re.compile(r"^(\d+)([A-Z]+)$")
+# Codebooks embedded in prompts (e.g. prompt_conner_v7.txt): "3 - Certainty" / "22. SWBD-DAMSL ..." then "3A. <description>"
+_PROMPT_LABEL_RE = re.compile(r"^(\d+)([A-Z]+)\.\s+(.+)$")
+_PROMPT_CATEGORY_RE = re.compile(r"^(\d+)(?:\s+-|\.)\s+(.+)$")
+
+
+def behavior_code_sort_key(code: str):
+    """Natural order for behavior codes: 1A < 1B < 2A < 10A < 16Z < 16AA."""
+    m = _CODE_RE.match(code)
+    if m is None:
+        return (float("inf"), 0, code)
+    return (int(m.group(1)), len(m.group(2)), m.group(2))
+
+
+def sort_behavior_codes(codes: Iterable[str]) -> List[str]:
+    return sorted(set(codes), key=behavior_code_sort_key)
+
+
+def load_behavior_codebook(path: str = FEATURES_V2_PATH) -> Dict[str, dict]:
+    """
+    Flatten a features*.json codebook into {code: {"category_id", "category", "description"}},
+    e.g. "1A" -> {"category_id": "1", "category": "Urgency, Pressure, and Consequence", "description": "..."}.
+    Codes are returned in natural order.
+    """
+    raw = load_json_from_path(path)
+    codebook = {}
+    for category_id, category in raw.items():
+        for label_id, description in category["Labels"].items():
+            codebook[f"{category_id}{label_id}"] = {
+                "category_id": category_id,
+                "category": category["Category"],
+                "description": description,
+            }
+    return {code: codebook[code] for code in sort_behavior_codes(codebook)}
+
+
+def parse_prompt_codebook(prompt_text: str) -> Dict[str, dict]:
+    """Codebook embedded in a prompt's behavior section, in the same format as load_behavior_codebook()."""
+    codebook = {}
+    category_id, category = None, None
+    for line in prompt_text.splitlines():
+        line = line.strip()
+        m = _PROMPT_LABEL_RE.match(line)
+        if m is not None:
+            code_category_id = m.group(1)
+            codebook[f"{code_category_id}{m.group(2)}"] = {
+                "category_id": code_category_id,
+                "category": category if code_category_id == category_id else None,
+                "description": m.group(3).strip(),
+            }
+            continue
+        m = _PROMPT_CATEGORY_RE.match(line)
+        if m is not None:
+            category_id, category = m.group(1), m.group(2).strip()
+    return {code: codebook[code] for code in sort_behavior_codes(codebook)}
+
+
+def load_codebook(path: str) -> Dict[str, dict]:
+    """A features*.json codebook, or the codebook embedded in a prompt .txt file."""
+    if path.endswith(".json"):
+        return load_behavior_codebook(path)
+    with open(path, "r", encoding="utf-8") as f:
+        codebook = parse_prompt_codebook(f.read())
+    if not codebook:
+        raise ValueError(f"No behavior codes (e.g. \"1A. ...\") found in prompt: {path}")
+    return codebook
+
+
+def load_behavior_codes(path: str = FEATURES_V2_PATH) -> List[str]:
+    """Ordered list of behavior codes (79 for features_v2.json). Column order for all label matrices."""
+    return list(load_behavior_codebook(path))
+
+
+def infer_behavior_codes(line_objs: Iterable[dict]) -> List[str]:
+    """Codes appearing in the "behaviors_exhibited" of already-labeled line jsons, in natural order."""
+    codes = set()
+    for obj in line_objs:
+        codes.update((obj.get("behaviors_exhibited") or {}).keys())
+    return sort_behavior_codes(codes)
+
+
+def line_json_to_label_vector(line_obj: dict, codes: Sequence[str]) -> np.ndarray:
+    """
+    Per-line behavior json -> bool vector over `codes`.
+    Codes missing from the json count as not identified.
+    """
+    behaviors = line_obj.get("behaviors_exhibited") or {}
+    vec = np.zeros(len(codes), dtype=bool)
+    for i, code in enumerate(codes):
+        entry = behaviors.get(code)
+        if entry is None:
+            continue
+        value = entry.get("was_identified", 0) if isinstance(entry, dict) else entry
+        vec[i] = bool(int(value))
+    return vec
+
+
+def line_jsons_to_label_matrix(line_objs: Sequence[dict], codes: Sequence[str]) -> np.ndarray:
+    """(n_lines, n_codes) bool matrix."""
+    mat = np.zeros((len(line_objs), len(codes)), dtype=bool)
+    for row, obj in enumerate(line_objs):
+        mat[row] = line_json_to_label_vector(obj, codes)
+    return mat
+
+
+def label_vector_to_behaviors_exhibited(
+    vec: np.ndarray,
+    codes: Sequence[str],
+    *,
+    analysis: Optional[str] = None,
+) -> Dict[str, dict]:
+    """bool vector -> {"1A": {"analysis": ..., "was_identified": 0/1}, ...} (the LLM output structure)."""
+    return {
+        code: {"analysis": analysis or "", "was_identified": int(bool(v))}
+        for code, v in zip(codes, vec)
+    }
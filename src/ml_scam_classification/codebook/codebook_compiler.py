@@ -0,0 +1,165 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from src.ml_scam_classification.codebook.behavior_codebook import sort_behavior_codes
+
+COMPACTION_LEVELS = ("full", "gloss", "keywords")
+
+_TOKEN_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_PARENTHETICAL_RE = re.compile(r"\s*\([^)]*\)")
+# everything after one of these is an example or elaboration, not the core meaning
+_ELABORATION_RE = re.compile(r"(,?\s+(such as|e\.g\.|i\.e\.|for example|including)\b|;|\s+-\s+|\s+—\s+).*$", re.IGNORECASE)
+_LEADING_SUBJECT_RE = re.compile(r"^(the (person|speaker|caller|receiver)|is)\s+", re.IGNORECASE)
+_STOPWORDS = frozenset(
+    """
+    a an and are as at be been being by can could did do does for from had has have he her his how i if in into is it
+    its me my no not of on or our she so some such than that the their them then there these they this those to
+    too was we were what when where which while who whom why will with would you your about against any each
+    more most other own same very just also something someone person speaker other's one's
+    uses use makes make made states state mentions mention gives give provides provide indicates indicate
+    """.split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Tokenizer-free approximation of BPE input tokens: one token per punctuation mark or number,
+    and about one per 4 letters of each word (short common words are a single token).
+    Good for comparing renderings of the same codebook; exact counts are the prompt_tokens
+    the API reports (see UsageLedger).
+    """
+    return sum(max(1, math.ceil(len(piece) / 4)) if piece.isalpha() else 1 for piece in _TOKEN_PIECE_RE.findall(text))
+
+
+def gloss_description(description: str, *, max_words: int = 10) -> str:
+    """
+    Short gloss of a behavior description: examples, parentheticals and the subject
+    ("The person ...") are dropped; if that is still longer than max_words, the first clause
+    is kept when it can stand alone (3+ words). Words are never cut mid-phrase.
+    """
+    text = _PARENTHETICAL_RE.sub("", description.strip())
+    text = _ELABORATION_RE.sub("", text)
+    text = _LEADING_SUBJECT_RE.sub("", text).strip().rstrip(",.:")
+    if len(text.split()) > max_words and ", " in text:
+        first_clause = text.split(", ")[0]
+        if len(first_clause.split()) >= 3:
+            text = first_clause
+    return text[:1].upper() + text[1:] if text else description.strip()
+
+
+def description_keywords(description: str, *, max_keywords: int = 5) -> List[str]:
+    """Distinctive lowercase content words of a description, in order of appearance."""
+    text = _PARENTHETICAL_RE.sub("", description)
+    keywords = []
+    for word in re.findall(r"[A-Za-z][A-Za-z'’-]*", text):
+        word = word.lower().strip("'’-")
+        if len(word) > 2 and word not in _STOPWORDS and word not in keywords:
+            keywords.append(word)
+    return keywords[:max_keywords] or [description.strip().lower()]
+
+
+def render_codebook(
+    codebook: Dict[str, dict],
+    level: str = "full",
+    *,
+    codes: Optional[Sequence[str]] = None,
+    max_gloss_words: int = 10,
+    max_keywords: int = 5,
+) -> str:
+    """
+    Render a codebook ({code: {"category_id", "category", "description"}}) for a prompt:
+    - "full": "1 - <Category>" headers and "1A. <description>" lines, as in the long prompts
+    - "gloss": the same layout with short glosses (gloss_description)
+    - "keywords": no category headers, "1A. <keyword> <keyword> ..." lines; codes whose keywords
+      would be ambiguous (fewer than two, or the same as another code's) fall back to the gloss
+    Every level keeps the "<code>. <text>" line format, so parse_prompt_codebook() recovers the codes.
+    """
+    if level not in COMPACTION_LEVELS:
+        raise ValueError(f"Unknown compaction level: {level!r}. Expected one of {COMPACTION_LEVELS}")
+    codes = sort_behavior_codes(codebook if codes is None else codes)
+    missing = [c for c in codes if c not in codebook]
+    if missing:
+        raise ValueError(f"Codes not in codebook: {missing}")
+
+    keyword_texts = {}
+    if level == "keywords":
+        keyword_texts = {
+            code: " ".join(description_keywords(codebook[code]["description"], max_keywords=max_keywords))
+            for code in codes
+        }
+        counts = Counter(keyword_texts.values())
+        for code, text in keyword_texts.items():
+            if counts[text] > 1 or len(text.split()) < 2:
+                keyword_texts[code] = gloss_description(codebook[code]["description"], max_words=max_gloss_words)
+
+    lines = []
+    prev_category_id = None
+    for code in codes:
+        entry = codebook[code]
+        if level != "keywords" and entry.get("category_id") != prev_category_id:
+            if lines:
+                lines.append("")
+            if entry.get("category"):
+                lines.append(f"{entry['category_id']} - {entry['category']}")
+            prev_category_id = entry.get("category_id")
+        if level == "full":
+            text = entry["description"].strip()
+        elif level == "gloss":
+            text = gloss_description(entry["description"], max_words=max_gloss_words)
+        else:
+            text = keyword_texts[code]
+        lines.append(f"{code}. {text}")
+    return "\n".join(lines)
+
+
+def compile_tagging_instructions(
+    codebook: Dict[str, dict],
+    level: str = "full",
+    *,
+    codes: Optional[Sequence[str]] = None,
+    **render_kwargs,
+) -> str:
+    """
+    Phase 2 (per-line behavior tagging) instructions with the codebook rendered at `level`,
+    asking for the v7 line json format. `codes` restricts the instructions to a subset
+    (e.g. the changed codes of a codebook diff).
+    """
+    codes = sort_behavior_codes(codebook if codes is None else codes)
+    example = ",\n".join(
+        f'"{code}": {{ "analysis": "<why the behavior is or is not present>", "was_identified": 0 }}' for code in codes[:2]
+    )
+    return (
+        "**BEHAVIOR IDENTIFICATION**\n\n"
+        "You are a call behavior analysis system. You have a cleaned transcript, divided into segments each "
+        "labeled with its speaker (Caller or Receiver). For the requested segment, decide whether each of the "
+        "following behaviors is present.\n\n"
+        f"Here are the behavioral codes to evaluate (and only these):\n\n"
+        f"{render_codebook(codebook, level, codes=codes, **render_kwargs)}\n\n"
+        "For the segment, construct a json object with these attributes:\n"
+        '- "transcript_segment": the text of the segment\n'
+        '- "speaker": "Caller" or "Receiver"\n'
+        '- "behaviors_exhibited": an object with one attribute per behavior code listed above, whose value is an '
+        'object with "analysis" (a short comment on whether the behavior is present and why) and "was_identified" '
+        "(1 if present in the segment, 0 if not).\n\n"
+        "For example:\n\n```json\n"
+        '{\n"transcript_segment": "...",\n"speaker": "Caller",\n"behaviors_exhibited": {\n'
+        f"{example}\n}}\n}}\n```\n\n"
+        "Make sure to escape any quotes to maintain valid json, and wrap the json between ```json and ```."
+    )
+
+
+def codebook_token_report(codebook: Dict[str, dict], levels: Sequence[str] = COMPACTION_LEVELS) -> List[dict]:
+    """Estimated tokens of the codebook rendering and of the full instructions, per level."""
+    full_tokens = estimate_tokens(render_codebook(codebook, "full"))
+    report = []
+    for level in levels:
+        codebook_tokens = estimate_tokens(render_codebook(codebook, level))
+        report.append({
+            "level": level,
+            "codebook_tokens_est": codebook_tokens,
+            "instruction_tokens_est": estimate_tokens(compile_tagging_instructions(codebook, level)),
+            "codebook_tokens_vs_full": codebook_tokens / full_tokens if full_tokens else float("nan"),
+        })
+    return report
@@ -0,0 +1,71 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from src.ml_scam_classification.codebook.behavior_codebook import sort_behavior_codes
+
+
+def _normalize_description(text: str) -> str:
+    """Whitespace/case/trailing punctuation differences are not rewordings."""
+    return re.sub(r"\s+", " ", str(text)).strip().rstrip(".").lower()
+
+
+@dataclass
+class CodebookDiff:
+    """
+    Label-level difference between two codebook versions ({code: {"category_id", "category", "description"}}).
+    - added / removed: codes only in the new / old codebook
+    - reworded: codes in both whose description changed (labels must be requested again)
+    - recategorized: codes whose description is unchanged but whose category title changed
+      (the label meaning is the same, so existing labels are kept)
+    """
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    reworded: List[str] = field(default_factory=list)
+    recategorized: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def to_relabel(self) -> List[str]:
+        """Codes whose labels have to be (re)requested from the model."""
+        return sort_behavior_codes(self.added + self.reworded)
+
+    @property
+    def to_keep(self) -> List[str]:
+        """Codes whose existing labels carry over unchanged."""
+        return sort_behavior_codes(self.unchanged + self.recategorized)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.reworded)
+
+    def format_report(self, old_codebook: Dict[str, dict], new_codebook: Dict[str, dict]) -> str:
+        lines = [
+            f"Codebook diff: {len(self.added)} added, {len(self.removed)} removed, {len(self.reworded)} reworded, "
+            f"{len(self.recategorized)} recategorized, {len(self.unchanged)} unchanged",
+            f"Labels to request per line: {len(self.to_relabel)} of {len(new_codebook)}",
+        ]
+        for code in self.added:
+            lines.append(f"  + {code}: {new_codebook[code]['description']}")
+        for code in self.removed:
+            lines.append(f"  - {code}: {old_codebook[code]['description']}")
+        for code in self.reworded:
+            lines.append(f"  ~ {code}: {old_codebook[code]['description']}")
+            lines.append(f"  {' ' * len(code)}  -> {new_codebook[code]['description']}")
+        return "\n".join(lines)
+
+
+def diff_codebooks(old_codebook: Dict[str, dict], new_codebook: Dict[str, dict]) -> CodebookDiff:
+    diff = CodebookDiff()
+    for code in sort_behavior_codes(set(old_codebook) | set(new_codebook)):
+        if code not in old_codebook:
+            diff.added.append(code)
+        elif code not in new_codebook:
+            diff.removed.append(code)
+        elif _normalize_description(old_codebook[code]["description"]) != _normalize_description(new_codebook[code]["description"]):
+            diff.reworded.append(code)
+        elif old_codebook[code].get("category") != new_codebook[code].get("category"):
+            diff.recategorized.append(code)
+        else:
+            diff.unchanged.append(code)
+    return diff
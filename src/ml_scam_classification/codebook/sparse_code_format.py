@@ -0,0 +1,137 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.ml_scam_classification.codebook.behavior_codebook import (
+    label_vector_to_behaviors_exhibited,
+    line_json_to_label_vector,
+    load_behavior_codes,
+    sort_behavior_codes,
+)
+from src.ml_scam_classification.codebook.codebook_compiler import render_codebook
+
+# Compact per-line response contract: "L<line_no>|<C or R>|<present codes, comma separated, or ->"
+# e.g. "L12|C|1A,3E,7B" or "L13|R|-". Only present codes are listed.
+SPEAKER_TO_SPARSE = {"Caller": "C", "Receiver": "R"}
+SPARSE_TO_SPEAKER = {v: k for k, v in SPEAKER_TO_SPARSE.items()}
+NO_CODES = "-"
+
+_SPARSE_LINE_RE = re.compile(r"^L(\d+)\|([CR])\|(.+)$")
+_FENCE_RE = re.compile(r"^```\w*$")
+
+
+class SparseFormatError(ValueError):
+    """A response that does not follow the sparse code-list contract."""
+
+
+def encode_sparse_line(line_no: int, speaker: str, present_codes: Sequence[str]) -> str:
+    if speaker not in SPEAKER_TO_SPARSE:
+        raise ValueError(f"Speaker must be one of {list(SPEAKER_TO_SPARSE)}, got {speaker!r}")
+    codes_str = ",".join(sort_behavior_codes(present_codes)) or NO_CODES
+    return f"L{int(line_no)}|{SPEAKER_TO_SPARSE[speaker]}|{codes_str}"
+
+
+def line_json_to_sparse(line_obj: dict, line_no: int, codes: Sequence[str]) -> str:
+    """Per-line behavior json -> sparse line (what the model would have output for it)."""
+    vec = line_json_to_label_vector(line_obj, codes)
+    return encode_sparse_line(line_no, line_obj["speaker"], [c for c, v in zip(codes, vec) if v])
+
+
+def parse_sparse_line(text: str, code_index: Dict[str, int]) -> Tuple[int, str, List[int]]:
+    """
+    One sparse line -> (line_no, speaker, column indices of the present codes).
+    Raises SparseFormatError for anything off-contract: bad layout, unknown or repeated codes.
+    """
+    m = _SPARSE_LINE_RE.match(text.strip())
+    if m is None:
+        raise SparseFormatError(f"Not a sparse code line (expected e.g. 'L12|C|1A,3E'): {text!r}")
+    line_no, speaker, codes_str = int(m.group(1)), SPARSE_TO_SPEAKER[m.group(2)], m.group(3).strip()
+    if codes_str == NO_CODES:
+        return line_no, speaker, []
+    present = [c.strip() for c in codes_str.split(",")]
+    unknown = [c for c in present if c not in code_index]
+    if unknown:
+        raise SparseFormatError(f"Unknown behavior code(s) {unknown} on line L{line_no}: {text!r}")
+    if len(set(present)) != len(present):
+        raise SparseFormatError(f"Repeated behavior code on line L{line_no}: {text!r}")
+    return line_no, speaker, [code_index[c] for c in present]
+
+
+def decode_sparse_response(
+    response_text: str,
+    codes: Optional[Sequence[str]] = None,
+    *,
+    expected_line_nos: Optional[Sequence[int]] = None,
+) -> Tuple[List[int], List[str], np.ndarray]:
+    """
+    Strictly decode a sparse response into (line_nos, speakers, (n_lines, n_codes) bool labels).
+
+    Only blank lines and ``` fences around the code lines are tolerated. Codes are validated
+    against `codes` (default: features_v2.json). With expected_line_nos, the response must cover
+    exactly those lines, in that order.
+    """
+    codes = load_behavior_codes() if codes is None else list(codes)
+    code_index = {code: i for i, code in enumerate(codes)}
+    line_nos, speakers, rows = [], [], []
+    for raw in response_text.strip().splitlines():
+        raw = raw.strip()
+        if not raw or _FENCE_RE.match(raw):
+            continue
+        line_no, speaker, present = parse_sparse_line(raw, code_index)
+        line_nos.append(line_no)
+        speakers.append(speaker)
+        rows.append(present)
+
+    if expected_line_nos is not None and line_nos != [int(n) for n in expected_line_nos]:
+        raise SparseFormatError(f"Expected lines {list(expected_line_nos)}, got {line_nos}")
+    if len(set(line_nos)) != len(line_nos):
+        raise SparseFormatError(f"Repeated line numbers in response: {line_nos}")
+
+    labels = np.zeros((len(rows), len(codes)), dtype=bool)
+    for i, present in enumerate(rows):
+        labels[i, present] = True
+    return line_nos, speakers, labels
+
+
+def sparse_labels_to_line_jsons(
+    speakers: Sequence[str],
+    labels: np.ndarray,
+    codes: Sequence[str],
+    *,
+    segments: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """Expand decoded sparse labels into the full per-line behavior json (analysis left empty)."""
+    segments = [""] * len(speakers) if segments is None else segments
+    return [
+        {
+            "transcript_segment": segment,
+            "speaker": speaker,
+            "behaviors_exhibited": label_vector_to_behaviors_exhibited(vec, codes),
+        }
+        for segment, speaker, vec in zip(segments, speakers, labels)
+    ]
+
+
+def compile_sparse_tagging_instructions(
+    codebook: Dict[str, dict],
+    level: str = "full",
+    *,
+    codes: Optional[Sequence[str]] = None,
+    **render_kwargs,
+) -> str:
+    """Phase 2 instructions asking for the sparse code-list format instead of per-line json."""
+    codes = sort_behavior_codes(codebook if codes is None else codes)
+    return (
+        "**BEHAVIOR IDENTIFICATION**\n\n"
+        "You are a call behavior analysis system. You have a cleaned transcript, divided into segments each "
+        "labeled with its speaker (Caller or Receiver). For each requested segment, decide which of the "
+        "following behaviors are present.\n\n"
+        "Here are the behavioral codes to evaluate (and only these):\n\n"
+        f"{render_codebook(codebook, level, codes=codes, **render_kwargs)}\n\n"
+        "Output exactly one line per requested segment, in the requested order, and nothing else:\n"
+        "L<segment number>|<C for Caller or R for Receiver>|<codes of the behaviors present, comma separated>\n"
+        f"If no behavior is present, write {NO_CODES} instead of the codes. For example:\n\n"
+        f"L12|C|{','.join(codes[:3])}\n"
+        f"L13|R|{NO_CODES}"
+    )
@@ -0,0 +1,245 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+SUMMARY_METRICS = (
+    "accuracy",
+    "macro_precision",
+    "macro_recall",
+    "macro_f1",
+    "micro_precision",
+    "micro_recall",
+    "micro_f1",
+)
+# cap on (replicates x resampling units) per bootstrap batch, to bound the weight matrix's memory
+_MAX_BATCH_CELLS = 20_000_000
+
+
+def _as_bool_matrix(labels) -> np.ndarray:
+    labels = np.asarray(labels, dtype=bool)
+    if labels.ndim != 2:
+        raise ValueError(f"Label matrices must be 2-D (n_lines, n_codes), got shape {labels.shape}")
+    return labels
+
+
+def _check_pair(y_true, y_pred) -> Tuple[np.ndarray, np.ndarray]:
+    y_true, y_pred = _as_bool_matrix(y_true), _as_bool_matrix(y_pred)
+    if y_true.shape != y_pred.shape:
+        raise ValueError(f"Shape mismatch: y_true {y_true.shape} vs y_pred {y_pred.shape}")
+    return y_true, y_pred
+
+
+# -- Confusion counts --
+
+def confusion_counts(y_true, y_pred) -> Dict[str, np.ndarray]:
+    """Per-code {"tp", "fp", "fn", "tn"} counts, each of shape (n_codes,)."""
+    y_true, y_pred = _check_pair(y_true, y_pred)
+    tp = np.count_nonzero(y_true & y_pred, axis=0)
+    fp = np.count_nonzero(~y_true & y_pred, axis=0)
+    fn = np.count_nonzero(y_true & ~y_pred, axis=0)
+    return {"tp": tp, "fp": fp, "fn": fn, "tn": len(y_true) - tp - fp - fn}
+
+
+def _safe_ratio(num: np.ndarray, denom: np.ndarray, empty_value: np.ndarray) -> np.ndarray:
+    return np.where(denom > 0, num / np.maximum(denom, 1), empty_value)
+
+
+def metrics_from_counts(tp, fp, fn, tn) -> Dict[str, np.ndarray]:
+    """
+    Per-code and averaged metrics from confusion counts of shape (..., n_codes); leading axes
+    (e.g. bootstrap replicates) are kept. Empty ratios follow one rule: a code with nothing to
+    find and nothing predicted is perfect (precision = recall = F1 = 1); otherwise an empty
+    ratio is 0.
+    """
+    tp, fp, fn, tn = (np.asarray(c, dtype=np.float64) for c in (tp, fp, fn, tn))
+    nothing_wrong = ((fp == 0) & (fn == 0)).astype(np.float64)
+    precision = _safe_ratio(tp, tp + fp, np.where(fn == 0, 1.0, 0.0))
+    recall = _safe_ratio(tp, tp + fn, np.where(fp == 0, 1.0, 0.0))
+    f1 = _safe_ratio(2 * tp, 2 * tp + fp + fn, nothing_wrong)
+
+    TP, FP, FN, TN = (c.sum(axis=-1) for c in (tp, fp, fn, tn))
+    total = TP + FP + FN + TN
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "accuracy": _safe_ratio(TP + TN, total, np.full_like(total, np.nan)),
+        "macro_precision": precision.mean(axis=-1),
+        "macro_recall": recall.mean(axis=-1),
+        "macro_f1": f1.mean(axis=-1),
+        "micro_precision": _safe_ratio(TP, TP + FP, np.where(FN == 0, 1.0, 0.0)),
+        "micro_recall": _safe_ratio(TP, TP + FN, np.where(FP == 0, 1.0, 0.0)),
+        "micro_f1": _safe_ratio(2 * TP, 2 * TP + FP + FN, ((FP == 0) & (FN == 0)).astype(np.float64)),
+    }
+
+
+# -- Point estimates --
+
+def label_accuracy(y_true, y_pred) -> float:
+    """Fraction of (line, code) labels that agree."""
+    y_true, y_pred = _check_pair(y_true, y_pred)
+    return float(np.mean(y_true == y_pred)) if y_true.size else float("nan")
+
+
+def macro_f1(y_true, y_pred) -> float:
+    """Unweighted mean of per-code F1. Codes absent from both y_true and y_pred count as F1 = 1."""
+    y_true, y_pred = _check_pair(y_true, y_pred)
+    if not y_true.size:
+        return float("nan")
+    return float(metrics_from_counts(**confusion_counts(y_true, y_pred))["macro_f1"])
+
+
+def summary_metrics(y_true, y_pred) -> Dict[str, float]:
+    """Accuracy plus macro- and micro-averaged precision, recall and F1 (see SUMMARY_METRICS)."""
+    y_true, y_pred = _check_pair(y_true, y_pred)
+    if not y_true.size:
+        return {name: float("nan") for name in SUMMARY_METRICS}
+    metrics = metrics_from_counts(**confusion_counts(y_true, y_pred))
+    return {name: float(metrics[name]) for name in SUMMARY_METRICS}
+
+
+def per_label_metrics(y_true, y_pred, codes: Sequence[str]) -> pd.DataFrame:
+    """One row per code: support, confusion counts, precision, recall and F1."""
+    y_true, y_pred = _check_pair(y_true, y_pred)
+    if y_true.shape[1] != len(codes):
+        raise ValueError(f"Got {len(codes)} codes for label matrices with {y_true.shape[1]} columns")
+    counts = confusion_counts(y_true, y_pred)
+    metrics = metrics_from_counts(**counts)
+    return pd.DataFrame({
+        "code": list(codes),
+        "support": counts["tp"] + counts["fn"],
+        **counts,
+        "precision": metrics["precision"],
+        "recall": metrics["recall"],
+        "f1": metrics["f1"],
+    })
+
+
+# -- Bootstrap --
+
+def _bootstrap_weights(rng: np.random.Generator, n_boot: int, n_units: int) -> np.ndarray:
+    """(n_boot, n_units) resampling counts: how often each unit is drawn in each replicate."""
+    draws = rng.integers(0, n_units, size=(n_boot, n_units))
+    draws += np.arange(n_boot)[:, None] * n_units
+    return np.bincount(draws.ravel(), minlength=n_boot * n_units).reshape(n_boot, n_units)
+
+
+def _batch_generators(n_boot: int, batch_size: int, seed: int):
+    """(replicates, generator) per batch; independent streams keep results identical however batches are scheduled."""
+    sizes = [min(batch_size, n_boot - start) for start in range(0, n_boot, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return [(size, np.random.default_rng(s)) for size, s in zip(sizes, seeds)]
+
+
+def _percentile_interval(samples: np.ndarray, ci: float) -> Tuple[float, float]:
+    samples = samples[~np.isnan(samples)]
+    if not samples.size:
+        return float("nan"), float("nan")
+    low, high = np.percentile(samples, [50 * (1 - ci), 50 * (1 + ci)])
+    return float(low), float(high)
+
+
+def bootstrap_label_metrics(
+    y_true,
+    y_pred,
+    *,
+    groups: Optional[Sequence] = None,
+    n_boot: int = 1000,
+    ci: float = 0.95,
+    seed: int = 0,
+    batch_size: int = 250,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Percentile bootstrap intervals for SUMMARY_METRICS: {metric: {"value", "ci_low", "ci_high"}}.
+
+    Resampling units are lines, or `groups` (e.g. one transcript id per line) for a cluster
+    bootstrap, since lines of the same call are not independent. Confusion counts are summed per
+    unit once; each replicate is then a (resampling counts @ unit counts) product, so a batch of
+    replicates is one matrix multiply. Batches run on a thread pool (NumPy releases the GIL).
+    """
+    y_true, y_pred = _check_pair(y_true, y_pred)
+    if not 0 < ci < 1:
+        raise ValueError(f"ci must be in (0, 1), got {ci}")
+    if n_boot < 1 or batch_size < 1:
+        raise ValueError("n_boot and batch_size must be positive")
+    point = summary_metrics(y_true, y_pred)
+    if not y_true.size:
+        return {name: {"value": v, "ci_low": float("nan"), "ci_high": float("nan")} for name, v in point.items()}
+
+    if groups is None:
+        unit_of_line = np.arange(len(y_true))
+        n_units = len(y_true)
+    else:
+        groups = np.asarray(groups)
+        if groups.shape != (len(y_true),):
+            raise ValueError(f"groups must have one entry per line ({len(y_true)}), got shape {groups.shape}")
+        _, unit_of_line = np.unique(groups, return_inverse=True)
+        n_units = int(unit_of_line.max()) + 1
+
+    # (n_units, n_codes) counts per resampling unit
+    unit_counts = {}
+    for name, mask in (("tp", y_true & y_pred), ("fp", ~y_true & y_pred), ("fn", y_true & ~y_pred)):
+        if groups is None:
+            unit_counts[name] = mask.astype(np.float64)
+        else:
+            unit_counts[name] = np.zeros((n_units, y_true.shape[1]), dtype=np.float64)
+            np.add.at(unit_counts[name], unit_of_line, mask)
+    lines_per_unit = np.bincount(unit_of_line, minlength=n_units).astype(np.float64)
+
+    def _run(job) -> Dict[str, np.ndarray]:
+        size, rng = job
+        w = _bootstrap_weights(rng, size, n_units).astype(np.float64)
+        tp, fp, fn = (w @ unit_counts[name] for name in ("tp", "fp", "fn"))
+        tn = (w @ lines_per_unit)[:, None] - tp - fp - fn
+        metrics = metrics_from_counts(tp, fp, fn, tn)
+        return {name: metrics[name] for name in SUMMARY_METRICS}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        batch_size = max(1, min(batch_size, _MAX_BATCH_CELLS // n_units))
+        batches = list(executor.map(_run, _batch_generators(n_boot, batch_size, seed)))
+
+    out = {}
+    for name in SUMMARY_METRICS:
+        low, high = _percentile_interval(np.concatenate([b[name] for b in batches]), ci)
+        out[name] = {"value": point[name], "ci_low": low, "ci_high": high}
+    return out
+
+
+def bootstrap_statistic(
+    statistic: Callable[..., float],
+    *arrays: np.ndarray,
+    n_boot: int = 1000,
+    ci: float = 0.95,
+    seed: int = 0,
+    batch_size: int = 250,
+    max_workers: Optional[int] = None,
+) -> Dict[str, float]:
+    """
+    Percentile bootstrap interval for any statistic of row-aligned arrays (e.g. roc_auc of
+    (y, scores)): {"value", "ci_low", "ci_high"}. Resample indices are drawn per batch and the
+    batches run on a thread pool. Replicates where the statistic is NaN are ignored.
+    """
+    if not arrays:
+        raise ValueError("bootstrap_statistic needs at least one array")
+    arrays = [np.asarray(a) for a in arrays]
+    n = len(arrays[0])
+    if any(len(a) != n for a in arrays):
+        raise ValueError("All arrays must have the same number of rows")
+    if n_boot < 1 or batch_size < 1:
+        raise ValueError("n_boot and batch_size must be positive")
+    value = float(statistic(*arrays))
+    if n == 0:
+        return {"value": value, "ci_low": float("nan"), "ci_high": float("nan")}
+
+    def _run(job) -> np.ndarray:
+        size, rng = job
+        idx = rng.integers(0, n, size=(size, n))
+        return np.array([statistic(*(a[row] for a in arrays)) for row in idx], dtype=np.float64)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        samples = np.concatenate(list(executor.map(_run, _batch_generators(n_boot, batch_size, seed))))
+    low, high = _percentile_interval(samples, ci)
+    return {"value": value, "ci_low": low, "ci_high": high}
@@ -0,0 +1,259 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class CallAggregates:
+    """
+    Per-call aggregates of a (lines x codes) label matrix. Arrays are (n_calls, n_codes)
+    unless noted; "absent" codes have first_line == -1, first_frac == 1.0 and longest_run == 0.
+    """
+    codes: List[str]
+    n_lines: np.ndarray          # (n_calls,)
+    n_caller: np.ndarray         # (n_calls,)
+    counts: np.ndarray
+    caller_counts: np.ndarray
+    receiver_counts: np.ndarray
+    first_line: np.ndarray       # 0-based line index of the first occurrence within the call
+    longest_run: np.ndarray      # longest streak of consecutive lines exhibiting the code
+    cooccurrence: Optional[np.ndarray] = None  # (n_calls, n_codes, n_codes), see aggregate_calls
+
+    @property
+    def n_receiver(self) -> np.ndarray:
+        return self.n_lines - self.n_caller
+
+    @staticmethod
+    def _safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+        den = np.asarray(den, dtype=np.float32)
+        out = np.zeros(num.shape, dtype=np.float32)
+        np.divide(num, den[:, None], out=out, where=den[:, None] > 0)
+        return out
+
+    @property
+    def rates(self) -> np.ndarray:
+        return self._safe_div(self.counts, self.n_lines)
+
+    @property
+    def caller_rates(self) -> np.ndarray:
+        return self._safe_div(self.caller_counts, self.n_caller)
+
+    @property
+    def receiver_rates(self) -> np.ndarray:
+        return self._safe_div(self.receiver_counts, self.n_receiver)
+
+    @property
+    def first_frac(self) -> np.ndarray:
+        """First occurrence as a fraction of the call (0.0 = first line), 1.0 if absent."""
+        frac = self._safe_div(self.first_line, self.n_lines)
+        frac[self.first_line < 0] = 1.0
+        return frac
+
+    def classifier_features(self) -> np.ndarray:
+        """The ScamClassifier layout: any, rate, caller_rate, receiver_rate, log(1 + n_lines), caller fraction."""
+        n_lines = self.n_lines.astype(np.float32)
+        caller_frac = np.zeros_like(n_lines)
+        np.divide(self.n_caller, n_lines, out=caller_frac, where=n_lines > 0)
+        return np.hstack([
+            (self.counts > 0).astype(np.float32),
+            self.rates,
+            self.caller_rates,
+            self.receiver_rates,
+            np.log1p(n_lines)[:, None],
+            caller_frac[:, None],
+        ])
+
+    def feature_matrix(self) -> Tuple[np.ndarray, List[str]]:
+        """All per-code aggregates (plus the flattened co-occurrence counts if computed) and their names."""
+        blocks = [
+            ("count", self.counts),
+            ("rate", self.rates),
+            ("caller_rate", self.caller_rates),
+            ("receiver_rate", self.receiver_rates),
+            ("first_frac", self.first_frac),
+            ("longest_run", self.longest_run),
+        ]
+        names = [f"{prefix}__{code}" for prefix, _ in blocks for code in self.codes]
+        mats = [m.astype(np.float32) for _, m in blocks]
+        if self.cooccurrence is not None:
+            names.extend(f"cooc__{a}__{b}" for a in self.codes for b in self.codes)
+            mats.append(self.cooccurrence.reshape(len(self.n_lines), -1).astype(np.float32))
+        names.extend(["n_lines", "n_caller"])
+        mats.append(np.stack([self.n_lines, self.n_caller], axis=1).astype(np.float32))
+        return np.hstack(mats), names
+
+
+def offsets_from_lengths(lengths: Sequence[int]) -> np.ndarray:
+    """[3, 0, 2] -> [0, 3, 3, 5]"""
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def offsets_from_sorted_ids(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Rows grouped by (already sorted) call id -> (unique ids, offsets)."""
+    ids = np.asarray(ids)
+    if ids.size == 0:
+        return ids, np.zeros(1, dtype=np.int64)
+    if np.any(ids[1:] < ids[:-1]):
+        raise ValueError("ids must be sorted so that each call's lines are contiguous")
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    return ids[starts], np.r_[starts, ids.size].astype(np.int64)
+
+
+def _segment_reduce(ufunc: np.ufunc, values: np.ndarray, starts: np.ndarray, nonempty: np.ndarray, fill) -> np.ndarray:
+    """ufunc.reduceat over call segments; empty calls (which reduceat mishandles) get `fill`."""
+    out = np.full((len(nonempty),) + values.shape[1:], fill, dtype=values.dtype)
+    if values.shape[0]:
+        out[nonempty] = ufunc.reduceat(values, starts[nonempty], axis=0)
+    return out
+
+
+def _segment_sums_from_cumsum(csum: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    padded = np.concatenate([np.zeros((1,) + csum.shape[1:], dtype=csum.dtype), csum])
+    return padded[offsets[1:]] - padded[offsets[:-1]]
+
+
+def _window_presence(labels: np.ndarray, call_start: np.ndarray, call_end: np.ndarray, k: int) -> np.ndarray:
+    """(lines x codes) bool: code occurs within k lines (either side, same call) of each line."""
+    n = labels.shape[0]
+    prefix = np.zeros((n + 1, labels.shape[1]), dtype=np.int32)
+    np.cumsum(labels, axis=0, out=prefix[1:])
+    idx = np.arange(n)
+    lo = np.maximum(idx - k, call_start)
+    hi = np.minimum(idx + k, call_end - 1) + 1
+    return (prefix[hi] - prefix[lo]) > 0
+
+
+def _segment_outer_sums(A: np.ndarray, B: np.ndarray, offsets: np.ndarray, *, max_padded_rows: int) -> np.ndarray:
+    """
+    out[c] = A[rows of c].T @ B[rows of c] for every call c, as batched matmuls over calls
+    zero-padded to the longest call in each chunk (chunks hold ~max_padded_rows padded rows).
+    """
+    lengths = np.diff(offsets)
+    n_calls, n_a, n_b = len(lengths), A.shape[1], B.shape[1]
+    out = np.zeros((n_calls, n_a, n_b), dtype=np.int32)
+    call_lo = 0
+    while call_lo < n_calls:
+        # grow the chunk while (calls x longest call) stays within budget
+        running_max = np.maximum.accumulate(lengths[call_lo:])
+        padded_rows = running_max * np.arange(1, n_calls - call_lo + 1)
+        call_hi = call_lo + max(1, int(np.searchsorted(padded_rows, max_padded_rows, side="right")))
+        width = int(running_max[call_hi - call_lo - 1])
+        if width:
+            t = np.arange(width)
+            valid = t[None, :] < lengths[call_lo:call_hi, None]
+            rows = np.where(valid, offsets[call_lo:call_hi, None] + t[None, :], 0)
+            Ap = A[rows].astype(np.float32) * valid[:, :, None]
+            Bp = B[rows].astype(np.float32)
+            out[call_lo:call_hi] = np.rint(np.matmul(Ap.transpose(0, 2, 1), Bp))
+        call_lo = call_hi
+    return out
+
+
+def aggregate_calls(
+    labels: np.ndarray,
+    offsets: np.ndarray,
+    is_caller: np.ndarray,
+    codes: Sequence[str],
+    *,
+    cooccurrence_k: Optional[int] = None,
+    cooccurrence_chunk_lines: int = 50_000,
+) -> CallAggregates:
+    """
+    Aggregate a dense (n_lines x n_codes) bool label matrix whose rows are grouped by call,
+    with call i spanning rows offsets[i]:offsets[i + 1], using segment reductions only
+    (no per-call Python loop; co-occurrence is batched matmuls over chunks of calls).
+
+    cooccurrence_k: if set, cooccurrence[c, a, b] counts the lines of call c exhibiting code a
+    that have code b within k lines (same line included; the diagonal equals counts).
+    """
+    labels = np.asarray(labels, dtype=bool)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    is_caller = np.asarray(is_caller, dtype=bool)
+    n_rows, n_codes = labels.shape
+    if n_codes != len(codes):
+        raise ValueError(f"labels has {n_codes} columns but {len(codes)} codes were given")
+    if offsets.ndim != 1 or offsets[0] != 0 or offsets[-1] != n_rows or np.any(np.diff(offsets) < 0):
+        raise ValueError("offsets must be non-decreasing, start at 0 and end at the number of label rows")
+    if is_caller.shape != (n_rows,):
+        raise ValueError("is_caller must have one entry per label row")
+
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+    nonempty = lengths > 0
+    n_calls = len(lengths)
+
+    # call id / position of every row
+    call_id = np.repeat(np.arange(n_calls), lengths)
+    call_start = starts[call_id]
+    call_end = offsets[1:][call_id]
+    pos = (np.arange(n_rows) - call_start).astype(np.int32)
+
+    # segment sums as differences of one running sum (cheaper than add.reduceat over rows)
+    L = labels.astype(np.int32)
+    csum = np.cumsum(L, axis=0, dtype=np.int32)
+    counts = _segment_sums_from_cumsum(csum, offsets)
+    caller_counts = _segment_sums_from_cumsum(np.cumsum(L * is_caller[:, None], axis=0, dtype=np.int32), offsets)
+    n_caller = _segment_sums_from_cumsum(np.cumsum(is_caller, dtype=np.int32), offsets)
+
+    # first occurrence: min position over lines exhibiting the code
+    sentinel = np.iinfo(np.int32).max
+    first = _segment_reduce(np.minimum, np.where(labels, pos[:, None], sentinel).astype(np.int32), starts, nonempty, sentinel)
+    first[first == sentinel] = -1
+
+    # longest run: run length at each row = cumsum minus the cumsum at the last reset (a 0, or the call start)
+    base = np.where(labels, 0, csum)
+    if n_rows:
+        s = starts[nonempty]
+        base[s] = np.where(labels[s], csum[s] - 1, csum[s])
+    np.maximum.accumulate(base, axis=0, out=base)
+    longest_run = _segment_reduce(np.maximum, csum - base, starts, nonempty, 0)
+
+    cooccurrence = None
+    if cooccurrence_k is not None:
+        if cooccurrence_k < 0:
+            raise ValueError("cooccurrence_k must be >= 0")
+        window = _window_presence(labels, call_start, call_end, cooccurrence_k)
+        cooccurrence = _segment_outer_sums(labels, window, offsets, max_padded_rows=cooccurrence_chunk_lines)
+
+    return CallAggregates(
+        codes=list(codes),
+        n_lines=lengths,
+        n_caller=n_caller,
+        counts=counts,
+        caller_counts=caller_counts,
+        receiver_counts=counts - caller_counts,
+        first_line=first,
+        longest_run=longest_run,
+        cooccurrence=cooccurrence,
+    )
+
+
+def aggregate_line_jsons(calls: Sequence[Sequence[dict]], codes: Sequence[str], **kwargs) -> CallAggregates:
+    """aggregate_calls() over per-call lists of per-line behavior jsons."""
+    from src.ml_scam_classification.codebook.behavior_codebook import line_jsons_to_label_matrix
+
+    all_lines = [o for line_objs in calls for o in line_objs]
+    return aggregate_calls(
+        line_jsons_to_label_matrix(all_lines, codes),
+        offsets_from_lengths([len(line_objs) for line_objs in calls]),
+        np.array([o.get("speaker") == "Caller" for o in all_lines], dtype=bool),
+        codes,
+        **kwargs,
+    )
+
+
+def aggregate_feature_store_table(table, codes: Optional[Sequence[str]] = None, **kwargs) -> Tuple[np.ndarray, CallAggregates]:
+    """
+    aggregate_calls() over a feature store table (see feature_store.read_feature_store) holding
+    a single prompt_version/model/source. Returns (transcript_ids, aggregates) in transcript_id order.
+    """
+    from src.ml_scam_classification.features.feature_store import code_columns, table_to_label_matrix
+
+    table = table.sort_by([("transcript_id", "ascending"), ("line_no", "ascending")])
+    codes = list(codes) if codes is not None else code_columns(table)
+    transcript_ids, offsets = offsets_from_sorted_ids(table.column("transcript_id").to_numpy())
+    is_caller = np.asarray(table.column("speaker").cast("string").to_numpy(zero_copy_only=False) == "Caller")
+    return transcript_ids, aggregate_calls(table_to_label_matrix(table, codes), offsets, is_caller, codes, **kwargs)
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from src.ml_scam_classification.codebook.behavior_codebook import (
+    infer_behavior_codes,
+    line_jsons_to_label_matrix,
+    sort_behavior_codes,
+)
+
+FEATURE_STORE_DIR = "outputs/feature_store"
+PARTITION_COLS = ("prompt_version", "model", "source")
+# transcript_id is the row of the csv the labels were made from; transcript_sha256 identifies the
+# transcript itself, so labels can be joined to other csvs (see match_transcript_keys)
+KEY_COLS = ("transcript_id", "transcript_sha256", "line_no", "speaker")
+UNKNOWN_PARTITION_VALUE = "unknown"
+
+# ChatGPT path: "<ns>__chatgpt__feat_out_v7.json" (or "..._v7_00012.json" per call);
+# Gemini path (appended records): "<ns>__feature_extraction_out_v7.json"
+_PART_PREFIX = "part-"
+_PART_WRITE_NS_RE = re.compile(rf"^{_PART_PREFIX}(\d+)-")
+_OUTPUT_FILENAME_RE = re.compile(r"^(\d+)__(?:([a-z0-9]+)__feat_out|feature_extraction_out)_(v\d+)(?:_(\d+))?\.jsonl?$")
+
+
+def transcript_key(transcript_text: str) -> str:
+    """Stable id of a transcript: the sha256 of its text (the same digest names its cleaned transcript)."""
+    return hashlib.sha256(str(transcript_text).encode("utf-8")).hexdigest()
+
+
+# -- Reading Raw Behavior Outputs --
+
+def parse_behavior_output_filename(path: str) -> Optional[dict]:
+    """
+    Output filename -> {"created_ns", "llm", "prompt_version", "transcript_id" (None if not in the name)}.
+    Returns None for names not following the convention.
+    """
+    m = _OUTPUT_FILENAME_RE.match(os.path.basename(path))
+    if m is None:
+        return None
+    return {
+        "created_ns": int(m.group(1)),
+        "llm": m.group(2) or "gemini",
+        "prompt_version": m.group(3),
+        "transcript_id": int(m.group(4)) if m.group(4) is not None else None,
+    }
+
+
+def iter_json_values(text: str) -> Iterator[object]:
+    """
+    Yield every top-level json value in `text`. Handles a single json document, jsonl, and the
+    Gemini path's appended records (pretty-printed json values separated by newlines).
+    """
+    decoder = json.JSONDecoder()
+    pos, n = 0, len(text)
+    while True:
+        while pos < n and text[pos].isspace():
+            pos += 1
+        if pos >= n:
+            return
+        value, pos = decoder.raw_decode(text, pos)
+        yield value
+
+
+def read_behavior_output_calls(path: str) -> List[List[dict]]:
+    """
+    One list of per-line behavior objects per call in a raw output file.
+    - .json written by write_json_to_file: one call (a list of line objects)
+    - .jsonl / appended records: one call per top-level value
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        values = list(iter_json_values(f.read()))
+    if len(values) == 1 and isinstance(values[0], list) and all(isinstance(v, dict) for v in values[0]):
+        values = [values[0]]
+    calls = []
+    for value in values:
+        items = value if isinstance(value, list) else [value]
+        calls.append([o for o in items if isinstance(o, dict) and "behaviors_exhibited" in o])
+    return calls
+
+
+# -- Writing --
+
+def calls_to_table(
+    calls: Dict[int, Sequence[dict]],
+    *,
+    transcript_texts: Dict[int, str],
+    prompt_version: str,
+    model: str,
+    source: Optional[str] = None,
+    codes: Optional[Sequence[str]] = None,
+) -> pa.Table:
+    """
+    {transcript_id: [line objs]} -> one row per (transcript_id, line_no, speaker) with one bool
+    column per behavior code (codes inferred from the data if not given), plus partition columns.
+    line_no starts at 1, matching cleaned transcript artifacts.
+    transcript_texts: {transcript_id: transcript text} for every call, stored as transcript_sha256.
+    """
+    missing = [tid for tid in calls if tid not in transcript_texts]
+    if missing:
+        raise ValueError(f"No transcript text for transcript_id(s) {missing[:10]}; it is needed for transcript_sha256")
+    all_lines = [o for line_objs in calls.values() for o in line_objs]
+    codes = sort_behavior_codes(codes) if codes is not None else infer_behavior_codes(all_lines)
+    n_rows = len(all_lines)
+
+    transcript_ids = np.concatenate(
+        [np.full(len(line_objs), tid, dtype=np.int32) for tid, line_objs in calls.items()]
+    ) if calls else np.zeros(0, dtype=np.int32)
+    line_nos = np.concatenate(
+        [np.arange(1, len(line_objs) + 1, dtype=np.int32) for line_objs in calls.values()]
+    ) if calls else np.zeros(0, dtype=np.int32)
+    labels = line_jsons_to_label_matrix(all_lines, codes)
+
+    columns = {
+        "transcript_id": pa.array(transcript_ids),
+        "transcript_sha256": pa.array(
+            [transcript_key(transcript_texts[tid]) for tid, line_objs in calls.items() for _ in line_objs],
+            type=pa.string(),
+        ),
+        "line_no": pa.array(line_nos),
+        "speaker": pa.array([str(o.get("speaker", "")) for o in all_lines], type=pa.string()).dictionary_encode(),
+    }
+    for j, code in enumerate(codes):
+        columns[code] = pa.array(labels[:, j], type=pa.bool_())
+    for col, value in zip(PARTITION_COLS, (prompt_version, model, source)):
+        columns[col] = pa.array([value or UNKNOWN_PARTITION_VALUE] * n_rows, type=pa.string())
+    return pa.table(columns)
+
+
+def write_feature_store(table: pa.Table, root_dir: str = FEATURE_STORE_DIR) -> List[str]:
+    """
+    Append `table` to the hive-partitioned store (prompt_version=.../model=.../source=...).
+    Existing files are never rewritten; each write adds files named by its write time, and on
+    read the newest write of a transcript supersedes older ones (see read_feature_store), so
+    rerunning transcripts replaces their rows instead of duplicating them. Returns the paths.
+    """
+    missing = [c for c in (*KEY_COLS, *PARTITION_COLS) if c not in table.column_names]
+    if missing:
+        raise ValueError(f"Feature store table is missing required columns: {missing}")
+    written = []
+    ds.write_dataset(
+        table,
+        root_dir,
+        format="parquet",
+        partitioning=list(PARTITION_COLS),
+        partitioning_flavor="hive",
+        basename_template=f"{_PART_PREFIX}{time.time_ns()}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_visitor=lambda f: written.append(f.path),
+    )
+    return written
+
+
+def write_calls_to_feature_store(
+    calls: Dict[int, Sequence[dict]],
+    *,
+    transcript_texts: Dict[int, str],
+    prompt_version: str,
+    model: str,
+    source: Optional[str] = None,
+    codes: Optional[Sequence[str]] = None,
+    root_dir: str = FEATURE_STORE_DIR,
+) -> List[str]:
+    if not any(calls.values()):
+        return []
+    table = calls_to_table(
+        calls, transcript_texts=transcript_texts, prompt_version=prompt_version, model=model, source=source, codes=codes
+    )
+    return write_feature_store(table, root_dir)
+
+
+# -- Reading --
+
+FilterValue = Union[str, int, Sequence[Union[str, int]]]
+
+
+def build_filter(filters: Optional[Dict[str, FilterValue]]) -> Optional[ds.Expression]:
+    """{"prompt_version": "v7", "transcript_id": [1, 2]} -> pyarrow expression (AND of == / isin)."""
+    if not filters:
+        return None
+    expr = None
+    for col, value in filters.items():
+        if isinstance(value, (list, tuple, set, np.ndarray)):
+            term = ds.field(col).isin(list(value))
+        else:
+            term = ds.field(col) == value
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def open_feature_store(root_dir: str = FEATURE_STORE_DIR) -> ds.Dataset:
+    """
+    Memory-mapped, hive-partitioned dataset over the store. Files written with different
+    codebooks have different code columns, so the schema is the union of all file footers
+    (codes missing from a file read as null). Files written before transcript_sha256 was stored
+    read it as null.
+    """
+    if not os.path.isdir(root_dir):
+        raise FileNotFoundError(f"Feature store directory does not exist: {root_dir}")
+    filesystem = pafs.LocalFileSystem(use_mmap=True)
+    partitioning = ds.partitioning(
+        pa.schema([(c, pa.string()) for c in PARTITION_COLS]), flavor="hive"
+    )
+    dataset = ds.dataset(root_dir, format="parquet", partitioning=partitioning, filesystem=filesystem)
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    if len(schemas) > 1 or "transcript_sha256" not in dataset.schema.names:
+        schema = pa.unify_schemas([dataset.schema, *schemas, pa.schema([("transcript_sha256", pa.string())])])
+        dataset = ds.dataset(root_dir, format="parquet", partitioning=partitioning, filesystem=filesystem, schema=schema)
+    return dataset
+
+
+def _write_ns(path: str) -> int:
+    m = _PART_WRITE_NS_RE.match(os.path.basename(path))
+    return int(m.group(1)) if m else 0
+
+
+def read_feature_store(
+    root_dir: str = FEATURE_STORE_DIR,
+    *,
+    filters: Optional[Dict[str, FilterValue]] = None,
+    codes: Optional[Iterable[str]] = None,
+    columns: Optional[Sequence[str]] = None,
+    latest_only: bool = True,
+) -> pa.Table:
+    """
+    Load a subset of the store. `filters` is pushed down to partition pruning and parquet row
+    group statistics, so only matching files/row groups are read. `codes` restricts the behavior
+    columns (key and partition columns are always included); `columns` overrides the selection.
+
+    With latest_only, a transcript written more than once to a partition (a rerun) is read only
+    from its newest write; latest_only=False returns every stored row.
+    """
+    dataset = open_feature_store(root_dir)
+    if columns is None and codes is not None:
+        columns = [*KEY_COLS, *PARTITION_COLS, *codes]
+    expr = build_filter(filters)
+    if not latest_only:
+        return dataset.to_table(columns=list(columns) if columns is not None else None, filter=expr)
+
+    # files newest first; a (partition, transcript_id) seen in a newer file is dropped from older ones
+    read_cols = None if columns is None else list(dict.fromkeys([*columns, "transcript_id"]))
+    fragments = sorted(dataset.get_fragments(filter=expr), key=lambda f: _write_ns(f.path), reverse=True)
+    seen: Dict[tuple, set] = {}
+    tables = []
+    for fragment in fragments:
+        part = ds.get_partition_keys(fragment.partition_expression)
+        key = tuple(part.get(c) for c in PARTITION_COLS)
+        table = fragment.to_table(schema=dataset.schema, columns=read_cols, filter=expr)
+        if table.num_rows == 0:
+            continue
+        ids = table.column("transcript_id")
+        done = seen.setdefault(key, set())
+        if done:
+            table = table.filter(pc.invert(pc.is_in(ids, value_set=pa.array(sorted(done), type=ids.type))))
+        done.update(pc.unique(ids).to_pylist())
+        tables.append(table)
+    table = pa.concat_tables(tables) if tables else dataset.to_table(columns=read_cols, filter=expr)
+    return table.select(list(columns)) if columns is not None else table
+
+
+def transcript_keys(table: pa.Table, transcript_ids: Sequence[int]) -> List[Optional[str]]:
+    """transcript_sha256 of each of transcript_ids in a store table (None where it was never stored)."""
+    pairs = table.select(["transcript_id", "transcript_sha256"]).group_by(["transcript_id"]).aggregate(
+        [("transcript_sha256", "max")]
+    )
+    key_by_id = dict(zip(pairs.column("transcript_id").to_pylist(), pairs.column("transcript_sha256_max").to_pylist()))
+    return [key_by_id.get(int(t)) for t in transcript_ids]
+
+
+def match_transcript_keys(keys: Sequence[Optional[str]], transcripts: Sequence[str]) -> np.ndarray:
+    """
+    Row of `transcripts` (e.g. a csv's transcripts column) holding each transcript_sha256 in
+    `keys`, or -1 where it isn't there (or the key is None). Duplicate texts match their first row.
+    """
+    row_by_key = {}
+    for i, text in enumerate(transcripts):
+        row_by_key.setdefault(transcript_key(text), i)
+    return np.array([row_by_key.get(k, -1) if k is not None else -1 for k in keys], dtype=np.int64)
+
+
+def code_columns(table: pa.Table) -> List[str]:
+    """Behavior code columns of a store table, in natural code order."""
+    return sort_behavior_codes(c for c in table.column_names if c not in (*KEY_COLS, *PARTITION_COLS))
+
+
+def table_to_label_matrix(table: pa.Table, codes: Optional[Sequence[str]] = None) -> np.ndarray:
+    """(n_rows, n_codes) bool matrix; nulls (code absent from that file's codebook) read as False."""
+    codes = list(codes) if codes is not None else code_columns(table)
+    mat = np.zeros((table.num_rows, len(codes)), dtype=bool)
+    for j, code in enumerate(codes):
+        if code in table.column_names:
+            mat[:, j] = table.column(code).fill_null(False).to_numpy(zero_copy_only=False)
+    return mat
@@ -1,4 +1,6 @@
+import os
 from typing import Union, List
+import numpy as np
 from pydub import AudioSegment
 from src.ml_scam_classification.utils.file_models import AudioFilePath, DirPath, FileExtension, NonEmptyDir, JSONFilePath, DirPathAlwaysRequireExists
 
@@ -17,6 +19,7 @@ from src.ml_scam_classification.utils.file_utils import (
     get_paths_to_all_files_in_folder,
     get_file_extension_from_path_str
 )
+from src.ml_scam_classification.utils.vad_segmentation import find_pause_cut_points
 
 
 def get_supported_transcription_model_str_ids():
@@ -34,7 +37,7 @@ def get_supported_transcription_model_str_ids():
     except:
         raise_err()
     
-    list_supported_model_ids = None
+    list_supported_model_ids = []
     try:
         for supported_model_entry in list_supported_models_entries:
             list_supported_model_ids.append(supported_model_entry["transcription_model_id_string"])
@@ -97,7 +100,7 @@ def transcribe_audio_file(
         max_supported_file_size_bytes: int,
         supported_sampling_rates: Union[List[int]],
         any_sampling_rate_supported: bool = False, # must explicitly set to true to allow supported_sampling_rates to be empty
-        model: str = get_supported_transcription_model_str_ids[0],
+        model: str = "gpt-4o-transcribe",  # first entry of supported_transcription_models.json
         prompt: Union[str, None] = None,
         per_file_transcripts_folder_suffix: str = "_transcription",
         transcript_file_suffix: str = "_transcription_pt"
@@ -114,9 +117,9 @@ def transcribe_audio_file(
     # |     CONVERT TO EXPECTED FORMAT FOR TRANSCRIPTION MODEL      |
     # |_____________________________________________________________|
     # Need to segment audio to reduce to file size supported by audio transcription model
-    # using Silero VAD DNN to find non-word pauses to avoid clipping words
+    # using a voice activity detector (energy + zero-crossing rate) to find non-word pauses to avoid clipping words
 
-    # Silero VAD (using to identify non-speech pauses) supports 8000 Hz and 16000 Hz sampling rates
+    # The VAD thresholds are tuned for telephone/speech sampling rates (8000 Hz and 16000 Hz)
     
     # Convert <= 8000 Hz files to 8000 Hz, and > 8000 Hz to 16000 to preserve as much audio information as possible
     convert_audio_object_to_supported_sampling_rate
@@ -130,15 +133,28 @@ def transcribe_audio_file(
 
     # --- COMPUTE SEGMENT BOUNDARY LOCATIONS ---
     #           Segments must be less than the 25 MB limit required by OpenAI Whisper transcription model
-    #           Cutting off words will mess up transcription, so using Silero VAD to ensure audio is clipped between words
-    
-    # compute rough segment boundary timestamps (may change if a word would be cut off)
+    #           Cutting off words will mess up transcription, so using a VAD to ensure audio is clipped between words
+    #           (frame energy + zero-crossing rate over 30ms frames, see vad_segmentation - no model download)
 
+    # compute rough segment boundary timestamps (may change if a word would be cut off) from the size limit
+    bytes_per_second = os.path.getsize("output.wav") / audio.duration_seconds
+    max_chunk_s = max_supported_file_size_bytes / bytes_per_second
 
-    # For each rough segment boundary, find midpoint timestamp of the 30ms non-voice audio segment closest to the segment boundary
+    # For each rough segment boundary, find midpoint timestamp of the non-voice audio segment closest to the segment boundary
+    samples = np.array(audio.set_channels(1).get_array_of_samples())
+    cut_points = find_pause_cut_points(samples, new_sampling_rate, max_chunk_s)
 
     # --- SEGMENT AUDIO FILE INTO CHUNKS ---
     # segment audio file into chunks based on finalized segment boundaries in temp folder for transcription
+    file_stem = os.path.splitext(os.path.basename(str(input_audio_file_path)))[0]
+    chunks_dirpath = os.path.join(str(output_text_dirpath), f"{file_stem}{per_file_transcripts_folder_suffix}", "audio_chunks")
+    os.makedirs(chunks_dirpath, exist_ok=True)
+    boundaries_ms = [0, *(int(cut) * 1000 // new_sampling_rate for cut in cut_points), len(audio)]
+    chunk_paths = []
+    for chunk_index, (start_ms, end_ms) in enumerate(zip(boundaries_ms[:-1], boundaries_ms[1:])):
+        chunk_path = os.path.join(chunks_dirpath, f"{file_stem}_chunk{chunk_index:03d}.{audio_format}")
+        audio[start_ms:end_ms].export(chunk_path, format=audio_format)
+        chunk_paths.append(chunk_path)
 
     #  _____________________________________________________________
     # |          TRANSCRIBE AUDIO AND STORE TRANSCRIPTS             |
@@ -158,7 +174,7 @@ def transcribe_audio_clips_in_folder(
         max_supported_file_size_bytes: int,
         supported_sampling_rates: Union[List[int]],
         any_sampling_rate_supported: bool = False, # must explicitly set to true to allow supported_sampling_rates to be empty
-        model: str = get_supported_transcription_model_str_ids[0],
+        model: str = "gpt-4o-transcribe",  # first entry of supported_transcription_models.json
         prompt: Union[str, None] = None,
         per_file_transcripts_folder_suffix: str = "_transcription",
         transcript_file_suffix: str = "_transcription_pt",
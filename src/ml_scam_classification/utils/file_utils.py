@@ -206,7 +206,20 @@ class WarningTracker:
             print("\n-\n")
             self._warning_given = True
 
+_cout_logging_preference_cache = None
+
 def cout_logging_enabled():
+    """
+    Whether cout_logging is on (.env variable "cout_log"). The .env file is only read
+    on the first call; the result is cached for the rest of the process.
+    """
+    global _cout_logging_preference_cache
+    if _cout_logging_preference_cache is None:
+        _cout_logging_preference_cache = _read_cout_logging_preference()
+    return _cout_logging_preference_cache
+
+
+def _read_cout_logging_preference():
     load_dotenv()
     cout_logging_preference = os.getenv("cout_log")
     
@@ -0,0 +1,155 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+# Voice activity detection from frame energy and zero-crossing rate, used to cut long recordings
+# into transcription-sized chunks at pauses between words (so no word is clipped at a boundary).
+# Pure NumPy: no model download, and hours of 16 kHz audio take seconds on one core.
+
+FRAME_MS = 30
+FRAMES_PER_BLOCK = 20_000  # frames featurized per vectorized block (10 minutes at 30 ms): bounds peak memory
+
+
+def frame_energy_and_zcr(samples: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per non-overlapping frame of frame_ms: (log energy in dB, zero-crossing rate in [0, 1]).
+    samples: 1-D mono PCM (any int or float dtype); a trailing partial frame is ignored.
+    """
+    samples = np.asarray(samples)
+    if samples.ndim != 1:
+        raise ValueError(f"samples must be 1-D mono audio, got shape {samples.shape}")
+    frame_len = int(sample_rate * frame_ms / 1000)
+    if frame_len < 2:
+        raise ValueError(f"frame_ms={frame_ms} is too short at sample_rate={sample_rate}")
+    n_frames = len(samples) // frame_len
+    frames = samples[: n_frames * frame_len].reshape(n_frames, frame_len)  # a view: no copy
+
+    energy_db = np.empty(n_frames, dtype=np.float32)
+    zcr = np.empty(n_frames, dtype=np.float32)
+    for start in range(0, n_frames, FRAMES_PER_BLOCK):
+        block = frames[start:start + FRAMES_PER_BLOCK]
+        as_float = block.astype(np.float32)
+        power = np.einsum("ij,ij->i", as_float, as_float) / frame_len
+        energy_db[start:start + len(block)] = 10.0 * np.log10(power + 1e-10)
+        sign = np.signbit(block)
+        zcr[start:start + len(block)] = np.count_nonzero(sign[:, 1:] != sign[:, :-1], axis=1) / (frame_len - 1)
+    return energy_db, zcr
+
+
+def speech_frames(
+    energy_db: np.ndarray,
+    zcr: np.ndarray,
+    *,
+    noise_percentile: float = 10.0,
+    speech_margin_db: float = 12.0,
+    unvoiced_margin_db: float = 6.0,
+    unvoiced_min_zcr: float = 0.25,
+    hangover_frames: int = 3,
+) -> np.ndarray:
+    """
+    Bool mask of frames containing speech. The noise floor is a low percentile of frame energy,
+    so the thresholds adapt to each recording's level:
+    - voiced speech: energy at least speech_margin_db above the floor;
+    - unvoiced speech (fricatives: "s", "f", "sh"): quieter, but at least unvoiced_margin_db above
+      the floor with a high zero-crossing rate.
+    Speech is then extended by hangover_frames on both sides, so word onsets / tails that fall
+    under the thresholds are not treated as pause.
+    """
+    if energy_db.size == 0:
+        return np.zeros(0, dtype=bool)
+    floor_db = np.percentile(energy_db, noise_percentile)
+    speech = (energy_db > floor_db + speech_margin_db) | (
+        (energy_db > floor_db + unvoiced_margin_db) & (zcr > unvoiced_min_zcr)
+    )
+    if hangover_frames > 0:
+        # dilation: a frame is speech if any frame within hangover_frames of it is
+        counts = np.convolve(speech.astype(np.int32), np.ones(2 * hangover_frames + 1, dtype=np.int32), mode="same")
+        speech = counts > 0
+    return speech
+
+
+def pause_midpoints(speech: np.ndarray, *, min_pause_frames: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """(midpoint frame, length in frames) of every run of >= min_pause_frames non-speech frames."""
+    padded = np.concatenate(([True], speech, [True]))
+    edges = np.diff(padded.astype(np.int8))
+    starts = np.flatnonzero(edges == -1)  # speech -> pause
+    ends = np.flatnonzero(edges == 1)     # pause -> speech (exclusive)
+    lengths = ends - starts
+    keep = lengths >= min_pause_frames
+    return (starts[keep] + ends[keep]) // 2, lengths[keep]
+
+
+def find_pause_cut_points(
+    samples: np.ndarray,
+    sample_rate: int,
+    max_chunk_s: float,
+    *,
+    frame_ms: int = FRAME_MS,
+    target_fill: float = 0.9,
+    min_pause_ms: int = 90,
+    **speech_kwargs,
+) -> np.ndarray:
+    """
+    Sample indices at which to cut the audio so every chunk is at most max_chunk_s long,
+    cutting in pauses between words.
+
+    Rough boundaries are spaced evenly, for chunks of about target_fill * max_chunk_s (the
+    slack lets each cut move to a pause). Each boundary then moves to the midpoint of the
+    nearest pause (>= min_pause_ms of non-speech, see speech_frames) that keeps this chunk and
+    the rest of the audio within max_chunk_s. If no pause is in reach, the cut goes in the
+    quietest frame in reach instead. Cuts only search within that slack of their rough
+    boundary, so fallback cuts don't drift towards the end of the audio. Returns the interior
+    cut points, ascending (empty if the audio already fits in one chunk).
+    """
+    if max_chunk_s <= 0:
+        raise ValueError("max_chunk_s must be > 0")
+    if not 0 < target_fill <= 1:
+        raise ValueError("target_fill must be in (0, 1]")
+    frame_len = int(sample_rate * frame_ms / 1000)
+    n_samples = len(samples)
+    max_chunk_frames = int(max_chunk_s * sample_rate) // frame_len
+    if n_samples <= max_chunk_s * sample_rate:
+        return np.zeros(0, dtype=np.int64)
+    if max_chunk_frames < 2:
+        raise ValueError(f"max_chunk_s={max_chunk_s} is shorter than two {frame_ms} ms frames")
+
+    energy_db, zcr = frame_energy_and_zcr(samples, sample_rate, frame_ms)
+    speech = speech_frames(energy_db, zcr, **speech_kwargs)
+    pauses, _ = pause_midpoints(speech, min_pause_frames=max(1, math.ceil(min_pause_ms / frame_ms)))
+
+    n_frames = math.ceil(n_samples / frame_len)  # a trailing partial frame still has to land in a chunk
+    last_cut = (n_samples - 1 - frame_len // 2) // frame_len  # last frame whose midpoint is inside the audio
+    # the first chunk loses half a frame to the mid-frame cut, so the chunks must cover n_frames + 1 between them,
+    # and every cut needs a frame of its own (a tiny target_fill can't ask for more chunks than that)
+    n_chunks = min(
+        max(math.ceil(n_frames / (max_chunk_frames * target_fill)), math.ceil((n_frames + 1) / max_chunk_frames)),
+        last_cut + 2,
+    )
+    # how far a cut may move from its rough boundary: the room target_fill leaves in each chunk
+    slack = max(1, max_chunk_frames - math.ceil(n_frames / n_chunks))
+    cuts = []
+    prev = -1  # cuts fall mid-frame, so the start of the audio counts as half a frame before frame 0
+    for k in range(1, n_chunks):
+        rough = round(n_frames * k / n_chunks)
+        # this chunk must end within max_chunk_frames of the previous cut, the chunks left after it
+        # must still be able to cover the rest of the audio, and each of them needs a frame to cut in
+        lo = max(prev + 1, n_frames - (n_chunks - k) * max_chunk_frames)
+        hi = min(prev + max_chunk_frames, last_cut - (n_chunks - 1 - k))
+        # search near the rough boundary only, so fallback cuts can't drift towards the end of the audio
+        if max(lo, rough - slack) <= min(hi, rough + slack):
+            lo, hi = max(lo, rough - slack), min(hi, rough + slack)
+        i, j = np.searchsorted(pauses, [lo, hi + 1])
+        if i < j:
+            candidates = pauses[i:j]
+            cut = int(candidates[np.argmin(np.abs(candidates - rough))])
+        elif lo < min(hi + 1, len(energy_db)):
+            cut = lo + int(np.argmin(energy_db[lo:hi + 1]))
+        else:
+            cut = lo
+        cuts.append(cut)
+        prev = cut
+    cut_samples = np.asarray(cuts, dtype=np.int64) * frame_len + frame_len // 2
+    if not (np.all(np.diff(cut_samples) > 0) and (cut_samples.size == 0 or 0 < cut_samples[0] and cut_samples[-1] < n_samples)):
+        raise RuntimeError(f"Cut points must be strictly increasing and inside the audio ({n_samples} samples), got {cut_samples}")
+    return cut_samples
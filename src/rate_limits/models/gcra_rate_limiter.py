@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+from typing import Optional
+from src.general_file_utils.utils.pkl import load_pkl, make_pkl_file, overwrite_pkl
+from src.ml_scam_classification.utils.timestamps import is_unix_timestamp_ns
+from src.rate_limits.models.limiter_metrics import LimiterMetrics
+from src.rate_limits.models.rate_limiter import NS_PER_MINUTE, _require, _rpm_from_filename_fast
+
+class GCRARateLimiter:
+    """
+    Enforce an RPM limit with the generic cell rate algorithm (GCRA). The whole state is one int:
+    the theoretical arrival time (TAT, unix ns) of the next request, so memory, the persisted
+    pickle and startup validation are O(1) whatever the rpm. Drop-in for RateLimiter (rl=...).
+    - Requests are spaced 60s / rpm apart; up to `burst` may go back to back after an idle
+      period. burst=1 paces requests evenly and, like RateLimiter, never allows more than rpm
+      requests in any 60s window; a burst of b allows up to rpm + b - 1 in a window.
+    - Pickle file stores: int TAT. The filename must end in "gcra<rpm>.pkl".
+    - Call .wait() immediately before your rate-limited action.
+    - requests_per_log_write: write the state to disk after this many requests.
+    - epsilon_s: small cushion (seconds) added only when sleeping.
+    - Thread-safe: a permit is reserved under the lock and the caller sleeps outside it, so
+      callers are granted permits in arrival order without queueing behind each other's sleeps.
+    - .metrics (LimiterMetrics): permits, wait times and time at capacity; see limiter_metrics.
+    """
+
+    __slots__ = (
+        "rpm",
+        "burst",
+        "log_path",
+        "print_updates",
+        "_tat_ns",
+        "_interval_ns",
+        "_tolerance_ns",
+        "_requests_per_log_write",
+        "_requests_since_log_write",
+        "_epsilon_ns",
+        "_lock",
+        "metrics",
+    )
+
+    def __init__(
+        self,
+        rpm: int,
+        log_path: str,
+        *,
+        burst: int = 1,
+        create_pkl_w_state: bool = False,
+        print_updates: bool = True,
+        requests_per_log_write: int = 1,
+        epsilon_s: float = 0.001,  # 1 ms cushion
+    ):
+        _require(isinstance(rpm, int) and rpm > 0, "rpm (requests per minute) must be a positive int.")
+        _require(isinstance(burst, int) and 1 <= burst <= rpm, "burst must be an int in [1, rpm].")
+        _require(isinstance(log_path, str), "log_path must be of type: str")
+
+        directory, log_filename = os.path.split(log_path)
+        directory = directory or "."
+        _require(os.path.isdir(directory), f"Directory does not exist: {directory}")
+
+        file_rpm = _rpm_from_filename_fast(log_filename, marker="gcra")
+        _require(file_rpm == rpm, "Passed rpm must match rpm in log filename")
+
+        if not create_pkl_w_state:
+            _require(os.path.exists(log_path),
+                     "log_path must exist. Please create the log first with create_pkl_w_state=True.")
+
+        _require(isinstance(print_updates, bool), "print_updates must be type: bool")
+        _require(isinstance(requests_per_log_write, int) and requests_per_log_write >= 1,
+                 "requests_per_log_write must be int >= 1")
+        _require(isinstance(epsilon_s, (int, float)) and epsilon_s >= 0.0,
+                 "epsilon_s must be a non-negative number")
+
+        if create_pkl_w_state:
+            tat_ns = time.time_ns()
+            make_pkl_file(path=log_path, data=tat_ns)
+        else:
+            tat_ns = load_pkl(log_path)
+            _require(is_unix_timestamp_ns(tat_ns),
+                     f"Loaded state from .pkl must be a unix timestamp (ns). Loaded from:\n{log_path}", err=TypeError)
+
+        self.rpm = rpm
+        self.burst = burst
+        self.log_path = log_path
+        self.print_updates = print_updates
+        self._tat_ns = tat_ns
+        self._interval_ns = -(-NS_PER_MINUTE // rpm)  # ceil: never faster than rpm
+        self._tolerance_ns = (burst - 1) * self._interval_ns
+        self._requests_per_log_write = requests_per_log_write
+        self._requests_since_log_write = 0
+        self._epsilon_ns = int(epsilon_s * 1e9)
+        self._lock = threading.Lock()
+        self.metrics = LimiterMetrics(os.path.splitext(log_filename)[0], rpm)
+
+    def _write_log_if_needed(self):
+        self._requests_since_log_write += 1
+        if self._requests_since_log_write >= self._requests_per_log_write:
+            overwrite_pkl(path=self.log_path, new_data=self._tat_ns)
+            self._requests_since_log_write = 0
+
+    def seconds_until_available(self) -> float:
+        """How long wait() would currently sleep (0.0 if a permit is free now). Does not take a permit."""
+        with self._lock:
+            now = time.time_ns()
+            return max(0.0, (max(self._tat_ns, now) - self._tolerance_ns - now) / 1e9)
+
+    def wait(self, *, timeout_s: Optional[float] = None):
+        """
+        Block until a permit is granted. With timeout_s, raise TimeoutError (without taking a
+        permit) if it can't be granted within timeout_s seconds, instead of sleeping past it.
+        """
+        _require(timeout_s is None or timeout_s >= 0, "timeout_s must be None or >= 0")
+        with self._lock:
+            now = time.time_ns()
+            tat = max(self._tat_ns, now)
+            wait_ns = tat - self._tolerance_ns - now  # >0 means we must wait
+            if wait_ns > 0:
+                # Add epsilon cushion *only when we must wait*.
+                wait_ns += self._epsilon_ns
+                if timeout_s is not None and wait_ns > timeout_s * 1e9:
+                    self.metrics.record_timeout()
+                    raise TimeoutError(f"Next rate limit permit is {wait_ns / 1e9:.3f}s away, past the timeout")
+            # Reserve the permit now; the sleep happens outside the lock.
+            self._tat_ns = tat + self._interval_ns
+            self._write_log_if_needed()
+            self.metrics.record_permit(max(0, wait_ns) / 1e9)
+
+        if wait_ns > 0:
+            if self.print_updates:
+                print(f"Waiting {wait_ns / 1e9:.6f} seconds to follow rate limits...")
+            time.sleep(wait_ns / 1e9)
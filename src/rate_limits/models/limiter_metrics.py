@@ -0,0 +1,260 @@
+import heapq
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from src.llm_tools.structured_logging import get_logger
+
+log = get_logger("limiter_metrics")
+
+# Upper bounds (seconds) of the wait-time histogram buckets; a final +Inf bucket is implied
+WAIT_BUCKETS_S = (0.0, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+METRICS_FORMATS = ("json", "prometheus")
+MIN_WAIT_S = 0.001  # shorter waits (lock handoff, bookkeeping) are recorded as no wait
+WINDOW_S = 60
+
+
+class LimiterMetrics:
+    """
+    Counters kept by every rate limiter (rl.metrics), cheap enough to record on every wait():
+    - permits granted, permits that had to wait, timeouts (wait(timeout_s=...) gave up)
+    - total / max wait and a histogram of waits (WAIT_BUCKETS_S)
+    - time at capacity: wall time during which a caller was waiting for a permit
+      (overlapping waits are counted once)
+    - window utilization: permits granted in the last 60s (or reserved for the next 60s) over rpm.
+      Per-second counts in a ring covering the past and next 60s; permits reserved further ahead
+      wait in a heap until their second comes within reach, so they can't reset a live slot.
+    snapshot() returns all of it as a plain dict. Thread-safe.
+    """
+
+    __slots__ = (
+        "name",
+        "rpm",
+        "_lock",
+        "_created",
+        "_capacity_until",
+        "n_permits",
+        "n_waited",
+        "n_timeouts",
+        "wait_s_total",
+        "wait_s_max",
+        "time_at_capacity_s",
+        "_bucket_counts",
+        "_window_counts",
+        "_window_secs",
+        "_pending_secs",
+    )
+
+    def __init__(self, name: str, rpm: int):
+        self.name = name
+        self.rpm = rpm
+        self._lock = threading.Lock()
+        self._created = time.monotonic()
+        self._capacity_until = self._created
+        self.n_permits = 0
+        self.n_waited = 0
+        self.n_timeouts = 0
+        self.wait_s_total = 0.0
+        self.wait_s_max = 0.0
+        self.time_at_capacity_s = 0.0
+        self._bucket_counts = [0] * (len(WAIT_BUCKETS_S) + 1)
+        self._window_counts = [0] * (2 * WINDOW_S)
+        self._window_secs = [-1] * (2 * WINDOW_S)
+        self._pending_secs = []  # heap of grant seconds too far ahead for the ring
+
+    def record_permit(self, wait_s: float, granted_at: Optional[float] = None) -> None:
+        """
+        A caller waited wait_s seconds for a permit granted at time.monotonic() == granted_at
+        (default: now + wait_s, for limiters that reserve a permit before sleeping).
+        """
+        if wait_s < MIN_WAIT_S:
+            wait_s = 0.0
+        if granted_at is None:
+            granted_at = time.monotonic() + wait_s
+        with self._lock:
+            self.n_permits += 1
+            sec, now_sec = int(granted_at), int(time.monotonic())
+            if sec >= now_sec + WINDOW_S:
+                heapq.heappush(self._pending_secs, sec)
+            elif sec > now_sec - WINDOW_S:  # older grants are already out of the window
+                self._count_permit_locked(sec)
+            self._drain_pending_locked(now_sec)
+            self._bucket_counts[bisect_left(WAIT_BUCKETS_S, wait_s)] += 1
+            if wait_s > 0:
+                self.n_waited += 1
+                self.wait_s_total += wait_s
+                self.wait_s_max = max(self.wait_s_max, wait_s)
+                self.time_at_capacity_s += max(0.0, granted_at - max(granted_at - wait_s, self._capacity_until))
+                self._capacity_until = max(self._capacity_until, granted_at)
+
+    def _count_permit_locked(self, sec: int) -> None:
+        slot = sec % len(self._window_secs)
+        if self._window_secs[slot] != sec:
+            self._window_secs[slot] = sec
+            self._window_counts[slot] = 0
+        self._window_counts[slot] += 1
+
+    def _drain_pending_locked(self, now_sec: int) -> None:
+        while self._pending_secs and self._pending_secs[0] < now_sec + WINDOW_S:
+            self._count_permit_locked(heapq.heappop(self._pending_secs))
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.n_timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            uptime_s = now - self._created
+            # reserved permits (granted_at in the future) already count against the window
+            self._drain_pending_locked(int(now))
+            n_window = sum(c for c, sec in zip(self._window_counts, self._window_secs) if sec > int(now) - WINDOW_S)
+            cumulative, buckets = 0, {}
+            for bound, count in zip(WAIT_BUCKETS_S + (float("inf"),), self._bucket_counts):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else f"{bound:g}"] = cumulative
+            return {
+                "limiter": self.name,
+                "rpm": self.rpm,
+                "uptime_s": uptime_s,
+                "n_permits": self.n_permits,
+                "n_waited": self.n_waited,
+                "n_timeouts": self.n_timeouts,
+                "wait_s_total": self.wait_s_total,
+                "wait_s_max": self.wait_s_max,
+                "wait_s_histogram": buckets,
+                # only elapsed capacity time; a wait still in progress counts up to now
+                "time_at_capacity_s": self.time_at_capacity_s - max(0.0, self._capacity_until - now),
+                "window_utilization": n_window / self.rpm,
+            }
+
+    def format_summary(self) -> str:
+        s = self.snapshot()
+        return (
+            f"{s['limiter']}: {s['n_permits']} permits, {s['n_waited']} waited "
+            f"({s['wait_s_total']:.1f}s total, max {s['wait_s_max']:.1f}s), "
+            f"{s['time_at_capacity_s']:.1f}s of {s['uptime_s']:.1f}s at capacity, "
+            f"window utilization {s['window_utilization']:.0%}, {s['n_timeouts']} timeouts"
+        )
+
+
+def format_prometheus(snapshots: Iterable[dict]) -> str:
+    """Snapshots -> Prometheus text exposition format (for the node_exporter textfile collector)."""
+    snapshots = list(snapshots)
+    lines = []
+
+    def _metric(name, kind, help_text, values):
+        lines.append(f"# HELP rate_limiter_{name} {help_text}")
+        lines.append(f"# TYPE rate_limiter_{name} {kind}")
+        for labels, value in values:
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"rate_limiter_{name}{{{label_str}}} {value}")
+
+    def _per_limiter(key):
+        return [({"limiter": s["limiter"]}, s[key]) for s in snapshots]
+
+    _metric("permits_total", "counter", "Permits granted.", _per_limiter("n_permits"))
+    _metric("waited_permits_total", "counter", "Permits that had to wait.", _per_limiter("n_waited"))
+    _metric("timeouts_total", "counter", "Waits that gave up at their timeout.", _per_limiter("n_timeouts"))
+    _metric("at_capacity_seconds_total", "counter", "Wall time with callers waiting for a permit.",
+            _per_limiter("time_at_capacity_s"))
+    _metric("window_utilization", "gauge", "Permits granted in the last 60s over rpm.", _per_limiter("window_utilization"))
+    _metric("rpm", "gauge", "Configured requests per minute.", _per_limiter("rpm"))
+    lines.append("# HELP rate_limiter_wait_seconds Time callers waited for a permit.")
+    lines.append("# TYPE rate_limiter_wait_seconds histogram")
+    for s in snapshots:
+        for le, count in s["wait_s_histogram"].items():
+            lines.append(f'rate_limiter_wait_seconds_bucket{{limiter="{s["limiter"]}",le="{le}"}} {count}')
+        lines.append(f'rate_limiter_wait_seconds_sum{{limiter="{s["limiter"]}"}} {s["wait_s_total"]}')
+        lines.append(f'rate_limiter_wait_seconds_count{{limiter="{s["limiter"]}"}} {s["n_permits"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_limiter_metrics(limiters: Iterable, path: str, fmt: str = "json") -> None:
+    """Write the metrics snapshot of every limiter to path, atomically (write + rename)."""
+    if fmt not in METRICS_FORMATS:
+        raise ValueError(f"Unknown metrics format: {fmt!r}. Expected one of {METRICS_FORMATS}")
+    snapshots = [rl.metrics.snapshot() for rl in limiters]
+    if fmt == "json":
+        text = json.dumps({"written_unix_s": time.time(), "limiters": snapshots}, indent=2)
+    else:
+        text = format_prometheus(snapshots)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class LimiterMetricsDumper:
+    """
+    Background thread writing write_limiter_metrics() every interval_s seconds (and once on stop()).
+    Each interval it also logs a saturation warning for limiters whose window utilization, or
+    fraction of the interval spent at capacity, reached saturation_threshold: the run is limiter-bound.
+    """
+
+    def __init__(
+        self,
+        limiters: Iterable,
+        path: str,
+        *,
+        fmt: str = "json",
+        interval_s: float = 15.0,
+        saturation_threshold: float = 0.9,
+    ):
+        if fmt not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format: {fmt!r}. Expected one of {METRICS_FORMATS}")
+        if not interval_s > 0:
+            raise ValueError(f"interval_s must be > 0, got {interval_s}")
+        self.limiters = list(limiters)
+        self.path = path
+        self.fmt = fmt
+        self.interval_s = interval_s
+        self.saturation_threshold = saturation_threshold
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._previous = {}
+
+    def _check_saturation(self) -> None:
+        for rl in self.limiters:
+            snap = rl.metrics.snapshot()
+            prev = self._previous.get(snap["limiter"])
+            self._previous[snap["limiter"]] = snap
+            if prev is None:
+                continue
+            elapsed_s = snap["uptime_s"] - prev["uptime_s"]
+            if elapsed_s <= 0:
+                continue
+            utilization = snap["window_utilization"]
+            at_capacity = (snap["time_at_capacity_s"] - prev["time_at_capacity_s"]) / elapsed_s
+            if max(utilization, at_capacity) >= self.saturation_threshold:
+                log.warning(
+                    "Rate limiter saturated",
+                    limiter=snap["limiter"],
+                    window_utilization=round(utilization, 3),
+                    at_capacity_fraction=round(at_capacity, 3),
+                    interval_s=round(elapsed_s, 1),
+                )
+
+    def dump(self) -> None:
+        write_limiter_metrics(self.limiters, self.path, self.fmt)
+        self._check_saturation()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.dump()
+
+    def start(self) -> "LimiterMetricsDumper":
+        self._check_saturation()  # baseline for the first interval
+        self._thread = threading.Thread(target=self._run, name="limiter-metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
@@ -0,0 +1,340 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import socket
+import threading
+import time
+from typing import Optional, Tuple, Union
+
+from src.rate_limits.models.limiter_metrics import LimiterMetrics
+from src.rate_limits.models.rate_limiter import _require
+
+# A Unix socket path, or a (host, port) tuple for TCP
+Address = Union[str, Tuple[str, int]]
+
+
+class PermitCoordinator:
+    """
+    Shares one rate limit (rpm permits per window_s) between many processes by leasing batches
+    of permits over a Unix or TCP socket (newline-delimited json), so workers don't coordinate
+    on every request.
+
+    - A lease is up to max_lease_size permits, usable by its holder until it expires
+      (lease_ttl_s). Lease sizes are capped at a fair share: the permits one window's rate
+      allows in lease_ttl_s, split between the clients active in that time (never below 1).
+    - Every leased permit counts against the window until window_s after its last possible use:
+      the lease's expiry, or the last use the client reports when it returns the lease. Unused
+      permits are credited back immediately. So no window_s window can ever contain more than
+      rpm used permits, and a client that dies just holds its lease until it expires.
+    - Lease requests are served in arrival order; a request waits until at least one permit is free.
+    Runs on a single asyncio event loop: serve(address), or start_in_thread(address).
+    """
+
+    def __init__(
+        self,
+        rpm: int,
+        *,
+        window_s: float = 60.0,
+        lease_ttl_s: float = 5.0,
+        max_lease_size: int = 100,
+    ):
+        _require(isinstance(rpm, int) and rpm > 0, "rpm (permits per window) must be a positive int.")
+        _require(window_s > 0 and lease_ttl_s > 0, "window_s and lease_ttl_s must be > 0")
+        _require(isinstance(max_lease_size, int) and max_lease_size >= 1, "max_lease_size must be an int >= 1")
+        self.rpm = rpm
+        self.window_s = window_s
+        self.lease_ttl_s = lease_ttl_s
+        self.max_lease_size = max_lease_size
+        self._outstanding = 0
+        self._leases = {}  # lease_id -> [free_at (monotonic), n permits still counted]
+        self._free_heap = []  # (free_at, lease_id); stale entries are skipped
+        self._client_last_seen = {}
+        self._lease_ids = itertools.count(1)
+        self._lock: Optional[asyncio.Lock] = None
+        self._released: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self.n_leases = 0
+        self.n_permits_leased = 0
+        self.n_permits_returned = 0
+
+    def _prune(self, now: float) -> None:
+        while self._free_heap and self._free_heap[0][0] <= now:
+            _, lease_id = heapq.heappop(self._free_heap)
+            entry = self._leases.get(lease_id)
+            if entry is not None and entry[0] <= now:
+                self._outstanding -= entry[1]
+                del self._leases[lease_id]
+
+    def _fair_share(self, client: str, now: float) -> int:
+        self._client_last_seen[client] = now
+        for c, seen in list(self._client_last_seen.items()):
+            if now - seen > 2 * self.lease_ttl_s:
+                del self._client_last_seen[c]
+        per_ttl = self.rpm * self.lease_ttl_s / self.window_s
+        return max(1, math.ceil(per_ttl / len(self._client_last_seen)))
+
+    async def lease(self, client: str, n: int, timeout_s: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """Lease up to n permits: (lease_id, n granted), or None if none became free within timeout_s."""
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                available = self.rpm - self._outstanding
+                if available >= 1:
+                    break
+                wait_s = self._free_heap[0][0] - now
+                if timeout_s is not None and now - start + wait_s > timeout_s:
+                    return None
+                # a returned lease can free permits before the next scheduled expiry
+                self._released.clear()
+                try:
+                    await asyncio.wait_for(self._released.wait(), timeout=wait_s)
+                except asyncio.TimeoutError:
+                    pass
+
+            granted = min(max(1, n), self.max_lease_size, self._fair_share(client, now), available)
+            lease_id = next(self._lease_ids)
+            free_at = now + self.lease_ttl_s + self.window_s
+            self._leases[lease_id] = [free_at, granted]
+            heapq.heappush(self._free_heap, (free_at, lease_id))
+            self._outstanding += granted
+            self.n_leases += 1
+            self.n_permits_leased += granted
+            return lease_id, granted
+
+    def release(self, lease_id: int, unused: int, last_used_ago_s: Optional[float] = None) -> None:
+        """Return a lease: credit its unused permits, and free the used ones window_s after their last use."""
+        entry = self._leases.get(lease_id)
+        if entry is None:
+            return
+        now = time.monotonic()
+        unused = min(max(0, int(unused)), entry[1])
+        entry[1] -= unused
+        self._outstanding -= unused
+        self.n_permits_returned += unused
+        if entry[1] == 0:
+            del self._leases[lease_id]
+        elif last_used_ago_s is not None:
+            free_at = now - max(0.0, last_used_ago_s) + self.window_s
+            if free_at < entry[0]:
+                entry[0] = free_at
+                heapq.heappush(self._free_heap, (free_at, lease_id))
+        self._released.set()
+
+    def seconds_until_available(self) -> float:
+        now = time.monotonic()
+        self._prune(now)
+        if self._outstanding < self.rpm or not self._free_heap:
+            return 0.0
+        return max(0.0, self._free_heap[0][0] - now)
+
+    def stats(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            "rpm": self.rpm,
+            "window_s": self.window_s,
+            "outstanding_permits": self._outstanding,
+            "active_leases": len(self._leases),
+            "active_clients": len(self._client_last_seen),
+            "n_leases": self.n_leases,
+            "n_permits_leased": self.n_permits_leased,
+            "n_permits_returned": self.n_permits_returned,
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self._dispatch(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {"error": f"bad request: {e}"}
+                writer.write((json.dumps(reply) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, msg: dict) -> dict:
+        op = msg["op"]
+        if op == "hello":
+            return {"rpm": self.rpm, "window_s": self.window_s, "lease_ttl_s": self.lease_ttl_s}
+        if op == "lease":
+            result = await self.lease(str(msg.get("client", "")), int(msg["n"]), msg.get("timeout_s"))
+            if result is None:
+                return {"error": "timeout", "seconds_until_available": self.seconds_until_available()}
+            return {"lease_id": result[0], "n": result[1], "ttl_s": self.lease_ttl_s}
+        if op == "release":
+            self.release(int(msg["lease_id"]), int(msg["unused"]), msg.get("last_used_ago_s"))
+            return {"ok": True}
+        if op == "peek":
+            return {"seconds_until_available": self.seconds_until_available()}
+        if op == "stats":
+            return self.stats()
+        return {"error": f"unknown op: {op!r}"}
+
+    async def _start(self, address: Address) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        self._released = asyncio.Event()
+        if isinstance(address, str):
+            self._server = await asyncio.start_unix_server(self._handle, path=address)
+        else:
+            self._server = await asyncio.start_server(self._handle, address[0], address[1])
+
+    async def serve(self, address: Address) -> None:
+        """Serve until cancelled: asyncio.run(coordinator.serve("/tmp/permits.sock"))."""
+        await self._start(address)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self, address: Address) -> "PermitCoordinator":
+        """Serve from a daemon thread of this process (returns once listening); stop() to shut down."""
+        started = threading.Event()
+        errors = []
+
+        def _run():
+            async def _main():
+                try:
+                    await self._start(address)
+                except Exception as e:
+                    errors.append(e)
+                    raise
+                finally:
+                    started.set()
+                async with self._server:
+                    try:
+                        await self._server.serve_forever()
+                    except asyncio.CancelledError:
+                        pass
+
+            try:
+                asyncio.run(_main())
+            except Exception:
+                pass
+
+        threading.Thread(target=_run, name="permit-coordinator", daemon=True).start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+
+class LeasedRateLimiter:
+    """
+    Client of a PermitCoordinator with the RateLimiter interface (wait(), seconds_until_available(),
+    rpm, metrics), so it can be passed as rl= anywhere.
+
+    wait() takes a permit from the current lease without any coordination; only when the lease
+    is used up or expired does it return the lease (unused permits + time of last use) and
+    request a new one of up to lease_size permits. Thread-safe; close() returns the lease.
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        *,
+        lease_size: int = 20,
+        name: Optional[str] = None,
+        connect_timeout_s: float = 10.0,
+    ):
+        _require(isinstance(lease_size, int) and lease_size >= 1, "lease_size must be an int >= 1")
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self._sock = socket.socket(family, socket.SOCK_STREAM)
+        self._sock.settimeout(connect_timeout_s)
+        self._sock.connect(address)
+        self._sock.settimeout(None)
+        self._file = self._sock.makefile("rwb")
+        self.lease_size = lease_size
+        self.client_id = name or f"{socket.gethostname()}:{threading.get_native_id()}:{id(self)}"
+        self._lock = threading.Lock()
+        self._lease_id = None
+        self._left = 0
+        self._expires_at = 0.0
+        self._last_used = None
+        hello = self._call({"op": "hello"})
+        self.rpm = hello["rpm"]
+        self.window_s = hello["window_s"]
+        self.metrics = LimiterMetrics(name or "leased", self.rpm)
+
+    def _call(self, msg: dict) -> dict:
+        self._file.write((json.dumps(msg) + "\n").encode("utf-8"))
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Permit coordinator closed the connection")
+        return json.loads(line)
+
+    def _release_locked(self) -> None:
+        if self._lease_id is None:
+            return
+        last_used_ago_s = None if self._last_used is None else time.monotonic() - self._last_used
+        self._call({"op": "release", "lease_id": self._lease_id, "unused": self._left, "last_used_ago_s": last_used_ago_s})
+        self._lease_id, self._left, self._last_used = None, 0, None
+
+    def _take_locked(self, start: float) -> None:
+        self._left -= 1
+        self._last_used = time.monotonic()
+        self.metrics.record_permit(self._last_used - start, granted_at=self._last_used)
+
+    def wait(self, *, timeout_s: Optional[float] = None):
+        """
+        Block until a permit is granted. With timeout_s, raise TimeoutError (without taking a
+        permit) if it can't be granted within timeout_s seconds.
+        """
+        _require(timeout_s is None or timeout_s >= 0, "timeout_s must be None or >= 0")
+        start = time.monotonic()
+        if not self._lock.acquire(timeout=-1 if timeout_s is None else timeout_s):
+            self.metrics.record_timeout()
+            raise TimeoutError(f"No rate limit permit within {timeout_s:.3f}s (queued behind other callers)")
+        try:
+            if self._left > 0 and time.monotonic() < self._expires_at:
+                self._take_locked(start)
+                return
+            self._release_locked()
+            sent = time.monotonic()
+            remaining = None if timeout_s is None else max(0.0, timeout_s - (sent - start))
+            reply = self._call({"op": "lease", "client": self.client_id, "n": self.lease_size, "timeout_s": remaining})
+            if "error" in reply:
+                self.metrics.record_timeout()
+                raise TimeoutError(f"Permit coordinator: {reply['error']}")
+            # expiry counted from when the request was sent, so it never outlives the server's
+            self._lease_id, self._left, self._expires_at = reply["lease_id"], reply["n"], sent + reply["ttl_s"]
+            self._take_locked(start)
+        finally:
+            self._lock.release()
+
+    def seconds_until_available(self) -> float:
+        with self._lock:
+            if self._left > 0 and time.monotonic() < self._expires_at:
+                return 0.0
+            return self._call({"op": "peek"})["seconds_until_available"]
+
+    def coordinator_stats(self) -> dict:
+        with self._lock:
+            return self._call({"op": "stats"})
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._release_locked()
+            finally:
+                self._file.close()
+                self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
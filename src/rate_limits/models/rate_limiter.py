@@ -1,8 +1,11 @@
 import os
 import time
+import threading
 from collections import deque
+from typing import Optional
 from src.general_file_utils.utils.pkl import load_pkl, make_pkl_file, overwrite_pkl
 from src.ml_scam_classification.utils.timestamps import is_unix_timestamp_ns
+from src.rate_limits.models.limiter_metrics import LimiterMetrics
 
 NS_PER_MINUTE = 60_000_000_000  # 60 seconds in ns
 
@@ -10,12 +13,12 @@ def _require(cond: bool, msg: str, err=ValueError):
     if not cond:
         raise err(msg)
 
-def _rpm_from_filename_fast(filename: str) -> int:
+def _rpm_from_filename_fast(filename: str, marker: str = "prev") -> int:
     _require(filename.endswith(".pkl"), "Provided non-pkl log file (log file must be a .pkl)")
     j = len(filename) - 4
-    i = filename.rfind("prev", 0, j)
-    _require(i != -1, 'The logfile must end in "prev<rpm>.pkl" (e.g., "...prev60.pkl").')
-    rpm_str = filename[i + 4 : j]
+    i = filename.rfind(marker, 0, j)
+    _require(i != -1, f'The logfile must end in "{marker}<rpm>.pkl" (e.g., "...{marker}60.pkl").')
+    rpm_str = filename[i + len(marker) : j]
     _require(rpm_str.isdigit(), "Filename rpm must be digits, e.g., prev60.pkl")
     return int(rpm_str)
 
@@ -26,6 +29,9 @@ class RateLimiter:
     - Call .wait() immediately before your rate-limited action.
     - epsilon_s: small cushion (seconds) added only when sleeping.
     - requests_per_log_write: write the log to disk after this many requests.
+    - Thread-safe: each caller books the next permit (possibly a future timestamp) under a short
+      lock and sleeps outside it, so permits go out in arrival order and peeks never block.
+    - .metrics (LimiterMetrics): permits, wait times and time at capacity; see limiter_metrics.
     """
 
     __slots__ = (
@@ -36,6 +42,8 @@ class RateLimiter:
         "_requests_per_log_write",
         "_requests_since_log_write",
         "_epsilon_ns",
+        "_lock",
+        "metrics",
     )
 
     def __init__(
@@ -88,33 +96,66 @@ class RateLimiter:
         self._requests_per_log_write = requests_per_log_write
         self._requests_since_log_write = 0
         self._epsilon_ns = int(epsilon_s * 1e9)
+        self._lock = threading.Lock()
+        self.metrics = LimiterMetrics(os.path.splitext(log_filename)[0], rpm)
 
     def _write_log_if_needed(self):
         self._requests_since_log_write += 1
         if self._requests_since_log_write >= self._requests_per_log_write:
-            overwrite_pkl(path=self.log_path, data=self._dq)
+            overwrite_pkl(path=self.log_path, new_data=self._dq)
             self._requests_since_log_write = 0
 
-    def wait(self):
+    def seconds_until_available(self) -> float:
+        """
+        How long wait() would currently sleep (0.0 if a permit is free now). Does not take a permit.
+        Lock-free (a snapshot of the deque), so it never blocks behind callers inside wait().
+        """
         dq = self._dq
-        now = time.time_ns()
-
-        # Fast path: capacity not yet hit.
         if len(dq) < dq.maxlen:
-            dq.append(now)
-            self._write_log_if_needed()
-            return
-
-        # Full: ensure oldest is at least 60s old.
-        oldest = dq[0]
-        required_ns = (oldest + NS_PER_MINUTE) - now  # >0 means we must wait
-
-        if required_ns > 0:
-            # Add epsilon cushion *only when we must wait*.
-            wait_ns = required_ns + self._epsilon_ns
+            return 0.0
+        try:
+            oldest = dq[0]
+        except IndexError:  # emptied concurrently (never happens with maxlen deques in practice)
+            return 0.0
+        return max(0.0, (oldest + NS_PER_MINUTE - time.time_ns()) / 1e9)
+
+    def wait(self, *, timeout_s: Optional[float] = None):
+        """
+        Block until a permit is granted. With timeout_s, raise TimeoutError (without taking a
+        permit) if it can't be granted within timeout_s seconds, instead of sleeping past it.
+        """
+        _require(timeout_s is None or timeout_s >= 0, "timeout_s must be None or >= 0")
+        with self._lock:
+            wait_ns = self._reserve_locked(None if timeout_s is None else int(timeout_s * 1e9))
+            # Reserved now; the sleep happens outside the lock.
+            self.metrics.record_permit(wait_ns / 1e9)
+
+        if wait_ns > 0:
             if self.print_updates:
                 print(f"Waiting {wait_ns / 1e9:.6f} seconds to follow rate limits...")
             time.sleep(wait_ns / 1e9)
 
-        dq.append(time.time_ns())
+    def _reserve_locked(self, timeout_ns: Optional[int] = None) -> int:
+        """Book the next permit's timestamp (possibly in the future); returns ns to sleep until it."""
+        dq = self._dq
+        now = time.time_ns()
+
+        # Fast path: capacity not yet hit.
+        if len(dq) < dq.maxlen:
+            grant_ns = now
+        else:
+            # Full: the new permit lands 60s after the oldest one in the window.
+            grant_ns = dq[0] + NS_PER_MINUTE
+            if grant_ns > now:
+                # Add epsilon cushion *only when we must wait*.
+                grant_ns += self._epsilon_ns
+            grant_ns = max(grant_ns, now)
+        grant_ns = max(grant_ns, dq[-1]) if dq else grant_ns  # keep the deque sorted
+
+        wait_ns = grant_ns - now
+        if timeout_ns is not None and wait_ns > timeout_ns:
+            self.metrics.record_timeout()
+            raise TimeoutError(f"Next rate limit permit is {wait_ns / 1e9:.3f}s away, past the timeout")
+        dq.append(grant_ns)
         self._write_log_if_needed()
+        return wait_ns
@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from src.rate_limits.models.gcra_rate_limiter import GCRARateLimiter
+from src.rate_limits.models.permit_coordinator import LeasedRateLimiter
+from src.rate_limits.models.rate_limiter import RateLimiter
+
+# Override with the RATE_LIMITS_CONFIG environment variable (e.g. in .env)
+DEFAULT_RATE_LIMITS_CONFIG_PATH = "src/rate_limits/rate_limits.json"
+BACKENDS = ("deque", "gcra", "coordinator")
+
+_UNSAFE_FILENAME_CHARS_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+@dataclass(frozen=True)
+class RateLimitSpec:
+    """
+    One entry of the rate limits config. rpm is enforced by the limiter; tpm / rpd are the
+    provider's declared token-per-minute and requests-per-day quotas, carried for capacity
+    planning (no limiter here counts tokens or days).
+    log_path defaults to "<log_dir>/<name>__prev<rpm>.pkl" ("gcra<rpm>.pkl" for the gcra backend).
+    The coordinator backend leases permits from a PermitCoordinator serving this rpm at
+    coordinator_address: a Unix socket path or "host:port".
+    """
+
+    name: str
+    rpm: int
+    model: Optional[str] = None
+    tpm: Optional[int] = None
+    rpd: Optional[int] = None
+    backend: str = "deque"
+    log_path: Optional[str] = None
+    burst: int = 1  # gcra backend only
+    requests_per_log_write: int = 1
+    print_updates: bool = True
+    coordinator_address: Optional[str] = None  # coordinator backend only
+    lease_size: int = 20  # coordinator backend only
+
+    def __post_init__(self):
+        if not (isinstance(self.rpm, int) and self.rpm > 0):
+            raise ValueError(f"Rate limit {self.name!r}: rpm must be a positive int, got {self.rpm!r}")
+        for key in ("tpm", "rpd"):
+            value = getattr(self, key)
+            if value is not None and not (isinstance(value, int) and value > 0):
+                raise ValueError(f"Rate limit {self.name!r}: {key} must be a positive int or null, got {value!r}")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Rate limit {self.name!r}: unknown backend {self.backend!r}. Expected one of {BACKENDS}")
+        if self.backend == "deque" and self.burst != 1:
+            raise ValueError(f"Rate limit {self.name!r}: burst is only supported by the gcra backend")
+        if (self.backend == "coordinator") != (self.coordinator_address is not None):
+            raise ValueError(f"Rate limit {self.name!r}: coordinator_address is required by (and only used by) the coordinator backend")
+
+    def resolved_log_path(self, log_dir: str) -> str:
+        if self.log_path is not None:
+            return self.log_path
+        marker = "prev" if self.backend == "deque" else "gcra"
+        return os.path.join(log_dir, f"{_UNSAFE_FILENAME_CHARS_RE.sub('_', self.name)}__{marker}{self.rpm}.pkl")
+
+
+class RateLimitRegistry:
+    """
+    Rate limiters declared in one config file, created on first use.
+
+    Loading the registry only parses and validates the config; a limiter's pickle is loaded
+    (or created, if it doesn't exist yet) the first time get(name) is called, so a process
+    never touches the state of limiters it doesn't use. Each name maps to one shared limiter
+    per registry. Thread-safe.
+
+    Config format (json):
+      {"log_dir": "outputs/rate_limits",
+       "limiters": {"<name>": {"rpm": 10, "model": ..., "tpm": ..., "rpd": ..., "backend": "deque" | "gcra",
+                               "log_path": ..., "burst": ..., "requests_per_log_write": ..., "print_updates": ...,
+                               "coordinator_address": ..., "lease_size": ...}}}
+    """
+
+    def __init__(self, specs: Dict[str, RateLimitSpec], *, log_dir: str = "outputs/rate_limits"):
+        self.specs = dict(specs)
+        self.log_dir = log_dir
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config_path: str) -> "RateLimitRegistry":
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"Rate limits config not found: {config_path}")
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if not isinstance(config.get("limiters"), dict):
+            raise ValueError(f"Rate limits config must have a \"limiters\" object: {config_path}")
+
+        allowed = {f.name for f in fields(RateLimitSpec)} - {"name"}
+        specs = {}
+        for name, entry in config["limiters"].items():
+            unknown = sorted(set(entry) - allowed)
+            if unknown:
+                raise ValueError(f"Rate limit {name!r} in {config_path} has unknown keys: {unknown}")
+            specs[name] = RateLimitSpec(name=name, **entry)
+        return cls(specs, log_dir=config.get("log_dir", "outputs/rate_limits"))
+
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    def spec(self, name: str) -> RateLimitSpec:
+        if name not in self.specs:
+            raise ValueError(f"No rate limit named {name!r}. Configured: {self.names()}")
+        return self.specs[name]
+
+    def name_for_model(self, model: str) -> str:
+        """Name of the first limiter declared for `model` (entries without "model" match their name)."""
+        for name, spec in self.specs.items():
+            if (spec.model or name) == model:
+                return name
+        raise ValueError(f"No rate limit configured for model {model!r}. Configured: {self.names()}")
+
+    def get(self, name: str):
+        """The limiter for `name`, created on first use (its log pickle is created if missing)."""
+        spec = self.spec(name)
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = self._create(spec)
+                self._limiters[name] = limiter
+            return limiter
+
+    def for_model(self, model: str):
+        return self.get(self.name_for_model(model))
+
+    def instantiated(self) -> list:
+        """Limiters created so far (e.g. to pass to LimiterMetricsDumper)."""
+        with self._lock:
+            return list(self._limiters.values())
+
+    def _create(self, spec: RateLimitSpec):
+        if spec.backend == "coordinator":
+            return self._connect(spec)
+        log_path = spec.resolved_log_path(self.log_dir)
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        create = not os.path.exists(log_path)
+        if spec.backend == "gcra":
+            return GCRARateLimiter(
+                spec.rpm,
+                log_path,
+                burst=spec.burst,
+                create_pkl_w_state=create,
+                print_updates=spec.print_updates,
+                requests_per_log_write=spec.requests_per_log_write,
+            )
+        return RateLimiter(
+            spec.rpm,
+            log_path,
+            create_pkl_w_deque=create,
+            print_updates=spec.print_updates,
+            requests_per_log_write=spec.requests_per_log_write,
+        )
+
+    @staticmethod
+    def _connect(spec: RateLimitSpec) -> LeasedRateLimiter:
+        address = spec.coordinator_address
+        host, sep, port = address.rpartition(":")
+        if sep and port.isdigit():
+            address = (host, int(port))
+        rl = LeasedRateLimiter(address, lease_size=spec.lease_size, name=spec.name)
+        if rl.rpm != spec.rpm:
+            rl.close()
+            raise ValueError(f"Rate limit {spec.name!r}: coordinator at {spec.coordinator_address} serves rpm {rl.rpm}, config says {spec.rpm}")
+        return rl
+
+
+_REGISTRIES: Dict[str, RateLimitRegistry] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+def get_rate_limit_registry(config_path: Optional[str] = None) -> RateLimitRegistry:
+    """Process-wide registry for config_path (default: $RATE_LIMITS_CONFIG or DEFAULT_RATE_LIMITS_CONFIG_PATH)."""
+    load_dotenv()
+    config_path = config_path or os.getenv("RATE_LIMITS_CONFIG") or DEFAULT_RATE_LIMITS_CONFIG_PATH
+    key = os.path.abspath(config_path)
+    with _REGISTRIES_LOCK:
+        if key not in _REGISTRIES:
+            _REGISTRIES[key] = RateLimitRegistry.from_config(config_path)
+        return _REGISTRIES[key]
+
+
+def get_rate_limiter(name: str, *, config_path: Optional[str] = None):
+    """Shared limiter `name` from the rate limits config, created on first use."""
+    return get_rate_limit_registry(config_path).get(name)